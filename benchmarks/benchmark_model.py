@@ -0,0 +1,199 @@
+"""Micro-benchmarks for the pure-Python model layer of owls-hep.
+
+These benchmarks exercise the configuration layer (expression composition,
+definition substitution, region variation and variation hashing) at a scale
+representative of a large analysis, i.e. thousands of regions and hundreds of
+variations.  No input files are required.
+
+Usage:
+
+    python benchmarks/benchmark_model.py
+    python benchmarks/benchmark_model.py --save baseline.json
+    python benchmarks/benchmark_model.py --compare baseline.json
+
+When comparing against a saved baseline, the script exits with a non-zero
+status if any benchmark is slower than the baseline by more than the given
+tolerance.
+"""
+
+
+# Future imports to support fancy print() on Python 2.x
+from __future__ import print_function
+
+# System imports
+import sys
+import json
+import argparse
+from timeit import Timer
+
+# owls-hep imports
+from owls_hep.expression import anded, multiplied, expression_substitute
+from owls_hep.region import Region
+from owls_hep.variations import Filtered, Reweighted, ReplaceWeight
+
+
+# Scale parameters
+N_REGIONS = 2000
+N_VARIATIONS = 200
+N_DEFINITIONS = 5000
+N_EXPRESSIONS = 200
+
+
+def _definitions():
+    """Creates a large definitions dictionary and an expression referencing
+    a subset of its entries.
+    """
+    definitions = dict((
+        ('cut_{0}'.format(i), 'x_{0} > {0} && y_{0} < {1}'.format(i, 2 * i))
+        for i in range(N_DEFINITIONS)
+    ))
+    expression = ' && '.join(('[cut_{0}]'.format(i)
+                              for i in range(0, N_DEFINITIONS, 25)))
+    return definitions, expression
+
+
+def _variations():
+    """Creates a long chain of mixed variations.
+    """
+    result = []
+    for i in range(N_VARIATIONS):
+        if i % 3 == 0:
+            result.append(Filtered('pt_{0} > {1}'.format(i, i * 1000)))
+        elif i % 3 == 1:
+            result.append(Reweighted('sf_{0}'.format(i)))
+        else:
+            result.append(ReplaceWeight('sf_{0}'.format(i - 1),
+                                        'sf_{0}_up'.format(i - 1)))
+    return tuple(result)
+
+
+def _regions():
+    """Creates a large set of bare regions.
+    """
+    return [Region('n_jets >= {0} && met > {1}'.format(i % 10, i),
+                   'weight_mc * weight_pileup',
+                   'Region {0}'.format(i),
+                   sample_weights = {'mc': 'weight_lumi'})
+            for i in range(N_REGIONS)]
+
+
+def benchmarks():
+    """Returns a list of (name, callable, number) benchmark specifications.
+    """
+    expressions = tuple(('x_{0} > {0}'.format(i)
+                         for i in range(N_EXPRESSIONS)))
+    definitions, definition_expression = _definitions()
+    variations = _variations()
+    regions = _regions()
+    varied_region = regions[0].varied(variations)
+
+    def combine_anded():
+        anded(*expressions)
+
+    def combine_multiplied():
+        multiplied(*expressions)
+
+    def substitute():
+        expression_substitute(definition_expression, definitions)
+
+    def vary_regions():
+        for r in regions:
+            r.varied(variations[0])
+
+    def vary_deep_region():
+        varied_region.varied(variations[0])
+
+    def selection_weight():
+        varied_region.selection_weight('mc')
+
+    def hash_variations():
+        for v in variations:
+            hash(v)
+
+    return [
+        ('expression._combined (anded, {0} terms)'.format(N_EXPRESSIONS),
+         combine_anded, 200),
+        ('expression._combined (multiplied, {0} terms)'.format(N_EXPRESSIONS),
+         combine_multiplied, 200),
+        ('expression_substitute ({0} definitions)'.format(N_DEFINITIONS),
+         substitute, 100),
+        ('Region.varied ({0} regions)'.format(N_REGIONS),
+         vary_regions, 3),
+        ('Region.varied ({0} variation chain)'.format(N_VARIATIONS),
+         vary_deep_region, 20),
+        ('Region.selection_weight ({0} variations)'.format(N_VARIATIONS),
+         selection_weight, 20),
+        ('Variation.__hash__ ({0} variations)'.format(N_VARIATIONS),
+         hash_variations, 3),
+    ]
+
+
+def run(repeat = 3):
+    """Runs all benchmarks.
+
+    Args:
+        repeat: The number of times each benchmark is repeated, the best
+            result being kept
+
+    Returns:
+        A dictionary mapping benchmark names to the best time per call, in
+        seconds.
+    """
+    results = {}
+    for name, function, number in benchmarks():
+        best = min(Timer(function).repeat(repeat = repeat, number = number))
+        results[name] = best / number
+    return results
+
+
+def main():
+    # Parse arguments
+    parser = argparse.ArgumentParser(
+        description = 'Run owls-hep model layer micro-benchmarks'
+    )
+    parser.add_argument('--repeat', type = int, default = 3,
+                        help = 'number of repetitions per benchmark')
+    parser.add_argument('--save', metavar = 'PATH',
+                        help = 'save the results as a JSON baseline')
+    parser.add_argument('--compare', metavar = 'PATH',
+                        help = 'compare the results against a JSON baseline')
+    parser.add_argument('--tolerance', type = float, default = 0.25,
+                        help = 'allowed relative slowdown versus baseline')
+    arguments = parser.parse_args()
+
+    # Run the benchmarks
+    results = run(arguments.repeat)
+
+    # Load the baseline, if any
+    baseline = {}
+    if arguments.compare is not None:
+        with open(arguments.compare, 'r') as f:
+            baseline = json.load(f)
+
+    # Print results and look for regressions
+    regressions = []
+    for name in sorted(results):
+        line = '{0:<55} {1:>12.3f} ms'.format(name, results[name] * 1e3)
+        if name in baseline:
+            change = results[name] / baseline[name] - 1.0
+            line += ' ({0:+.1%})'.format(change)
+            if change > arguments.tolerance:
+                regressions.append(name)
+        print(line)
+
+    # Save the results if requested
+    if arguments.save is not None:
+        with open(arguments.save, 'w') as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+
+    # Report regressions
+    if regressions:
+        print('regressions in: {0}'.format(', '.join(regressions)),
+              file = sys.stderr)
+        return 1
+    return 0
+
+
+# Run the benchmarks if this is the main module
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,13 @@
 """Provides a common algebra for scalar counts and histograms.
+
+In addition to the pure add and multiply operations, this module provides an
+accumulation interface (accumulator, accumulate and finalized) which combines
+many values in place.  ROOT histograms are converted to
+owls_hep.arrays.ArrayHistogram when entering an accumulation and back when it
+is finalized, so that no temporary ROOT histograms are created.
+
+Tuples of values (e.g. the results of owls_hep.nminusone.NMinusOne) are
+combined elementwise.
 """
 
 
@@ -6,8 +15,15 @@
 from uuid import uuid4
 
 # ROOT imports
+import owls_hep.pyroot
 from ROOT import TH1
 
+# owls-hep imports
+from owls_hep.sparse import SparseHistogram
+from owls_hep.arrays import ArrayHistogram
+from owls_hep.digest import TDigest
+from owls_hep.statistics import WeightedMoments
+
 
 def add(coefficient_1, value_1, coefficient_2, value_2):
     """Provides an addition algebra for various types, including scalars and
@@ -36,6 +52,21 @@ def add(coefficient_1, value_1, coefficient_2, value_2):
 
         # Add the histograms
         result.Add(value_1, value_2, coefficient_1, coefficient_2)
+    elif isinstance(value_1, (SparseHistogram, ArrayHistogram, TDigest,
+                              WeightedMoments)):
+        # Create the result
+        result = value_1.copy()
+        result.scale(coefficient_1)
+
+        # Add the histograms
+        result.add(value_2, coefficient_2)
+    elif isinstance(value_1, tuple):
+        # Add elementwise
+        if len(value_1) != len(value_2):
+            raise ValueError('values must have the same length')
+        result = tuple((add(coefficient_1, v1, coefficient_2, v2)
+                        for v1, v2
+                        in zip(value_1, value_2)))
     else:
         # Create the result
         result = ((coefficient_1 * value_1) + (coefficient_2 * value_2))
@@ -65,9 +96,92 @@ def multiply(coefficient, value):
 
         # Scale it
         result.Scale(coefficient)
+    elif isinstance(value, (SparseHistogram, ArrayHistogram, TDigest,
+                            WeightedMoments)):
+        # Create the result
+        result = value.copy()
+
+        # Scale it
+        result.scale(coefficient)
+    elif isinstance(value, tuple):
+        # Multiply elementwise
+        result = tuple((multiply(coefficient, v) for v in value))
     else:
         # Create the result
         result = (coefficient * value)
 
     # All done
     return result
+
+
+def accumulator(coefficient, value):
+    """Creates an accumulator for in-place addition of scaled values.
+
+    Incoming values are not modified.
+
+    Args:
+        coefficient: The coefficient, a scalar
+        value: The initial value, a histogram, scalar, or tuple thereof
+
+    Returns:
+        An accumulator holding (coefficient * value).  ROOT histograms are
+        converted to owls_hep.arrays.ArrayHistogram, and tuples to lists of
+        accumulators.
+    """
+    # Handle based on type
+    if isinstance(value, TH1):
+        result = ArrayHistogram.from_root(value)
+        result.scale(coefficient)
+        return result
+    elif isinstance(value, tuple):
+        return [accumulator(coefficient, v) for v in value]
+    return multiply(coefficient, value)
+
+
+def accumulate(total, coefficient, value):
+    """Adds a scaled value to an accumulator, in place where possible.
+
+    Args:
+        total: The accumulator, as returned by accumulator
+        coefficient: The coefficient, a scalar
+        value: The value, a histogram or scalar of the type initially passed
+            to accumulator
+
+    Returns:
+        The updated accumulator.
+    """
+    # Handle based on type
+    if isinstance(total, ArrayHistogram):
+        if isinstance(value, TH1):
+            value = ArrayHistogram.from_root(value)
+        total.add(value, coefficient)
+        return total
+    elif isinstance(total, (SparseHistogram, TDigest, WeightedMoments)):
+        total.add(value, coefficient)
+        return total
+    elif isinstance(total, list):
+        if len(total) != len(value):
+            raise ValueError('values must have the same length')
+        total[:] = [accumulate(t, coefficient, v)
+                    for t, v
+                    in zip(total, value)]
+        return total
+    return total + (coefficient * value)
+
+
+def finalized(total, template):
+    """Converts an accumulator back to the type of the accumulated values.
+
+    Args:
+        total: The accumulator, as returned by accumulator
+        template: One of the accumulated values, used as the template for the
+            type, binning and style of ROOT histogram results
+
+    Returns:
+        The accumulated value.
+    """
+    if isinstance(total, ArrayHistogram) and isinstance(template, TH1):
+        return total.to_root(template)
+    elif isinstance(total, list):
+        return tuple((finalized(t, v) for t, v in zip(total, template)))
+    return total
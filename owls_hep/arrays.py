@@ -0,0 +1,169 @@
+"""Provides a histogram value type backed by contiguous NumPy arrays.
+
+Combining ROOT histograms with TH1::Clone and TH1::Add creates (and registers)
+a new ROOT object for every operation.  ArrayHistogram holds the bin edges and
+the sum of weights and sum of squared weights of all bins (including underflow
+and overflow bins) in NumPy arrays and supports in-place scaled addition, so
+that long chains of histogram arithmetic (e.g. in estimations and uncertainty
+combinations) only convert from and to ROOT at their edges.
+"""
+
+
+# System imports
+from uuid import uuid4
+
+# NumPy imports
+import numpy
+
+
+# Set up default exports
+__all__ = [
+    'ArrayHistogram',
+]
+
+
+class ArrayHistogram(object):
+    """A histogram of 1 to 3 dimensions storing edges, sum of weights and sum
+    of squared weights in NumPy arrays.
+
+    The bin arrays are indexed as [x, y, z], with index 0 being the underflow
+    bin and index N + 1 the overflow bin of an axis, as in ROOT.
+    """
+
+    def __init__(self, edges, sumw, sumw2):
+        """Initializes a new instance of the ArrayHistogram class.
+
+        Args:
+            edges: A tuple of NumPy arrays of bin edges, one per dimension
+            sumw: The NumPy array of the sum of weights per bin
+            sumw2: The NumPy array of the sum of squared weights per bin
+        """
+        self._edges = tuple(edges)
+        self._sumw = numpy.ascontiguousarray(sumw, dtype = numpy.float64)
+        self._sumw2 = numpy.ascontiguousarray(sumw2, dtype = numpy.float64)
+
+        # Validate shapes
+        shape = tuple((len(e) + 1 for e in self._edges))
+        if self._sumw.shape != shape or self._sumw2.shape != shape:
+            raise ValueError('bin arrays must have shape {0}'.format(shape))
+
+    @classmethod
+    def from_root(cls, histogram):
+        """Creates an ArrayHistogram from a ROOT histogram.
+
+        Args:
+            histogram: The ROOT TH1, TH2 or TH3 histogram
+
+        Returns:
+            A new ArrayHistogram with a copy of the histogram content.
+        """
+        # owls-hep imports
+        from owls_hep.utility import axis_edges, histogram_content, \
+            histogram_sumw2
+
+        # Grab axes
+        dimension = histogram.GetDimension()
+        axes = (histogram.GetXaxis(),
+                histogram.GetYaxis(),
+                histogram.GetZaxis())[:dimension]
+        edges = tuple((axis_edges(a) for a in axes))
+
+        # Extract the sum of weights
+        sumw = histogram_content(histogram).astype(numpy.float64)
+
+        # Extract the sum of squared weights, which is equal to the sum of
+        # weights if they haven't been stored
+        if histogram.GetSumw2N() > 0:
+            sumw2 = histogram_sumw2(histogram).copy()
+        else:
+            sumw2 = numpy.abs(sumw)
+
+        return cls(edges, sumw, sumw2)
+
+    def to_root(self, template, name = None):
+        """Converts the ArrayHistogram to a ROOT histogram.
+
+        Args:
+            template: A ROOT histogram with the same binning, whose type,
+                title, axis labels and style are used for the result
+            name: The name for the result, or None for a unique name
+
+        Returns:
+            A new ROOT histogram with the content of the ArrayHistogram.
+        """
+        # owls-hep imports
+        from owls_hep.utility import histogram_content, \
+            set_histogram_content
+
+        # Validate the template
+        if histogram_content(template).shape != self._sumw.shape:
+            raise ValueError('template binning does not match')
+
+        # Create the result and write the bin arrays into its buffers
+        result = template.Clone(uuid4().hex if name is None else name)
+        set_histogram_content(result, self._sumw, self._sumw2)
+
+        return result
+
+    def dimension(self):
+        """Returns the dimension of the histogram.
+        """
+        return len(self._edges)
+
+    def edges(self, axis = 0):
+        """Returns the bin edges of an axis.
+        """
+        return self._edges[axis]
+
+    def sumw(self):
+        """Returns the array of the sum of weights per bin.
+        """
+        return self._sumw
+
+    def sumw2(self):
+        """Returns the array of the sum of squared weights per bin.
+        """
+        return self._sumw2
+
+    def copy(self):
+        """Returns a copy of the histogram.
+        """
+        return ArrayHistogram(self._edges,
+                              self._sumw.copy(),
+                              self._sumw2.copy())
+
+    def scale(self, coefficient):
+        """Scales the histogram in place.
+
+        Args:
+            coefficient: The scale factor
+        """
+        self._sumw *= coefficient
+        self._sumw2 *= coefficient * coefficient
+
+    def add(self, other, coefficient = 1.0):
+        """Adds a scaled histogram to this one in place.
+
+        Args:
+            other: The ArrayHistogram to add, which must have the same binning
+            coefficient: The scale factor to apply to the other histogram
+        """
+        if self._sumw.shape != other._sumw.shape or \
+                not all((numpy.array_equal(a, b)
+                         for a, b
+                         in zip(self._edges, other._edges))):
+            raise ValueError('histograms must have the same binning')
+        self._sumw += coefficient * other._sumw
+        self._sumw2 += (coefficient * coefficient) * other._sumw2
+
+    def integral(self, include_overflow = True):
+        """Computes the sum of weights of the histogram.
+
+        Args:
+            include_overflow: Whether or not to include underflow and overflow
+                bins
+        """
+        if include_overflow:
+            return float(self._sumw.sum())
+        inner = tuple((slice(1, -1) for _ in self._edges))
+        return float(self._sumw[inner].sum())
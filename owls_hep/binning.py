@@ -0,0 +1,248 @@
+"""Provides utilities for working with histogram binnings.
+
+Binnings are specified as tuples of one of the following forms (see the
+Histogram calculation):
+
+- (nbins, low, high): nbins equal-width bins between low and high
+- ('linear', nbins, low, high): same as above
+- ('custom', edge_0, ..., edge_N): N bins with the specified edges
+- (edge_0, ..., edge_N): same as above, for N != 2
+"""
+
+
+# NumPy imports
+import numpy
+
+
+# Set up default exports
+__all__ = [
+    'bin_edges',
+    'cell_indices',
+    'draw_cell_indices',
+    'rebin_indices',
+    'optimized_edges',
+]
+
+
+def bin_edges(binning):
+    """Computes the bin edges of a binning.
+
+    Args:
+        binning: The binning tuple
+
+    Returns:
+        A NumPy array of the N + 1 bin edges, in increasing order.
+    """
+    if binning[0] == 'custom':
+        edges = numpy.array(binning[1:], dtype = numpy.float64)
+    elif binning[0] == 'linear':
+        edges = numpy.linspace(binning[2], binning[3], int(binning[1]) + 1)
+    elif len(binning) == 3:
+        edges = numpy.linspace(binning[1], binning[2], int(binning[0]) + 1)
+    else:
+        edges = numpy.array(binning, dtype = numpy.float64)
+
+    # Validate the edges
+    if len(edges) < 2 or numpy.any(numpy.diff(edges) <= 0):
+        raise ValueError('invalid binning: {0}'.format(binning))
+
+    return edges
+
+
+def cell_indices(edges, values):
+    """Computes the flat indices of the histogram cells of values.
+
+    Cells are laid out as in owls_hep.arrays.ArrayHistogram, i.e. indexed as
+    [x, y, z] including underflow and overflow bins, and values equal to the
+    upper edge of a bin belong to the next bin, as in ROOT.
+
+    Args:
+        edges: A tuple of NumPy arrays of bin edges, one per dimension
+        values: A NumPy array of shape (entries, dimension)
+
+    Returns:
+        A NumPy array of flat cell indices, one per entry.
+    """
+    if len(edges) == 0:
+        return numpy.zeros(len(values), dtype = numpy.int64)
+    return numpy.ravel_multi_index(
+        tuple((numpy.searchsorted(e, values[:, i], side = 'right')
+               for i, e
+               in enumerate(edges))),
+        tuple((len(e) + 1 for e in edges))
+    )
+
+
+def draw_cell_indices(edges, values):
+    """Computes the flat indices of the histogram cells of values of
+    expressions in TTree::Draw order.
+
+    TTree::Draw (and thus the Histogram calculation) puts the last of the
+    expressions on the x axis, so the columns of values are reversed with
+    respect to the axes of the edges.
+
+    Args:
+        edges: A tuple of NumPy arrays of bin edges, one per dimension, in
+            [x, y, z] order
+        values: A NumPy array of shape (entries, dimension), with one column
+            per expression
+
+    Returns:
+        A NumPy array of flat cell indices, one per entry.
+    """
+    return cell_indices(edges, values[:, ::-1])
+
+
+def rebin_indices(master, binning):
+    """Computes the mapping of the bins of a fine master binning onto a
+    coarser binning whose edges are a subset of the master edges.
+
+    The coarser binning may cover a smaller range than the master binning, in
+    which case the master bins outside of its range are mapped to its
+    underflow and overflow bins.
+
+    Args:
+        master: The master binning tuple
+        binning: The coarser binning tuple
+
+    Returns:
+        A NumPy integer array with one entry per master bin (including the
+        underflow and overflow bins), containing the index of the coarser bin
+        (including the underflow and overflow bins) it maps to.
+
+    Raises:
+        ValueError: If the edges of the coarser binning don't align with the
+            master edges.
+    """
+    # Compute edges
+    master_edges = bin_edges(master)
+    edges = bin_edges(binning)
+
+    # Find the master edge matching each coarser edge, allowing for the
+    # rounding of edges computed by linspace
+    positions = numpy.searchsorted(master_edges, edges)
+    tolerance = 1e-9 * (master_edges[-1] - master_edges[0])
+    for i, (position, edge) in enumerate(zip(positions, edges)):
+        for candidate in (position - 1, position):
+            if 0 <= candidate < len(master_edges) and \
+                    abs(master_edges[candidate] - edge) <= tolerance:
+                positions[i] = candidate
+                break
+        else:
+            raise ValueError('binning {0} does not align with master binning '
+                             '{1}'.format(binning, master))
+
+    # Map master bins by the position of their lower edge.  The master
+    # underflow bin has no lower edge and always maps to the underflow bin.
+    lower = numpy.arange(-1, len(master_edges))
+    return numpy.concatenate((
+        [0],
+        numpy.searchsorted(positions, lower[1:], side = 'right')
+    ))
+
+
+def _asimov_significance_squared(signal, background):
+    """Computes the squared Asimov significance of signal over background,
+    elementwise for arrays.
+    """
+    signal = numpy.maximum(signal, 0.0)
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        result = 2.0 * ((signal + background) *
+                        numpy.log1p(signal / background) -
+                        signal)
+    return numpy.where(background > 0, result, 0.0)
+
+
+def optimized_edges(edges, background, background_sumw2, signal = None,
+                    min_background = 0.0, max_relative_error = None,
+                    maximize_significance = False):
+    """Merges adjacent bins of a fine binning to meet statistical targets.
+
+    All quantities are computed from cumulative sums, so that each candidate
+    bin is evaluated in constant time.  Without significance maximization,
+    bins are built greedily from the upper end of the range (where
+    statistics are usually lowest), and any remainder at the lower end is
+    merged into the last bin built.  With significance maximization, the
+    binning maximizing the sum of squared Asimov significances of all bins,
+    subject to the targets, is found by dynamic programming.
+
+    Args:
+        edges: The N + 1 fine bin edges
+        background: The N fine bin background sums of weights
+        background_sumw2: The N fine bin background sums of squared weights
+        signal: The N fine bin signal sums of weights, required for
+            significance maximization
+        min_background: The minimum background per bin
+        max_relative_error: The maximum relative statistical error of the
+            background per bin, or None for no limit
+        maximize_significance: Whether or not to maximize the signal
+            significance
+
+    Returns:
+        A NumPy array of the merged bin edges, a subset of edges.
+
+    Raises:
+        ValueError: If no binning meets the targets.
+    """
+    # Compute cumulative sums, with a leading zero so that the sum of fine
+    # bins [i, j) is total[j] - total[i]
+    edges = numpy.asarray(edges, dtype = numpy.float64)
+    n = len(edges) - 1
+
+    def cumulative(values):
+        values = numpy.asarray(values, dtype = numpy.float64)
+        if values.shape != (n,):
+            raise ValueError('bin values must have shape ({0},)'.format(n))
+        return numpy.concatenate(([0.0], numpy.cumsum(values)))
+    background = cumulative(background)
+    background_sumw2 = cumulative(background_sumw2)
+
+    # Creates a mask of valid bins [starts, end)
+    def valid(starts, end):
+        b = background[end] - background[starts]
+        result = (b > 0) & (b >= min_background)
+        if max_relative_error is not None:
+            error = numpy.sqrt(numpy.maximum(
+                background_sumw2[end] - background_sumw2[starts],
+                0.0
+            ))
+            result &= (error <= max_relative_error * b)
+        return result
+
+    if maximize_significance:
+        if signal is None:
+            raise ValueError('significance maximization requires signal')
+        signal = cumulative(signal)
+
+        # best[j] is the best sum of squared significances of fine bins
+        # [0, j), reached by a last bin starting at previous[j]
+        best = numpy.full(n + 1, -numpy.inf)
+        best[0] = 0.0
+        previous = numpy.zeros(n + 1, dtype = int)
+        for j in range(1, n + 1):
+            starts = numpy.arange(j)
+            candidates = best[:j] + _asimov_significance_squared(
+                signal[j] - signal[:j],
+                background[j] - background[:j]
+            )
+            candidates[~valid(starts, j)] = -numpy.inf
+            previous[j] = numpy.argmax(candidates)
+            best[j] = candidates[previous[j]]
+        if not numpy.isfinite(best[n]):
+            raise ValueError('no binning meets the targets')
+
+        # Trace back the edges
+        indices = [n]
+        while indices[-1] > 0:
+            indices.append(previous[indices[-1]])
+        return edges[indices[::-1]]
+
+    # Build bins greedily from the upper end
+    indices = [n]
+    for i in range(n - 1, -1, -1):
+        if valid(numpy.array([i]), indices[-1])[0]:
+            indices.append(i)
+    if len(indices) == 1:
+        raise ValueError('no binning meets the targets')
+    indices[-1] = 0
+    return edges[indices[::-1]]
@@ -0,0 +1,289 @@
+"""Provides a local catalog of per-file metadata of process inputs.
+
+Processes only know the paths of their files, so the number of events or the
+total generator weight of a sample otherwise requires opening every file.
+The Catalog records, for each (file, tree) pair, the file fingerprint (size
+and modification time), the number of tree entries, the sum of MC weights,
+the cluster layout and the file size in an SQLite database.  Records are
+computed in parallel (per file, through owls-parallel and the persistent
+cache) and updated incrementally when files change, after which queries do
+not open any ROOT files.
+"""
+
+
+# System imports
+import sqlite3
+from os.path import abspath, getsize, getmtime
+from collections import namedtuple
+
+# NumPy imports
+import numpy
+
+# Six imports
+from six import string_types
+
+# owls-cache imports
+from owls_cache.persistent import cached as persistently_cached
+
+# owls-parallel imports
+from owls_parallel import parallelized
+
+# ROOT imports
+import owls_hep.pyroot
+from ROOT import TChain
+
+# owls-hep imports
+from owls_hep.process import expanded
+from owls_hep.schema import _tree_schema
+from owls_hep.utility import load_file, draw_values
+
+
+# Set up default exports
+__all__ = [
+    'FileRecord',
+    'file_record',
+    'Catalog',
+]
+
+
+# The metadata of a tree in a file.  size and mtime form the fingerprint of
+# the file, clusters is a NumPy array of the first entry of each cluster.
+FileRecord = namedtuple('FileRecord',
+                        ['path', 'tree', 'size', 'mtime', 'entries',
+                         'sum_of_weights', 'sum_of_weights2', 'clusters'])
+
+
+def _weight_key(weight):
+    """Returns the string identifying a weight source in the catalog.
+    """
+    return '' if weight is None else repr(weight)
+
+
+# Dummy function to return fake values when parallelizing.  None signals to
+# callers that no record is available yet.
+def _file_record_mocker(path, size, mtime, tree, weight):
+    return None
+
+
+@parallelized(_file_record_mocker, lambda p, s, m, t, w: (p,))
+@persistently_cached('owls_hep.catalog._file_record')
+def _file_record(path, size, mtime, tree, weight):
+    """Computes the metadata of a tree in a file.
+
+    The size and modification time of the file are only used as part of the
+    cache key.
+
+    Args:
+        path: The absolute path of the file
+        size: The size of the file
+        mtime: The modification time of the file
+        tree: The path of the tree within the file
+        weight: The source of MC weights, see file_record
+
+    Returns:
+        A FileRecord.
+    """
+    # Read the entries and cluster layout from the (cached) schema
+    schema = _tree_schema(path, size, mtime, tree)
+
+    # Compute the sum of weights
+    if weight is None:
+        sumw = sumw2 = float(schema.entries())
+    elif isinstance(weight, string_types):
+        chain = TChain(tree)
+        chain.Add(path)
+        sumw = sumw2 = 0.0
+        for values, _ in draw_values(chain, (weight,)):
+            sumw += float(values[:, 0].sum())
+            sumw2 += float((values[:, 0] * values[:, 0]).sum())
+    else:
+        name, bin = weight
+        handle = load_file(path)
+        try:
+            histogram = handle.Get(name)
+            if not histogram:
+                raise RuntimeError('histogram {0} does not exist in '
+                                   '{1}'.format(name, path))
+            sumw = float(histogram.GetBinContent(bin))
+            sumw2 = float(histogram.GetBinError(bin)) ** 2
+        finally:
+            handle.Close()
+
+    return FileRecord(path,
+                      tree,
+                      size,
+                      mtime,
+                      schema.entries(),
+                      sumw,
+                      sumw2,
+                      schema.clusters())
+
+
+def file_record(path, tree, weight = None):
+    """Returns the (persistently cached) metadata of a tree in a file.
+
+    Args:
+        path: The path of the file
+        tree: The path of the tree within the file
+        weight: The source of MC weights: None to count entries, an
+            expression string to sum over all entries of the tree, or a
+            (histogram path, bin) tuple to read the sum of weights from a
+            metadata histogram in the file (the bin error giving the square
+            root of the sum of squared weights)
+
+    Returns:
+        A FileRecord, or None while calls are being recorded for parallel
+        execution.
+    """
+    path = abspath(path)
+    return _file_record(path, getsize(path), getmtime(path), tree, weight)
+
+
+class Catalog(object):
+    """An SQLite catalog of the metadata of the files of processes.
+    """
+
+    def __init__(self, path, weight = None):
+        """Initializes a new instance of the Catalog class.
+
+        Args:
+            path: The path of the SQLite database, created if necessary
+            weight: The source of MC weights, see file_record
+        """
+        # Store parameters
+        self._path = path
+        self._weight = weight
+        self._weight_key = _weight_key(weight)
+
+        # Open the database and create the table if necessary
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'path TEXT, tree TEXT, weight TEXT, size INTEGER, '
+                'mtime REAL, entries INTEGER, sum_of_weights REAL, '
+                'sum_of_weights2 REAL, clusters BLOB, '
+                'PRIMARY KEY (path, tree, weight))'
+            )
+
+    def close(self):
+        """Closes the database.
+        """
+        self._connection.close()
+
+    def _stored(self, path, tree):
+        """Returns the stored record of a tree in a file, if any, regardless
+        of whether or not it is up to date.
+        """
+        row = self._connection.execute(
+            'SELECT size, mtime, entries, sum_of_weights, sum_of_weights2, '
+            'clusters FROM files WHERE path = ? AND tree = ? AND weight = ?',
+            (path, tree, self._weight_key)
+        ).fetchone()
+        if row is None:
+            return None
+        size, mtime, entries, sumw, sumw2, clusters = row
+        return FileRecord(path,
+                          tree,
+                          size,
+                          mtime,
+                          entries,
+                          sumw,
+                          sumw2,
+                          numpy.frombuffer(clusters, dtype = numpy.int64))
+
+    def update(self, processes):
+        """Records the files of processes which are not yet in the catalog or
+        which have changed since they were recorded.
+
+        Inside an owls-parallel environment, the first call schedules the
+        computation of missing records and records nothing.
+
+        Args:
+            processes: An iterable of processes
+
+        Returns:
+            The number of records written.
+        """
+        # Find stale (path, tree) pairs
+        stale = []
+        for process in processes:
+            for p in expanded(process):
+                for f in p.files():
+                    if self.record(f, p.tree()) is None:
+                        stale.append((abspath(f), p.tree()))
+
+        # Compute and store their records
+        records = [file_record(p, t, self._weight)
+                   for p, t
+                   in sorted(set(stale))]
+        records = [r for r in records if r is not None]
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO files VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(r.path, r.tree, self._weight_key, r.size, r.mtime,
+                  r.entries, r.sum_of_weights, r.sum_of_weights2,
+                  sqlite3.Binary(r.clusters.astype(numpy.int64).tobytes()))
+                 for r
+                 in records]
+            )
+        return len(records)
+
+    def record(self, path, tree):
+        """Returns the record of a tree in a file, if it is up to date.
+
+        Args:
+            path: The path of the file
+            tree: The path of the tree within the file
+
+        Returns:
+            A FileRecord, or None if the file is not recorded or has changed
+            since it was recorded.
+        """
+        path = abspath(path)
+        stored = self._stored(path, tree)
+        if stored is None or \
+                stored.size != getsize(path) or \
+                stored.mtime != getmtime(path):
+            return None
+        return stored
+
+    def records(self, process):
+        """Returns the records of the files of a process.
+
+        Args:
+            process: The process to consider
+
+        Returns:
+            A list of FileRecords, one per file (of each subprocess, for
+            combined processes).
+
+        Raises:
+            RuntimeError: If any file is not recorded or has changed since it
+                was recorded.
+        """
+        result = []
+        for p in expanded(process):
+            for f in p.files():
+                record = self.record(f, p.tree())
+                if record is None:
+                    raise RuntimeError('file not (up to date) in catalog: '
+                                       '{0}'.format(f))
+                result.append(record)
+        return result
+
+    def entries(self, process):
+        """Returns the number of entries of a process.
+        """
+        return sum((r.entries for r in self.records(process)))
+
+    def sum_of_weights(self, process):
+        """Returns the sum of MC weights of a process.
+        """
+        return sum((r.sum_of_weights for r in self.records(process)))
+
+    def size(self, process):
+        """Returns the total size of the files of a process, in bytes.
+        """
+        return sum((r.size for r in self.records(process)))
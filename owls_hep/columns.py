@@ -0,0 +1,244 @@
+"""Provides a calculation for exporting event columns, e.g. as inputs for
+machine learning training.
+
+The Columns calculation streams the values of expressions and the combined
+selection/weight of selected events in chunks of bounded size.  Expressions
+are evaluated by TTree::Draw, so only the branches which they reference are
+read.  Columns can be iterated over in memory, or exported to chunked NumPy
+.npz files, in which case the files of a process are processed in parallel.
+"""
+
+
+# System imports
+from os import makedirs
+from os.path import join, isdir, isfile, basename
+from hashlib import sha1
+
+# NumPy imports
+import numpy
+
+# Six imports
+from six import string_types
+
+# owls-cache imports
+from owls_cache.persistent import cached as persistently_cached
+
+# owls-parallel imports
+from owls_parallel import parallelized
+
+# owls-hep imports
+from owls_hep.calculation import Calculation
+from owls_hep.expression import multiplied
+from owls_hep.schema import tree_schema
+from owls_hep.utility import make_selection, draw_values
+
+
+# Set up default exports
+__all__ = [
+    'Columns',
+]
+
+
+def _chunks(process, region, expressions, chunk_size, files = None):
+    """Generates (values, weights) chunks of selected events of a process in
+    a region.
+    """
+    return draw_values(process.load(files),
+                       expressions,
+                       make_selection(process, region),
+                       chunk_size)
+
+
+def _write_columns(process, region, expressions, chunk_size, file, prefix):
+    """Exports the columns of selected events of a single file of a process
+    to .npz files.
+
+    Args:
+        process: The process whose events should be exported
+        region: The region whose weighting/selection should be applied
+        expressions: A tuple of expression strings
+        chunk_size: The maximum number of events per chunk
+        file: The process file to export
+        prefix: The path prefix for the output files, to which the chunk
+            index and extension are appended
+
+    Returns:
+        A tuple of the paths of the written files.
+    """
+    # Friends without an index are aligned with the full chain by entry
+    # number, so they require loading the full chain and processing the
+    # entries of the file.  TTree::Draw only reads the requested entry range,
+    # unless the chain is restricted by an entry list, whose positions don't
+    # correspond to chain entries.
+    if any((index is None for _, _, index in process.friends())):
+        offsets = numpy.cumsum(
+            [0] + [tree_schema(f, process.tree()).entries()
+                   for f
+                   in process.files()]
+        )
+        i = process.files().index(file)
+        first, last = int(offsets[i]), int(offsets[i + 1])
+        if getattr(process, '_restriction', None) is None:
+            chunks = draw_values(process.load(),
+                                 expressions,
+                                 make_selection(process, region),
+                                 chunk_size,
+                                 first,
+                                 last - first)
+        else:
+            chunks = draw_values(process.load(),
+                                 expressions,
+                                 multiplied('(Entry$ >= {0} && Entry$ < {1})'
+                                            .format(first, last),
+                                            make_selection(process, region)),
+                                 chunk_size)
+    else:
+        chunks = _chunks(process, region, expressions, chunk_size, (file,))
+
+    # Write the chunks
+    result = []
+    for i, (values, weights) in enumerate(chunks):
+        path = '{0}_{1:04d}.npz'.format(prefix, i)
+        numpy.savez(path,
+                    values = values,
+                    weights = weights,
+                    expressions = numpy.array(expressions))
+        result.append(path)
+    return tuple(result)
+
+
+# Dummy function to return fake values when parallelizing
+def _export_mocker(process, region, expressions, chunk_size, file, prefix):
+    return ()
+
+
+@parallelized(_export_mocker, lambda p, r, e, c, f, x: (p, f))
+@persistently_cached('owls_hep.columns._export')
+def _export(process, region, expressions, chunk_size, file, prefix):
+    """Exports the columns of selected events of a single file of a process
+    to .npz files, caching the paths of the written files.
+
+    See _write_columns for arguments and return value.
+    """
+    return _write_columns(process,
+                          region,
+                          expressions,
+                          chunk_size,
+                          file,
+                          prefix)
+
+
+class Columns(Calculation):
+    """A calculation which extracts the values of expressions and the
+    selection/weight of selected events as NumPy arrays.
+    """
+
+    def __init__(self, expressions, chunk_size = 100000):
+        """Initializes a new instance of the Columns calculation.
+
+        Args:
+            expressions: The expression (as a string) or expressions (as a
+                tuple of strings), in terms of dataset variables, to extract
+            chunk_size: The maximum number of events held in memory at a time
+        """
+        # Store parameters
+        if isinstance(expressions, string_types):
+            self._expressions = (expressions,)
+        else:
+            self._expressions = tuple(expressions)
+        self._chunk_size = chunk_size
+
+    def expressions(self):
+        """Returns the expressions of the columns.
+        """
+        return self._expressions
+
+    def iterate(self, process, region):
+        """Iterates over the columns of selected events in chunks.
+
+        Args:
+            process: The process whose events should be extracted
+            region: The region providing selection/weighting
+
+        Returns:
+            A generator yielding (values, weights) tuples, where values is a
+            NumPy array of shape (rows, len(expressions)) and weights is a
+            NumPy array of the combined selection/weight of each row.
+        """
+        return _chunks(process, region, self._expressions, self._chunk_size)
+
+    def __call__(self, process, region):
+        """Extracts the columns of all selected events.
+
+        Note that this holds all selected events in memory.  Use iterate or
+        export for large samples.
+
+        Args:
+            process: The process whose events should be extracted
+            region: The region providing selection/weighting
+
+        Returns:
+            A tuple (values, weights) of NumPy arrays, as described in
+            iterate.
+        """
+        values = [numpy.empty((0, len(self._expressions)))]
+        weights = [numpy.empty(0)]
+        for v, w in self.iterate(process, region):
+            values.append(v)
+            weights.append(w)
+        return (numpy.concatenate(values), numpy.concatenate(weights))
+
+    def export(self, process, region, directory):
+        """Exports the columns of selected events to .npz files, with one job
+        per process file.
+
+        Each file contains the arrays 'values' and 'weights' (as described in
+        iterate), and 'expressions', the array of expression strings.
+
+        Args:
+            process: The process whose events should be exported
+            region: The region providing selection/weighting
+            directory: The directory in which to create the files
+
+        Returns:
+            A tuple of the paths of the written files.  When running in a
+            parallelized environment, the files are only written (and the
+            paths only returned) once jobs have been executed.
+        """
+        # Create the output directory if necessary
+        if not isdir(directory):
+            makedirs(directory)
+
+        # Identify outputs by the process, region and expressions, so that
+        # several exports can share a directory
+        identifier = sha1(repr((hash(process),
+                                hash(region),
+                                self._expressions)).encode('utf-8'))\
+            .hexdigest()[:12]
+
+        # Export each file
+        result = ()
+        for i, f in enumerate(process.files()):
+            prefix = join(directory, '{0}_{1:03d}_{2}'.format(
+                identifier,
+                i,
+                basename(f).split('.')[0]
+            ))
+            paths = _export(process,
+                            region,
+                            self._expressions,
+                            self._chunk_size,
+                            f,
+                            prefix)
+
+            # Cached paths of files which have since been removed are
+            # regenerated in place
+            if not all((isfile(p) for p in paths)):
+                paths = _write_columns(process,
+                                       region,
+                                       self._expressions,
+                                       self._chunk_size,
+                                       f,
+                                       prefix)
+            result += paths
+        return result
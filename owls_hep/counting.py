@@ -14,18 +14,27 @@ from owls_parallel import parallelized
 from owls_hep.calculation import Calculation
 from owls_hep.utility import make_selection, integral, create_histogram
 
-@parallelized(lambda p, r: 1.0, lambda p, r: (p, r))
-@persistently_cached('owls_hep.counting._count', lambda p, r: (p, r))
-def _count(process, region):
+
+@parallelized(lambda p, r, c = None: 1.0, lambda p, r, c = None: (p, r))
+@persistently_cached('owls_hep.counting._count',
+                     lambda p, r, c = None: (p, r))
+def _count(process, region, precomputed = None):
     """Computes the weighted event count of a process in a region.
 
     Args:
         process: The process whose events should be counted
         region: The region whose weighting/selection should be applied
+        precomputed: A count of the process in the region which has already
+            been computed by other means, or None to compute it.  It is not
+            part of the cache key (see store_count).
 
     Returns:
         The weighted event count in the region.
     """
+    # Use a precomputed count if available
+    if precomputed is not None:
+        return precomputed
+
     # Create a unique name for the histogram
     name = uuid4().hex
 
@@ -46,6 +55,20 @@ def _count(process, region):
     # bins
     return integral(h, include_overflow=True)
 
+
+def store_count(process, region, count):
+    """Stores a count which has already been computed by other means (e.g. by
+    owls_hep.yields) in the cache of Count, unless a count is already cached,
+    without a pass over the data.
+
+    Args:
+        process: The process of the count
+        region: The region of the count
+        count: The weighted event count of the process in the region
+    """
+    _count(process, region, float(count))
+
+
 class Count(Calculation):
     """A counting calculation.
 
@@ -0,0 +1,187 @@
+"""Provides a calculation for computing cutflows in a single pass.
+
+Computing a cutflow by counting a series of regions with progressively more
+Filtered variations requires one pass over the data per cut.  The Cutflow
+calculation instead evaluates, in a single pass, the number of cuts passed by
+each event as one column of nested conditionals, which stops evaluating cuts
+at the first one that fails.
+"""
+
+
+# System imports
+from uuid import uuid4
+
+# NumPy imports
+import numpy
+
+# owls-cache imports
+from owls_cache.persistent import cached as persistently_cached
+
+# owls-parallel imports
+from owls_parallel import parallelized
+
+# owls-hep imports
+from owls_hep.calculation import Calculation
+from owls_hep.utility import make_selection, create_histogram, \
+    draw_values, set_histogram_content
+
+
+# Set up default exports
+__all__ = [
+    'Cutflow',
+]
+
+
+def _cutflow_histogram(cuts):
+    """Creates an empty cutflow histogram with one bin for the base selection
+    and one bin for each cut.
+    """
+    return create_histogram(1,
+                            uuid4().hex,
+                            ((len(cuts) + 1, 0.5, len(cuts) + 1.5),))
+
+
+def _passing(counts):
+    """Converts counts per number of steps passed into histogram contents
+    (including empty underflow and overflow bins) of the counts passing each
+    step.
+    """
+    result = numpy.zeros(len(counts) + 1)
+    result[1:-1] = numpy.cumsum(counts[:0:-1])[::-1]
+    return result
+
+
+# Dummy function to return fake values when parallelizing
+def _cutflow_mocker(process, region, cuts):
+    return (_cutflow_histogram(cuts), _cutflow_histogram(cuts))
+
+
+@parallelized(_cutflow_mocker, lambda p, r, c: (p, r))
+@persistently_cached('owls_hep.cutflow._cutflow')
+def _cutflow(process, region, cuts):
+    """Computes the weighted and unweighted event counts of a process after
+    each cut of a cutflow.
+
+    Args:
+        process: The process whose events should be counted
+        region: The region providing the base selection/weighting
+        cuts: A tuple of cut expressions, in the order they are applied
+
+    Returns:
+        A tuple of ROOT histograms (weighted, unweighted), with bin 1
+        containing the counts in the region and bin i + 1 the counts after
+        the i-th cut.
+    """
+    # Evaluate the number of steps passed by each entry as a single column
+    # of nested conditionals, so that the cuts after the first failed one
+    # are not evaluated.  The leading step applies the process patches.
+    steps = (process.patches() or '1',) + tuple(cuts)
+    depth = str(len(steps))
+    for i in reversed(range(len(steps))):
+        depth = '(({0}) ? {1} : {2})'.format(steps[i], depth, i)
+
+    # Only read entries passing the region selection, carrying the weight as
+    # a separate column so that entries with zero weight are still counted
+    # in the unweighted cutflow
+    weight = make_selection(process, region) or '1'
+
+    # Accumulate weighted and unweighted counts per number of steps passed
+    bins = len(steps) + 1
+    counts = numpy.zeros(bins)
+    sumw = numpy.zeros(bins)
+    sumw2 = numpy.zeros(bins)
+    chain = process.load()
+    for values, _ in draw_values(chain, (depth, weight), region.selection()):
+        passed = values[:, 0].astype(numpy.int64)
+        weights = values[:, 1]
+        counts += numpy.bincount(passed, minlength = bins)
+        sumw += numpy.bincount(passed, weights = weights, minlength = bins)
+        sumw2 += numpy.bincount(passed,
+                                weights = weights * weights,
+                                minlength = bins)
+
+    # Create the histograms
+    weighted = _cutflow_histogram(cuts)
+    set_histogram_content(weighted, _passing(sumw), _passing(sumw2))
+    unweighted = _cutflow_histogram(cuts)
+    set_histogram_content(unweighted, _passing(counts), _passing(counts))
+    return (weighted, unweighted)
+
+
+class Cutflow(Calculation):
+    """A cutflow calculation which generates a ROOT TH1 histogram with one
+    bin for the base region and one bin for each cut.
+
+    The result is compatible with owls_hep.algebra and can thus be used with
+    owls_hep.estimation.Estimation.
+    """
+
+    def __init__(self, cuts, labels, weighted = True,
+                 base_label = 'Base selection', title = '',
+                 y_label = 'Events'):
+        """Initializes a new instance of the Cutflow calculation.
+
+        Args:
+            cuts: An iterable of cut expressions, in terms of dataset
+                variables, in the order they are applied
+            labels: An iterable of labels for the cuts, one per cut
+            weighted: Whether to compute weighted or unweighted counts.  Both
+                are cached together, so switching is free.
+            base_label: The label for the bin of the base region
+            title: The ROOT TLatex label to use for the histogram title
+            y_label: The ROOT TLatex label to use for the y-axis
+        """
+        # Store parameters
+        self._cuts = tuple(cuts)
+        self._labels = tuple(labels)
+        self._weighted = weighted
+        self._base_label = base_label
+        self._title = title
+        self._y_label = y_label
+
+        # Validate parameters
+        if len(self._cuts) == 0:
+            raise ValueError('must provide at least one cut')
+        if len(self._labels) != len(self._cuts):
+            raise ValueError('must provide one label per cut')
+
+    def cuts(self):
+        """Returns the cut expressions of the cutflow.
+        """
+        return self._cuts
+
+    def labels(self):
+        """Returns the labels of the bins of the cutflow, including the base
+        region bin.
+        """
+        return (self._base_label,) + self._labels
+
+    def __call__(self, process, region):
+        """Counts events passing a region's selection and each successive
+        cut.
+
+        Args:
+            process: The process whose events should be counted
+            region: The region providing base selection/weighting
+
+        Returns:
+            A ROOT histogram of the cutflow.
+        """
+        # Compute the cutflow and select the requested counts
+        weighted, unweighted = _cutflow(process, region, self._cuts)
+        result = (weighted if self._weighted else unweighted).Clone(
+            uuid4().hex
+        )
+
+        # Set labels
+        result.SetTitle(self._title)
+        axis = result.GetXaxis()
+        for i, label in enumerate(self.labels()):
+            axis.SetBinLabel(i + 1, label)
+        result.GetYaxis().SetTitle(self._y_label)
+
+        # Style the histogram
+        process.style(result)
+
+        # All done
+        return result
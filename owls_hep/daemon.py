@@ -0,0 +1,418 @@
+"""Provides a long-lived local analysis server and its clients.
+
+Every analysis script run pays for ROOT startup, chain construction and cache
+warm-up.  The Server keeps ROOT initialized, retains loaded chains (including
+friends and their indices, see owls_hep.process.retain_chains) and holds an
+in-memory cache of results, and executes calculations (e.g. Histogram, Count
+or Efficiency) on behalf of thin clients connecting over a Unix socket.
+
+Start a server with:
+
+    python -m owls_hep.daemon [socket_path]
+
+and wrap calculations with Remote to have them executed by the server:
+
+    histogram = Remote(Histogram(...), Client())
+
+Requests and results are exchanged as pickles, so the socket is created in
+a directory only accessible by the user running the server (by default
+$XDG_RUNTIME_DIR, or a private directory in the temporary directory), and
+clients refuse to talk to sockets owned by other users.
+"""
+
+
+# System imports
+import os
+import stat
+import argparse
+import socket
+import struct
+import traceback
+from os.path import dirname, exists, isdir, join
+from tempfile import gettempdir
+from hashlib import sha1
+from collections import OrderedDict
+
+# Six imports
+from six.moves import cPickle as pickle
+
+# owls-hep imports
+from owls_hep.calculation import Calculation
+from owls_hep.output import print_error
+
+
+# Set up default exports
+__all__ = [
+    'default_socket_path',
+    'Server',
+    'Client',
+    'Remote',
+]
+
+
+# The header preceding each message, containing the message length
+_HEADER = struct.Struct('!Q')
+
+
+def default_socket_path():
+    """Returns the default path of the server socket, which is specific to
+    the current user.
+    """
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        directory = join(gettempdir(), 'owls-hep-{0}'.format(os.getuid()))
+    return join(directory, 'owls-hep.sock')
+
+
+def _check_owner(path, private = False):
+    """Checks that a path is owned by the current user and, if private, that
+    it is not accessible by other users.
+
+    Raises:
+        RuntimeError: If the check fails.
+    """
+    info = os.lstat(path)
+    if info.st_uid != os.getuid():
+        raise RuntimeError('{0} is owned by another user'.format(path))
+    if private and stat.S_IMODE(info.st_mode) & 0o077:
+        raise RuntimeError('{0} is accessible by other users'.format(path))
+
+
+def _send(connection, message):
+    """Sends a pickled message over a socket.
+    """
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    connection.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _receive_exactly(connection, size):
+    """Receives exactly size bytes from a socket, or returns None if the
+    connection is closed before any data is received.
+    """
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = connection.recv(min(remaining, 1 << 20))
+        if not chunk:
+            if remaining == size:
+                return None
+            raise RuntimeError('connection closed mid-message')
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def _receive(connection):
+    """Receives a pickled message from a socket, or returns None if the
+    connection is closed.
+    """
+    header = _receive_exactly(connection, _HEADER.size)
+    if header is None:
+        return None
+    data = _receive_exactly(connection, _HEADER.unpack(header)[0])
+    if data is None:
+        raise RuntimeError('connection closed mid-message')
+    return pickle.loads(data)
+
+
+class Server(object):
+    """A server executing calculations for clients over a Unix socket.
+
+    Connections are served one at a time, so calculations never run
+    concurrently.
+    """
+
+    def __init__(self, path = None, cache_size = 256, chain_cache_size = 16,
+                 timeout = 30.0):
+        """Initializes a new instance of the Server class.
+
+        Args:
+            path: The path of the Unix socket, or None to use
+                default_socket_path()
+            cache_size: The maximum number of results to keep in memory
+            chain_cache_size: The maximum number of loaded chains to keep in
+                memory
+            timeout: The maximum time, in seconds, to wait for a client to
+                send (or receive) data, so that stalled clients can't block
+                the server
+        """
+        # Store parameters
+        self._path = default_socket_path() if path is None else path
+        self._cache_size = cache_size
+        self._chain_cache_size = chain_cache_size
+        self._timeout = timeout
+
+        # Create the result cache, with the least recently used entries first
+        self._results = OrderedDict()
+
+    def path(self):
+        """Returns the path of the server socket.
+        """
+        return self._path
+
+    def _calculate(self, calculation, process, region):
+        """Executes a calculation, using the result cache.
+        """
+        # The process state excludes its style, which is applied to results
+        key = (sha1(pickle.dumps(calculation, pickle.HIGHEST_PROTOCOL))
+               .hexdigest(),
+               hash(process),
+               process.style_state(),
+               hash(region))
+        try:
+            result = self._results.pop(key)
+        except KeyError:
+            result = calculation(process, region)
+        self._results[key] = result
+        while len(self._results) > self._cache_size:
+            self._results.popitem(last = False)
+        return result
+
+    def _handle(self, request):
+        """Handles a request, returning a (running, response) tuple.
+        """
+        command, arguments = request
+        if command == 'calculate':
+            return (True, ('ok', self._calculate(*arguments)))
+        elif command == 'ping':
+            return (True, ('ok', None))
+        elif command == 'clear':
+            from owls_hep.process import clear_retained_chains
+            self._results.clear()
+            clear_retained_chains()
+            return (True, ('ok', None))
+        elif command == 'shutdown':
+            return (False, ('ok', None))
+        raise ValueError('unknown command: {0}'.format(command))
+
+    def _serve_connection(self, connection):
+        """Serves a single request on a connection, returning whether or not
+        to keep serving.
+        """
+        request = _receive(connection)
+        if request is None:
+            return True
+        try:
+            running, response = self._handle(request)
+        except Exception as e:
+            running, response = True, ('error', '{0}: {1}'.format(
+                type(e).__name__, e
+            ))
+        _send(connection, response)
+        return running
+
+    def _listen(self):
+        """Creates the listening socket, accessible only by the current user.
+        """
+        # Create the socket directory if necessary.  The default directory
+        # must be private.
+        directory = dirname(self._path) or '.'
+        if not isdir(directory):
+            os.makedirs(directory, 0o700)
+        if self._path == default_socket_path():
+            _check_owner(directory, private = True)
+
+        # Bind with a restrictive umask, so that the socket is never
+        # accessible by other users
+        if exists(self._path):
+            os.unlink(self._path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            listener.bind(self._path)
+        except Exception:
+            listener.close()
+            raise
+        finally:
+            os.umask(umask)
+        listener.listen(8)
+        return listener
+
+    def serve(self):
+        """Serves requests until a client requests shutdown.
+
+        Each connection carries a single request.  Errors on a connection
+        (e.g. clients disconnecting mid-request or timing out) are reported
+        and only close that connection.
+        """
+        # Warm up ROOT and retain chains between requests
+        import owls_hep.pyroot
+        from owls_hep.process import retain_chains
+        retain_chains(size = self._chain_cache_size)
+
+        # Serve connections
+        listener = self._listen()
+        try:
+            running = True
+            while running:
+                connection, _ = listener.accept()
+                try:
+                    connection.settimeout(self._timeout)
+                    running = self._serve_connection(connection)
+                except Exception:
+                    print_error('failed to serve connection:\n{0}'.format(
+                        traceback.format_exc()
+                    ))
+                finally:
+                    connection.close()
+        finally:
+            listener.close()
+            if exists(self._path):
+                os.unlink(self._path)
+
+
+class Client(object):
+    """A client for a Server.
+
+    Each request uses its own connection, so that any number of clients (in
+    one or several scripts) can share a server.
+    """
+
+    def __init__(self, path = None):
+        """Initializes a new instance of the Client class.
+
+        Args:
+            path: The path of the server socket, or None to use
+                default_socket_path()
+        """
+        self._path = default_socket_path() if path is None else path
+
+    def _request(self, command, *arguments):
+        """Sends a request to the server and returns the result.
+        """
+        # Only unpickle responses of servers run by the current user
+        _check_owner(self._path)
+
+        # Send the request and receive the response
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self._path)
+            _send(connection, (command, arguments))
+            response = _receive(connection)
+        finally:
+            connection.close()
+        if response is None:
+            raise RuntimeError('server closed the connection')
+
+        # Unpack the response
+        status, result = response
+        if status != 'ok':
+            raise RuntimeError('server error: {0}'.format(result))
+        return result
+
+    def calculate(self, calculation, process, region):
+        """Executes a calculation on the server.
+
+        Args:
+            calculation: The calculation, which must be picklable
+            process: The process to pass to the calculation
+            region: The region to pass to the calculation
+
+        Returns:
+            The result of the calculation.
+        """
+        return self._request('calculate', calculation, process, region)
+
+    def ping(self):
+        """Checks that the server is responding.
+        """
+        self._request('ping')
+
+    def clear(self):
+        """Clears the result and chain caches of the server.
+        """
+        self._request('clear')
+
+    def shutdown(self):
+        """Shuts down the server.
+        """
+        self._request('shutdown')
+
+
+# The client shared by Remote calculations without an explicit client
+_default_client = None
+
+
+def _shared_client():
+    """Returns the client for the default socket path, shared by Remote
+    calculations.
+    """
+    global _default_client
+    if _default_client is None:
+        _default_client = Client()
+    return _default_client
+
+
+class Remote(Calculation):
+    """A calculation wrapper which executes the wrapped calculation on a
+    Server.
+    """
+
+    def __init__(self, calculation, client = None):
+        """Initializes a new instance of the Remote class.
+
+        Args:
+            calculation: The calculation to execute remotely
+            client: The Client to use, or None to use a client for the
+                default socket path shared by all Remote calculations
+        """
+        self._calculation = calculation
+        self._client = _shared_client() if client is None else client
+
+    @property
+    def calculation(self):
+        """Returns the wrapped calculation.
+        """
+        return self._calculation
+
+    def __call__(self, process, region):
+        """Executes the wrapped calculation on the server.
+
+        Args:
+            process: The process to pass to the calculation
+            region: The region to pass to the calculation
+
+        Returns:
+            The result of the calculation.
+        """
+        return self._client.calculate(self._calculation, process, region)
+
+    def finalize_result(self, result):
+        """Polishes the result as the wrapped calculation would.
+        """
+        self._calculation.finalize_result(result)
+
+
+def main():
+    """Runs a server until a client requests shutdown.
+    """
+    parser = argparse.ArgumentParser(description = 'Run an owls-hep '
+                                                   'analysis server')
+    parser.add_argument('path',
+                        nargs = '?',
+                        default = None,
+                        help = 'the path of the server socket')
+    parser.add_argument('--cache-size',
+                        type = int,
+                        default = 256,
+                        help = 'the maximum number of results to keep in '
+                               'memory')
+    parser.add_argument('--chain-cache-size',
+                        type = int,
+                        default = 16,
+                        help = 'the maximum number of loaded chains to keep '
+                               'in memory')
+    parser.add_argument('--timeout',
+                        type = float,
+                        default = 30.0,
+                        help = 'the maximum time in seconds to wait for '
+                               'clients to send or receive data')
+    arguments = parser.parse_args()
+    Server(arguments.path,
+           arguments.cache_size,
+           arguments.chain_cache_size,
+           arguments.timeout).serve()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+"""Provides duplicate-event removal when combining overlapping data streams.
+
+Data processes built from several overlapping streams contain some events
+more than once.  The Deduplicated calculation fills a Count or (non-sparse)
+Histogram calculation from several stream processes in turn, tracking the
+(run, event) keys of selected events in an owls_hep.keyset.KeySet, so that
+each event is counted once.  Streams combines the stream processes into a
+single process which estimations do not split into its streams, so that
+Deduplicated calculations can be used with estimations and plots.
+"""
+
+
+# System imports
+from copy import copy
+from uuid import uuid4
+
+# NumPy imports
+import numpy
+
+# owls-cache imports
+from owls_cache.persistent import cached as persistently_cached
+
+# owls-parallel imports
+from owls_parallel import parallelized
+
+# owls-hep imports
+from owls_hep.calculation import HigherOrderCalculation
+from owls_hep.counting import Count
+from owls_hep.histogramming import Histogram
+from owls_hep.arrays import ArrayHistogram
+from owls_hep.binning import bin_edges, draw_cell_indices
+from owls_hep.keyset import KeySet
+from owls_hep.process import MultiProcess, expanded
+from owls_hep.utility import make_selection, create_histogram, draw_values
+
+
+# Set up default exports
+__all__ = [
+    'Streams',
+    'Deduplicated',
+]
+
+
+# Dummy function to return fake values when parallelizing
+def _deduplicated_mocker(processes, region, keys, expressions, binnings):
+    shape = tuple((len(bin_edges(b)) + 1 for b in binnings))
+    return (numpy.zeros(shape), numpy.zeros(shape), 0)
+
+
+@parallelized(_deduplicated_mocker, lambda p, r, k, e, b: (p, r))
+@persistently_cached('owls_hep.deduplication._deduplicated')
+def _deduplicated(processes, region, keys, expressions, binnings):
+    """Computes a histogram (or count) of the union of the events of several
+    processes in a region, counting each event once.
+
+    Args:
+        processes: A tuple of processes, in order of precedence
+        region: The region whose weighting/selection should be applied
+        keys: A tuple of the run and event number expressions
+        expressions: A tuple of expression strings (empty for counts)
+        binnings: A tuple of binnings, one per expression
+
+    Returns:
+        A tuple (sumw, sumw2, duplicates), where sumw and sumw2 are NumPy
+        arrays of the sum of weights and sum of squared weights of the
+        histogram cells (as in owls_hep.arrays.ArrayHistogram, or of shape ()
+        for counts), and duplicates is the number of removed events.
+    """
+    # Compute the cell layout
+    edges = tuple((bin_edges(b) for b in binnings))
+    shape = tuple((len(e) + 1 for e in edges))
+    size = int(numpy.prod(shape))
+
+    # Fill from each process in turn, skipping events seen before
+    seen = KeySet()
+    sumw = numpy.zeros(size)
+    sumw2 = numpy.zeros(size)
+    duplicates = 0
+    for process in processes:
+        chain = process.load()
+        for values, weights in draw_values(chain,
+                                           keys + expressions,
+                                           make_selection(process, region)):
+            unseen = seen.add_unseen(values[:, 0].astype(numpy.int64),
+                                     values[:, 1].astype(numpy.int64))
+            duplicates += int(len(unseen) - unseen.sum())
+            values, weights = values[unseen], weights[unseen]
+            index = draw_cell_indices(edges, values[:, 2:])
+            sumw += numpy.bincount(index,
+                                   weights = weights,
+                                   minlength = size)
+            sumw2 += numpy.bincount(index,
+                                    weights = weights * weights,
+                                    minlength = size)
+
+    return (sumw.reshape(shape), sumw2.reshape(shape), duplicates)
+
+
+class Streams(object):
+    """Represents the union of the events of several overlapping stream
+    processes, which should be rendered according to a certain style.
+
+    Unlike a MultiProcess, whose results are the sums of the results of its
+    subprocesses, the events of a Streams process can only be evaluated as a
+    whole by a Deduplicated calculation.  Estimations therefore do not split
+    it into its streams.
+    """
+
+    def __init__(self,
+                 streams,
+                 tree,
+                 label,
+                 line_color = 1,
+                 fill_color = 0,
+                 marker_style = None,
+                 metadata = {}):
+        """Initializes a new instance of the Streams class.
+
+        Args:
+            streams: An iterable of stream processes, in order of precedence
+            tree: The ROOT TTree path to use for all streams, or None to use
+                the trees of the streams
+            label: The ROOT TLatex label string to use when rendering the
+                process
+            line_color: The ROOT TColor number or hex string (#rrggbb) to use
+                as the line color when rendering the process
+            fill_color: The ROOT TColor number or hex string (#rrggbb) to use
+                as the fill color when rendering the process
+            marker_style: The ROOT TMarker number to use as the marker style
+                when rendering the process
+            metadata: A (pickleable) object containing optional metadata
+        """
+        # The combined process provides validation, styling and the common
+        # properties of the streams
+        self._combined = MultiProcess(streams,
+                                      tree,
+                                      label,
+                                      line_color,
+                                      fill_color,
+                                      marker_style,
+                                      metadata)
+
+    def __hash__(self):
+        """Returns a hash for the process.
+        """
+        # Hash the state
+        return hash(self.state())
+
+    def __repr__(self):
+        return 'Streams({0!r})'.format(self._combined)
+
+    def state(self):
+        """Returns the state for the process, i.e. the states of its streams.
+        """
+        return ('streams',) + self._combined.state()
+
+    def streams(self):
+        """Returns the (non-combined) stream processes, in order of
+        precedence.
+        """
+        return expanded(self._combined)
+
+    def label(self):
+        """Returns the label of the process.
+        """
+        return self._combined.label()
+
+    def style_state(self):
+        """Returns the attributes of the process which affect the styling of
+        results, which are not part of the state.
+        """
+        return self._combined.style_state()
+
+    def files(self):
+        """Returns the files of all streams.
+        """
+        return self._combined.files()
+
+    def tree(self):
+        """Returns the tree path common to all streams.
+        """
+        return self._combined.tree()
+
+    def sample_type(self):
+        """Returns the sample type common to all streams.
+        """
+        return self._combined.sample_type()
+
+    def friends(self):
+        """Returns the friends common to all streams.
+        """
+        return self._combined.friends()
+
+    def patches(self):
+        """Returns the expression of patches common to all streams.
+        """
+        return self._combined.patches()
+
+    def metadata(self):
+        """Returns the metadata for the process, if any.
+        """
+        return self._combined.metadata()
+
+    def load(self, files = None):
+        """Streams can not be loaded as a single chain, since it would
+        contain duplicate events.
+
+        Raises:
+            RuntimeError: Always.
+        """
+        raise RuntimeError('streams can only be evaluated by Deduplicated '
+                           'calculations')
+
+    def retreed(self, tree):
+        """Creates a new copy of the process with a different tree for all
+        streams.
+
+        Args:
+            tree: The tree to set for the new process
+
+        Returns:
+            A copy of the process with the tree modified.
+        """
+        result = copy(self)
+        result._combined = self._combined.retreed(tree)
+        return result
+
+    def patched(self,
+                patch,
+                label = None,
+                line_color = None,
+                fill_color = None,
+                marker_style = None,
+                metadata = None):
+        """Creates a new copy of the process with a patch applied to all
+        streams.
+
+        Args:
+            patch: The patch to apply in the new process
+
+        Returns:
+            A copy of the process with the additional patch applied.
+        """
+        result = copy(self)
+        result._combined = self._combined.patched(patch,
+                                                  label,
+                                                  line_color,
+                                                  fill_color,
+                                                  marker_style,
+                                                  metadata)
+        return result
+
+    def style(self, histogram):
+        """Applies the process' style to a histogram.
+
+        Args:
+            histogram: The histogram to style
+        """
+        self._combined.style(histogram)
+
+
+class Deduplicated(HigherOrderCalculation):
+    """A higher order calculation which computes the result of a Count or
+    (non-sparse) Histogram calculation for the union of the events of several
+    overlapping stream processes, counting each event once.
+
+    The calculation is called with a Streams process (or a MultiProcess, if
+    it is not evaluated through an estimation, which would split it into its
+    subprocesses).  Events are taken from the first stream in which they pass
+    the region selection (including the patches of that stream).  Other
+    processes are treated as a single stream.
+    """
+
+    def __init__(self, calculation, run_expression = 'RunNumber',
+                 event_expression = 'EventNumber'):
+        """Initializes a new instance of the Deduplicated class.
+
+        Args:
+            calculation: The underlying Count or Histogram calculation
+            run_expression: The expression evaluating to the run number
+            event_expression: The expression evaluating to the event number
+        """
+        # Call the superclass initializer
+        super(Deduplicated, self).__init__(calculation)
+
+        # Validate the calculation
+        if isinstance(calculation, Histogram):
+            if calculation.sparse():
+                raise ValueError('sparse histograms can not be deduplicated')
+        elif not isinstance(calculation, Count):
+            raise ValueError('only Count and Histogram calculations can be '
+                             'deduplicated')
+
+        # Store parameters
+        self._keys = (run_expression, event_expression)
+
+    def __call__(self, process, region):
+        """Computes the result of the underlying calculation for the union of
+        the events of the streams of a process.
+
+        Args:
+            process: The Streams process (or other process) to consider
+            region: The region to consider
+
+        Returns:
+            The result of the underlying calculation.
+        """
+        # Compute the deduplicated result
+        if isinstance(process, Streams):
+            processes = process.streams()
+        else:
+            processes = expanded(process)
+        if isinstance(self.calculation, Histogram):
+            expressions = tuple(self.calculation.expressions())
+            binnings = tuple(self.calculation.binnings())
+        else:
+            expressions = binnings = ()
+        sumw, sumw2, _ = _deduplicated(processes,
+                                       region,
+                                       self._keys,
+                                       expressions,
+                                       binnings)
+
+        # Counts are scalars
+        if not isinstance(self.calculation, Histogram):
+            return float(sumw.sum())
+
+        # Convert histograms to ROOT and style them
+        result = ArrayHistogram(
+            tuple((bin_edges(b) for b in binnings)),
+            sumw,
+            sumw2
+        ).to_root(create_histogram(len(binnings), uuid4().hex, binnings))
+        return self.calculation.styled(process, result)
+
+    def finalize_result(self, result):
+        """Polishes the result as the underlying calculation would.
+        """
+        self.calculation.finalize_result(result)
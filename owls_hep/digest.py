@@ -0,0 +1,254 @@
+"""Provides a mergeable streaming quantile sketch.
+
+TDigest implements the merging variant of the t-digest of Dunning and Ertl,
+which summarizes a weighted distribution by a small number of centroids whose
+size is limited by a scale function, such that quantiles near the tails are
+particularly accurate.  Digests can be updated with arrays of values, merged
+(e.g. across files or workers), scaled and pickled (and thus cached).
+"""
+
+
+# System imports
+from math import pi
+
+# NumPy imports
+import numpy
+
+
+# Set up default exports
+__all__ = [
+    'TDigest',
+]
+
+
+class TDigest(object):
+    """A weighted t-digest.
+
+    Centroids are formed with the scale function k(q) = d / pi * arcsin(2 q -
+    1), where d is the compression.  Each centroid spans at most a unit
+    interval in k, so the number of centroids is at most the compression.
+
+    Negative weights (e.g. from NLO generators) are supported in the sense
+    that centroids are formed using absolute weights, while centroid weights
+    are the sum of signed weights.  Centroids with a negative total weight do
+    not contribute to quantiles.
+    """
+
+    def __init__(self, compression = 100, buffer_size = None):
+        """Initializes a new instance of the TDigest class.
+
+        Args:
+            compression: The compression parameter, which controls the
+                accuracy and size of the digest
+            buffer_size: The number of values to buffer before compressing,
+                or None to use 10 times the compression
+        """
+        # Store parameters
+        self._compression = float(compression)
+        if buffer_size is None:
+            buffer_size = int(10 * compression)
+        self._buffer_size = buffer_size
+
+        # Create the (sorted) centroids, the absolute centroid weights used
+        # for merging, and the buffer of unmerged values
+        self._means = numpy.empty(0)
+        self._weights = numpy.empty(0)
+        self._sizes = numpy.empty(0)
+        self._buffer = []
+        self._buffered = 0
+
+        # Track the extrema
+        self._min = numpy.inf
+        self._max = -numpy.inf
+
+    def compression(self):
+        """Returns the compression parameter of the digest.
+        """
+        return self._compression
+
+    def update(self, values, weights = None):
+        """Adds values to the digest.
+
+        Args:
+            values: An array-like of values
+            weights: An array-like of weights, with the same length as
+                values, or None for unit weights
+        """
+        # Convert the inputs
+        values = numpy.asarray(values, dtype = numpy.float64).ravel()
+        if len(values) == 0:
+            return
+        if weights is None:
+            weights = numpy.ones(len(values))
+        else:
+            weights = numpy.asarray(weights, dtype = numpy.float64).ravel()
+            if len(weights) != len(values):
+                raise ValueError('values and weights must have the same '
+                                 'length')
+
+        # Track the extrema
+        self._min = min(self._min, values.min())
+        self._max = max(self._max, values.max())
+
+        # Buffer the values, compressing if necessary
+        self._buffer.append((values, weights, numpy.abs(weights)))
+        self._buffered += len(values)
+        if self._buffered >= self._buffer_size:
+            self._compress()
+
+    def _compress(self):
+        """Merges buffered values into the centroids.
+        """
+        if self._buffered == 0:
+            return
+
+        # Sort the centroids and buffered values together
+        means = numpy.concatenate([self._means] +
+                                  [b[0] for b in self._buffer])
+        weights = numpy.concatenate([self._weights] +
+                                    [b[1] for b in self._buffer])
+        sizes = numpy.concatenate([self._sizes] +
+                                  [b[2] for b in self._buffer])
+        self._buffer = []
+        self._buffered = 0
+        order = numpy.argsort(means, kind = 'mergesort')
+        means, weights, sizes = means[order], weights[order], sizes[order]
+
+        # Assign each point to the unit k-interval containing the quantile of
+        # its left edge, which limits the span of each centroid in k
+        total = sizes.sum()
+        if total <= 0:
+            self._means, self._weights, self._sizes = means, weights, sizes
+            return
+        q = (numpy.cumsum(sizes) - sizes) / total
+        k = self._compression / pi * numpy.arcsin(2.0 * q - 1.0)
+        groups = numpy.floor(k - k[0]).astype(numpy.int64)
+        _, groups = numpy.unique(groups, return_inverse = True)
+        groups = groups.ravel()
+
+        # Combine the points of each group
+        merged_sizes = numpy.bincount(groups, weights = sizes)
+        merged_means = numpy.bincount(groups, weights = sizes * means)
+        with numpy.errstate(invalid = 'ignore', divide = 'ignore'):
+            merged_means = numpy.where(merged_sizes > 0,
+                                       merged_means / merged_sizes,
+                                       numpy.bincount(groups,
+                                                      weights = means) /
+                                       numpy.bincount(groups))
+        self._means = merged_means
+        self._weights = numpy.bincount(groups, weights = weights)
+        self._sizes = merged_sizes
+
+    def centroids(self):
+        """Returns the centroids of the digest.
+
+        Returns:
+            A tuple of NumPy arrays (means, weights), sorted by mean.
+        """
+        self._compress()
+        return (self._means, self._weights)
+
+    def total_weight(self):
+        """Returns the total (signed) weight of the digest.
+        """
+        self._compress()
+        return float(self._weights.sum())
+
+    def merge(self, other):
+        """Merges another digest into this one in place.
+
+        Args:
+            other: The other TDigest
+        """
+        self.add(other)
+
+    def add(self, other, coefficient = 1.0):
+        """Merges a scaled digest into this one in place.
+
+        Args:
+            other: The other TDigest
+            coefficient: The non-negative scale factor to apply to the
+                weights of the other digest
+        """
+        if coefficient < 0:
+            raise ValueError('digests can only be scaled by non-negative '
+                             'coefficients')
+        means, weights = other.centroids()
+        if len(means) == 0:
+            return
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+        self._buffer.append((means,
+                             coefficient * weights,
+                             coefficient * other._sizes))
+        self._buffered += len(means)
+        self._compress()
+
+    def scale(self, coefficient):
+        """Scales the weights of the digest in place.
+
+        Args:
+            coefficient: The non-negative scale factor
+        """
+        if coefficient < 0:
+            raise ValueError('digests can only be scaled by non-negative '
+                             'coefficients')
+        self._compress()
+        self._weights = self._weights * coefficient
+        self._sizes = self._sizes * coefficient
+
+    def copy(self):
+        """Returns a copy of the digest.
+        """
+        self._compress()
+        result = TDigest(self._compression, self._buffer_size)
+        result._means = self._means.copy()
+        result._weights = self._weights.copy()
+        result._sizes = self._sizes.copy()
+        result._min = self._min
+        result._max = self._max
+        return result
+
+    def _interpolation(self):
+        """Returns the cumulative weights and values through which quantiles
+        are interpolated.
+        """
+        self._compress()
+        weights = numpy.maximum(self._weights, 0.0)
+        cumulative = numpy.cumsum(weights) - 0.5 * weights
+        total = weights.sum()
+        return (numpy.concatenate(([0.0], cumulative, [total])),
+                numpy.concatenate(([self._min], self._means, [self._max])),
+                total)
+
+    def quantile(self, q):
+        """Computes quantiles of the distribution.
+
+        Args:
+            q: A quantile or array-like of quantiles, in [0, 1]
+
+        Returns:
+            The quantile value(s), or NaN for an empty digest.
+        """
+        cumulative, values, total = self._interpolation()
+        if total <= 0:
+            return numpy.nan * numpy.asarray(q, dtype = numpy.float64)
+        return numpy.interp(numpy.asarray(q, dtype = numpy.float64) * total,
+                            cumulative,
+                            values)
+
+    def cdf(self, x):
+        """Computes the cumulative distribution function of the distribution.
+
+        Args:
+            x: A value or array-like of values
+
+        Returns:
+            The fraction(s) of the weight below x, or NaN for an empty
+            digest.
+        """
+        cumulative, values, total = self._interpolation()
+        if total <= 0:
+            return numpy.nan * numpy.asarray(x, dtype = numpy.float64)
+        return numpy.interp(x, values, cumulative / total,
+                            left = 0.0, right = 1.0)
@@ -11,6 +11,7 @@ from uuid import uuid4
 from six import string_types
 
 # ROOT imports
+import owls_hep.pyroot
 from ROOT import TH2F, TGraphAsymmErrors
 
 # owls-cache imports
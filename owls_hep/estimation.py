@@ -2,17 +2,24 @@
 """
 
 
+# ROOT imports
+import owls_hep.pyroot
+from ROOT import TH1
+
 # owls-hep imports
 from owls_hep.calculation import HigherOrderCalculation
-from owls_hep.uncertainty import Uncertainty, to_shape
-from owls_hep.algebra import add, multiply
+from owls_hep.uncertainty import Uncertainty
+from owls_hep.algebra import accumulator, accumulate, finalized
 from owls_hep.utility import integral
+from owls_hep.catalog import file_record
+from owls_hep.process import MultiProcess, expanded
 
 
 # Set up default exports
 __all__ = [
     'Estimation',
-    'Plain'
+    'Plain',
+    'NormalizedMonteCarlo',
 ]
 
 # TODO: This is a bit over-engineered. Yeah, definitely over-engineered.
@@ -56,6 +63,28 @@ class Estimation(HigherOrderCalculation):
         """
         raise NotImplementedError('abstract method')
 
+    def expanded_components(self, process, region):
+        """Generates the components of the estimation with combined processes
+        (see owls_hep.process.MultiProcess) expanded into their subprocesses.
+
+        The components of each subprocess of the process are computed
+        separately, and components of combined processes are split into one
+        component per subprocess, so that the underlying calculation is only
+        ever evaluated (and cached) per subprocess.
+
+        Args:
+            process: The process to consider
+            region: The region to consider
+
+        Returns:
+            A list of components, in the form returned by components.
+        """
+        return [(coefficient, use_nominal, p, r)
+                for subprocess in expanded(process)
+                for coefficient, use_nominal, component, r
+                in self.components(subprocess, region)
+                for p in expanded(component)]
+
     def __call__(self, process, region, weighted_combination = True):
         """Executes the background estimation scheme.
 
@@ -79,8 +108,9 @@ class Estimation(HigherOrderCalculation):
         Returns:
             The combined background estimation.
         """
-        # Get components
-        components = self.components(process, region)
+        # Get components, evaluating combined processes per subprocess
+        estimated = process
+        components = self.expanded_components(process, region)
 
         # Watch for empty components
         if len(components) == 0:
@@ -102,73 +132,56 @@ class Estimation(HigherOrderCalculation):
                       for c
                       in components]
 
-        # If we're dealing with an uncertainty calculation, then create a
-        # calculation that will compute a faux-uncertainty ntuple with the
-        # nominal value for components that shouldn't have the uncertainty
-        # applied.  Also have it support the coefficient.
-        if is_uncertainty:
-            def nominal(coefficient, process, region):
-                # self.calculation.calculation is the nominal calculation
-                n = multiply(
-                    coefficient[0],
-                    self.calculation.calculation(process, region)
-                )
-                return (None, None, n, n)
-
-        # If we're dealing with an uncertainty calculation, then create a
-        # calculation that will convert any overall systematics to shape
-        # systematics so that they can be combined with the other components of
-        # the estimation.  Also have it support the coefficient.
+        # Components are combined in place by accumulators (see
+        # owls_hep.algebra), which avoid creating temporary ROOT histograms.
+        # The first value entering an accumulator serves as the template for
+        # the final result.
+        def combined(accumulated, coefficient, value):
+            if accumulated is None:
+                return (accumulator(coefficient, value), value)
+            total, template = accumulated
+            return (accumulate(total, coefficient, value), template)
+
+        # If we're dealing with an uncertainty calculation, then components
+        # that shouldn't have the uncertainty applied contribute their nominal
+        # value to both variations, while any overall systematics of the
+        # other components are converted to shape systematics (as in
+        # owls_hep.uncertainty.to_shape) so that they can be combined.
         if is_uncertainty:
-            def uncertainty(coefficient, process, region):
-                u = self.calculation(process, region)
+            up = down = None
+            for coefficient, use_nominal, process, region in components:
                 # self.calculation.calculation is the nominal calculation
-                n = self.calculation.calculation(process, region)
-                u = to_shape(u, n)
-                return (
-                    None,
-                    None,
-                    multiply(coefficient[1], u[2]),
-                    multiply(coefficient[2], u[3])
-                )
-
-        # Compute the first value which we'll use as the basis of the result
-        coefficient, use_nominal, process, region = components[0]
-        if is_uncertainty:
-            if use_nominal:
-                result = nominal(coefficient, process, region)
-            else:
-                result = uncertainty(coefficient, process, region)
-        else:
-            result = multiply(coefficient[0],
-                              self.calculation(process, region))
-
-        # Compute the remaining values
-        for coefficient, use_nominal, process, region in components[1:]:
-            if is_uncertainty:
                 if use_nominal:
-                    value = nominal(coefficient, process, region)
-                else:
-                    value = uncertainty(coefficient, process, region)
-                result = (
-                    None,
-                    None,
-                    # NOTE: Coefficient already handled above
-                    add(1.0, result[2], 1.0, value[2]),
-                    add(1.0, result[3], 1.0, value[3])
-                )
-            else:
-                result = add(
-                    1.0,
-                    result,
-                    coefficient[0],
+                    n = self.calculation.calculation(process, region)
+                    up = combined(up, coefficient[0], n)
+                    down = combined(down, coefficient[0], n)
+                    continue
+                overall_up, overall_down, shape_up, shape_down = \
                     self.calculation(process, region)
-                )
+                if overall_up is not None and overall_down is not None:
+                    n = self.calculation.calculation(process, region)
+                    up = combined(up, coefficient[1] * overall_up, n)
+                    down = combined(down, coefficient[2] * overall_down, n)
+                else:
+                    up = combined(up, coefficient[1], shape_up)
+                    down = combined(down, coefficient[2], shape_down)
+            result = (None, None, finalized(*up), finalized(*down))
+        else:
+            total = None
+            for coefficient, use_nominal, process, region in components:
+                total = combined(total,
+                                 coefficient[0],
+                                 self.calculation(process, region))
+            result = finalized(*total)
 
         # Allow the HigherOrderCalculation to polish the result
         # (e.g. special treatment of overflow bin for Histogram)
         self.calculation.finalize_result(result)
 
+        # Combined processes are styled as a whole
+        if isinstance(estimated, MultiProcess) and isinstance(result, TH1):
+            estimated.style(result)
+
         if 'estimation' in process.metadata().get('print_me', []):
             print('Final estimate: {:.2f}'.format(integral(result, False)))
         return result
@@ -202,3 +215,79 @@ class MonteCarlo(Estimation):
         return [
             (self._luminosity / 1e3, False, process, region)
         ]
+
+
+class NormalizedMonteCarlo(Estimation):
+    """A Monte Carlo estimation normalized to cross section x luminosity /
+    sum of generator weights.
+
+    The cross section is taken from the 'cross_section' entry (in pb) of the
+    process metadata, optionally multiplied by its 'k_factor' and
+    'filter_efficiency' entries.  The sums of generator weights are computed
+    per file on first use (in parallel, if inside an owls-parallel
+    environment) and cached persistently under the file fingerprint (see
+    owls_hep.catalog.file_record), so that later normalizations do not read
+    the files.
+    """
+
+    def __init__(self, calculation, luminosity, weight = None):
+        """Initializes a new instance of the NormalizedMonteCarlo class.
+
+        Args:
+            calculation: The base calculation to use for estimation
+            luminosity: The integrated luminosity, in pb^-1
+            weight: The source of generator weights, see
+                owls_hep.catalog.file_record
+        """
+        # Call superclass initializer
+        super(NormalizedMonteCarlo, self).__init__(calculation)
+
+        # Store parameters
+        self._luminosity = luminosity
+        self._weight = weight
+
+    def sum_of_weights(self, process):
+        """Returns the sum of generator weights of a process, or None while
+        calls are being recorded for parallel execution.
+        """
+        records = [file_record(f, process.tree(), self._weight)
+                   for f
+                   in process.files()]
+        if any((r is None for r in records)):
+            return None
+        return sum((r.sum_of_weights for r in records))
+
+    def normalization(self, process):
+        """Returns the factor normalizing a process to the luminosity.
+
+        Args:
+            process: The process to consider
+
+        Returns:
+            The normalization factor.
+        """
+        # Compute the cross section
+        metadata = process.metadata()
+        if 'cross_section' not in metadata:
+            raise ValueError('process {0} has no cross section'.format(
+                process.label()
+            ))
+        cross_section = metadata['cross_section'] * \
+            metadata.get('k_factor', 1.0) * \
+            metadata.get('filter_efficiency', 1.0)
+
+        # Compute the sum of weights.  Results are discarded while recording
+        # calls for parallel execution, so any factor will do.
+        sum_of_weights = self.sum_of_weights(process)
+        if sum_of_weights is None:
+            return 1.0
+        if sum_of_weights == 0.0:
+            raise ValueError('process {0} has a vanishing sum of '
+                             'weights'.format(process.label()))
+
+        return float(self._luminosity * cross_section / sum_of_weights)
+
+    def components(self, process, region):
+        return [
+            (self.normalization(process), False, process, region)
+        ]
@@ -25,6 +25,48 @@ def expression_substitute(expr, definitions):
 # _property_regex is used to find properties in expression strings
 _property_regex = re.compile('[A-Za-z_]\w*(?!\w*\s*\()')
 
+
+# _identifier_regex is used to find (possibly dotted) identifiers in
+# expression strings, along with any suffix marking them as special
+# variables (e.g. Entry$), namespaces (e.g. TMath::) or function calls
+_identifier_regex = re.compile(
+    r'(?<![\w.$])([A-Za-z_][\w.]*)(\$|\s*::|\s*\()?'
+)
+
+# _string_regex is used to remove string literals from expression strings
+_string_regex = re.compile(r'"[^"]*"|\'[^\']*\'')
+
+# _constants are identifiers understood by ROOT which are not properties
+_constants = frozenset(('true', 'false', 'kTRUE', 'kFALSE', 'pi'))
+
+
+def properties(expression):
+    """Finds the properties (e.g. branch names) used in an expression.
+
+    Function calls, namespaces, special variables (e.g. Entry$) and string
+    literals are ignored.  For method calls on objects (e.g. 'jet.Pt()'), the
+    object is included.
+
+    Args:
+        expression: The expression string
+
+    Returns:
+        A set of property names.
+    """
+    result = set()
+    for match in _identifier_regex.finditer(_string_regex.sub('',
+                                                              expression)):
+        name, suffix = match.group(1).rstrip('.'), match.group(2)
+        if suffix is not None:
+            suffix = suffix.strip()
+            if suffix != '(' or '.' not in name:
+                continue
+            name = name.rsplit('.', 1)[0]
+        if name not in _constants:
+            result.add(name)
+    return result
+
+
 def negated(expression):
     """Returns a negated version of the expression.
 
@@ -11,13 +11,18 @@ from array import array
 # Six imports
 from six import string_types
 
+# owls-cache imports
+from owls_cache.persistent import cached as persistently_cached
+
 # owls-parallel imports
 from owls_parallel import parallelized
 
 # owls-hep imports
 from owls_hep.calculation import Calculation
+from owls_hep.sparse import SparseHistogram
 from owls_hep.utility import make_selection, create_histogram, histogram, \
-        integral, add_overflow_to_last_bin
+        integral, add_overflow_to_last_bin, draw_values, rebinned
+from owls_hep.binning import rebin_indices
 
 
 # Set up default exports
@@ -56,29 +61,75 @@ def _histogram(process, region, expressions, binnings):
     """
     return histogram(process, region, expressions, binnings)
 
+# Dummy function to return fake values when parallelizing
+def _sparse_histogram_mocker(process, region, expressions, binnings):
+    return SparseHistogram(binnings)
+
+@parallelized(_sparse_histogram_mocker, _histogram_mapper)
+@persistently_cached('owls_hep.histogramming._sparse_histogram')
+def _sparse_histogram(process, region, expressions, binnings):
+    """Generates a sparse histogram of a distribution of a process in a
+    region.
+
+    Args:
+        process: The process whose events should be histogrammed
+        region: The region whose weighting/selection should be applied
+        expressions: A tuple of expression strings
+        binnings: A (tuple,list) of (tuples,lists) representing root binnings
+
+    Returns:
+        An owls_hep.sparse.SparseHistogram of any dimensionality.
+    """
+    # Fill with the last expression on the first (x) axis, as TTree::Draw
+    # fills ROOT histograms, so that projections match dense histograms
+    result = SparseHistogram(binnings)
+    chain = process.load()
+    for values, weights in draw_values(chain,
+                                       expressions,
+                                       make_selection(process, region)):
+        result.fill(values[:, ::-1], weights)
+    return result
+
 class Histogram(Calculation):
     """A histogramming calculation which generates a ROOT THN histogram.
 
     Although the need should not generally arise to subclass Histogram, all
-    subclasses must return a ROOT THN subclass for their result.
+    subclasses must return a ROOT THN subclass for their result, or an
+    owls_hep.sparse.SparseHistogram in sparse mode.
     """
 
     def __init__(self, expressions, binnings, title, x_label, y_label,
-                 include_overflow = False):
+                 include_overflow = False, sparse = False, labels = None,
+                 master_binnings = None):
         """Initializes a new instance of the Histogram calculation.
 
         Args:
             expressions: The expression (as a string or 1-tuple of a string) or
                 expressions (as an N-tuple of strings), in terms of dataset
                 variables, to histogram.  The multiplicity of expressions
-                determines the dimensionality of the histogram.
+                determines the dimensionality of the histogram.  As in
+                TTree::Draw, the last expression is histogrammed on the x
+                axis, i.e. expressions are given as (..., y, x), for both
+                ROOT and sparse histograms.
             binnings: The binning (as a tuple or a 1-tuple of tuples) or
-                binnings (as an N-tuple of tuples). The binning count must
-                match the expression count.
+                binnings (as an N-tuple of tuples), in axis order (x, y, ...).
+                The binning count must match the expression count.
             title: The ROOT TLatex label to use for the histogram title
             x_label: The ROOT TLatex label to use for the x-axis
             y_label: The ROOT TLatex label to use for the y-axis
             include_overflow: Add contents of overflow bin to last bin
+            sparse: Whether or not to compute an
+                owls_hep.sparse.SparseHistogram instead of a ROOT histogram.
+                This is implied for more than 3 expressions.
+            labels: The axis labels to use for a sparse histogram, one per
+                axis in axis order (x, y, ...), or None to use x_label and
+                y_label for the first two axes
+            master_binnings: Fine binnings, in the same form as binnings, with
+                which to fill and cache the histogram, or None to fill with
+                binnings directly.  The histogram with binnings is then
+                derived by merging master bins in memory, so that changes of
+                binnings (or restrictions of their range) which align with
+                the master binnings don't require reprocessing the data.
         """
         # Store parameters
         if isinstance(expressions, string_types):
@@ -93,11 +144,33 @@ class Histogram(Calculation):
         self._x_label = x_label
         self._y_label = y_label
         self._include_overflow = include_overflow
+        self._sparse = sparse or len(self._expressions) > 3
+        if labels is None:
+            labels = ((x_label, y_label) +
+                      ('',) * len(self._expressions))[:len(self._expressions)]
+        self._labels = tuple(labels)
+        if master_binnings is None or isinstance(master_binnings[0], tuple):
+            self._master_binnings = master_binnings
+        else:
+            self._master_binnings = (master_binnings,)
 
         # Validate that expression and binning counts jive
         if len(self._expressions) != len(self._binnings):
             raise ValueError('histogram bin specifications must have the same '
                              'length as expression specifications')
+        if len(self._labels) != len(self._expressions):
+            raise ValueError('histogram labels must have the same length as '
+                             'expression specifications')
+        if self._master_binnings is not None:
+            if self._sparse:
+                raise ValueError('master binnings are not supported for '
+                                 'sparse histograms')
+            if len(self._master_binnings) != len(self._binnings):
+                raise ValueError('master bin specifications must have the '
+                                 'same length as bin specifications')
+            for master, binning in zip(self._master_binnings,
+                                       self._binnings):
+                rebin_indices(master, binning)
 
     def title(self):
         """Returns the title for this histogram calculation.
@@ -114,11 +187,27 @@ class Histogram(Calculation):
         """
         return self._y_label
 
+    def expressions(self):
+        """Returns the expressions of this histogram calculation.
+        """
+        return self._expressions
+
+    def binnings(self):
+        """Returns the binnings of this histogram calculation.
+        """
+        return self._binnings
+
     def dimension(self):
         """Returns the dimension of the histogram
         """
         return len(self._expressions)
 
+    def sparse(self):
+        """Returns whether or not this calculation produces a sparse
+        histogram.
+        """
+        return self._sparse
+
     def __call__(self, process, region):
         """Histograms weighted events passing a region's selection into a
         distribution.
@@ -128,7 +217,8 @@ class Histogram(Calculation):
             region: The region providing selection/weighting for the histogram
 
         Returns:
-            A ROOT histogram representing the resultant distribution.
+            A ROOT histogram representing the resultant distribution, or an
+            owls_hep.sparse.SparseHistogram in sparse mode.
         """
         # Print some debug info
         print_me = process.metadata().get('print_me', [])
@@ -137,7 +227,23 @@ class Histogram(Calculation):
             print('=== Process: {} ==='.format(process))
 
         # Compute the histogram
-        result = _histogram(process, region, self._expressions, self._binnings)
+        if self._sparse:
+            result = _sparse_histogram(process,
+                                       region,
+                                       self._expressions,
+                                       self._binnings)
+        elif self._master_binnings is not None:
+            result = rebinned(_histogram(process,
+                                         region,
+                                         self._expressions,
+                                         self._master_binnings),
+                              self._master_binnings,
+                              self._binnings)
+        else:
+            result = _histogram(process,
+                                region,
+                                self._expressions,
+                                self._binnings)
 
         if 'selection' in print_me:
             print('Selection: {}'.format(make_selection(process, region)))
@@ -150,6 +256,26 @@ class Histogram(Calculation):
             if v in ['selection', 'expressions', 'counts']]:
             print()
 
+        # Label and style the histogram
+        return self.styled(process, result)
+
+    def styled(self, process, result):
+        """Applies the labels of the calculation and the style of a process to
+        a histogram.
+
+        Args:
+            process: The process whose style should be applied
+            result: The histogram, as computed by this calculation
+
+        Returns:
+            The histogram.
+        """
+        # Sparse histograms carry their labels to projections, but can't be
+        # styled
+        if self._sparse:
+            result.set_labels(self._title, self._labels)
+            return result
+
         # Set labels
         result.SetTitle(self._title)
         result.GetXaxis().SetTitle(self._x_label)
@@ -0,0 +1,247 @@
+"""Provides a persistent event-number index for fast event lookups.
+
+Picking specific events (e.g. for event displays or cross-checks) otherwise
+requires a scan of the full chain.  EventIndex builds, once per file, a sorted
+index of the values of a set of key branches (e.g. run number, event number
+and lumi block), stored on disk under the fingerprint of the file.  Point and
+range lookups are then answered from the index.  Processes restricted to the
+matching entries (see Process.restricted) apply them to their chain as a
+TEntryList, so that calculations only read the matching entries.
+"""
+
+
+# System imports
+import os
+from os.path import abspath, exists, getmtime, getsize, isdir, join
+from hashlib import sha1
+
+# NumPy imports
+import numpy
+
+
+# Set up default exports
+__all__ = [
+    'EventIndex',
+]
+
+
+class EventIndex(object):
+    """A persistent index of key branch values of the files of processes.
+    """
+
+    def __init__(self, directory, keys = ('RunNumber', 'EventNumber')):
+        """Initializes a new instance of the EventIndex class.
+
+        Args:
+            directory: The directory in which to store index files
+            keys: A tuple of key expressions, in terms of branches of the
+                process trees (excluding friends), which must evaluate to
+                integers
+        """
+        # Store parameters
+        self._directory = directory
+        self._keys = tuple(keys)
+        if len(self._keys) == 0:
+            raise ValueError('must provide at least one key')
+
+        # Create the directory if necessary
+        if not isdir(self._directory):
+            os.makedirs(self._directory)
+
+    def keys(self):
+        """Returns the key expressions of the index.
+        """
+        return self._keys
+
+    def _path(self, process, file):
+        """Returns the path of the index file of a process file, based on the
+        fingerprint of the file and the index configuration.
+        """
+        path = abspath(file)
+        fingerprint = repr((path,
+                            getsize(path),
+                            getmtime(path),
+                            process.tree(),
+                            self._keys))
+        return join(self._directory,
+                    '{0}.npz'.format(sha1(fingerprint.encode('utf-8'))
+                                     .hexdigest()))
+
+    def _file_index(self, process, file):
+        """Loads (building if necessary) the index of a process file.
+
+        Returns:
+            A tuple (keys, entries, count), where keys is a NumPy array of
+            shape (rows, len(keys)) sorted lexicographically, entries is a
+            NumPy array of the corresponding local entry numbers, and count is
+            the number of entries in the file.
+        """
+        # Load the index if it exists
+        path = self._path(process, file)
+        if exists(path):
+            with numpy.load(path) as data:
+                return (data['keys'], data['entries'], int(data['count']))
+
+        # ROOT imports
+        import owls_hep.pyroot
+        from ROOT import TChain
+
+        # Otherwise evaluate the keys and entry numbers of all entries
+        chain = TChain(process.tree())
+        chain.Add(file)
+        count = int(chain.GetEntries())
+        keys, entries = self._evaluate(chain)
+
+        # Sort lexicographically, with the first key as the primary key
+        order = numpy.lexsort(keys.T[::-1])
+        keys = keys[order]
+        entries = entries[order]
+
+        # Store the index atomically, since several workers may share a
+        # directory
+        temporary = '{0}.{1}.npz'.format(path[:-4], os.getpid())
+        numpy.savez(temporary, keys = keys, entries = entries, count = count)
+        os.rename(temporary, path)
+
+        return (keys, entries, count)
+
+    def _evaluate(self, chain):
+        """Evaluates the keys and local entry numbers of all entries of a
+        chain as 64-bit integers.
+
+        TTree::Draw evaluates expressions as doubles, which can't represent
+        all integers beyond 2**53 (e.g. large event numbers), so the keys are
+        read with RDataFrame if available, in which case key expressions must
+        be valid C++ expressions.
+
+        Returns:
+            A tuple (keys, entries) of NumPy arrays, as in _file_index but
+            unsorted.
+
+        Raises:
+            ValueError: If RDataFrame is not available and a key exceeds the
+                range of integers representable by doubles.
+        """
+        # ROOT imports
+        import owls_hep.pyroot
+        import ROOT
+
+        # Read exact values with RDataFrame
+        if hasattr(ROOT, 'RDataFrame'):
+            frame = ROOT.RDataFrame(chain)
+            names = []
+            for i, key in enumerate(self._keys):
+                names.append('owls_key_{0}'.format(i))
+                frame = frame.Define(names[-1], '(Long64_t)({0})'.format(key))
+            frame = frame.Define('owls_entry', '(Long64_t)rdfentry_')
+            columns = frame.AsNumpy(names + ['owls_entry'])
+            keys = numpy.empty((len(columns['owls_entry']), len(names)),
+                               dtype = numpy.int64)
+            for i, name in enumerate(names):
+                keys[:, i] = columns[name]
+            return (keys, columns['owls_entry'].astype(numpy.int64))
+
+        # owls-hep imports
+        from owls_hep.utility import draw_values
+
+        # Otherwise fall back to TTree::Draw, refusing to index keys which
+        # may have been rounded
+        keys = [numpy.empty((0, len(self._keys)), dtype = numpy.int64)]
+        entries = [numpy.empty(0, dtype = numpy.int64)]
+        for values, _ in draw_values(chain, self._keys + ('Entry$',)):
+            if numpy.any(numpy.abs(values[:, :-1]) >= 2.0 ** 53):
+                raise ValueError('keys exceed the integer precision of '
+                                 'TTree::Draw, indexing them requires '
+                                 'RDataFrame')
+            values = values.astype(numpy.int64)
+            keys.append(values[:, :-1])
+            entries.append(values[:, -1])
+        return (numpy.concatenate(keys), numpy.concatenate(entries))
+
+    def _matches(self, keys, ranges, points):
+        """Computes the mask of index rows matching ranges and points.
+        """
+        mask = numpy.ones(len(keys), dtype = bool)
+
+        # Apply ranges
+        for key, selection in ranges.items():
+            column = keys[:, self._keys.index(key)]
+            if isinstance(selection, tuple):
+                low, high = selection
+                mask &= (column >= low) & (column <= high)
+            else:
+                mask &= (column == selection)
+
+        # Apply points, using the sorting of the first key to restrict
+        # comparisons to candidate rows
+        if points is not None:
+            selected = numpy.zeros(len(keys), dtype = bool)
+            for point in points:
+                if len(point) != len(self._keys):
+                    raise ValueError('points must specify all keys')
+                start = numpy.searchsorted(keys[:, 0], point[0], 'left')
+                end = numpy.searchsorted(keys[:, 0], point[0], 'right')
+                selected[start:end] |= numpy.all(
+                    keys[start:end] == numpy.asarray(point), axis = 1
+                )
+            mask &= selected
+
+        return mask
+
+    def entries(self, process, ranges = {}, points = None, files = None):
+        """Looks up the entries of a process matching a selection on keys.
+
+        Args:
+            process: The process whose entries should be looked up
+            ranges: A dictionary mapping key expressions to a value or an
+                inclusive (low, high) tuple of values
+            points: An iterable of tuples of values of all keys, in the order
+                of the index keys, or None for no point selection
+            files: The subset of process files loaded in the chain, or None
+                for all files
+
+        Returns:
+            A sorted NumPy array of the matching entry numbers in the process
+            chain.
+        """
+        # Validate the selection
+        for key in ranges:
+            if key not in self._keys:
+                raise ValueError('{0} is not an index key'.format(key))
+
+        # Look up entries in each file, offsetting them by the entries in
+        # previous files
+        result = [numpy.empty(0, dtype = numpy.int64)]
+        offset = 0
+        for f in (process.files() if files is None else files):
+            keys, entries, count = self._file_index(process, f)
+            result.append(entries[self._matches(keys, ranges, points)] +
+                          offset)
+            offset += count
+        return numpy.sort(numpy.concatenate(result))
+
+    def restrict(self, process, chain, ranges = {}, points = None,
+                 files = None):
+        """Restricts a chain of a process to the entries matching a selection
+        on keys, by setting a TEntryList.
+
+        This is usually called by Process.load for processes created with
+        Process.restricted, rather than directly.
+
+        Args:
+            process: The process of the chain
+            chain: The TChain to restrict
+            ranges: See entries
+            points: See entries
+            files: See entries
+        """
+        # ROOT imports
+        import owls_hep.pyroot
+        from ROOT import TEntryList, SetOwnership
+
+        # Create the entry list
+        entry_list = TEntryList(chain)
+        SetOwnership(entry_list, False)
+        for entry in self.entries(process, ranges, points, files).tolist():
+            entry_list.Enter(entry, chain)
+        chain.SetEntryList(entry_list)
@@ -0,0 +1,116 @@
+"""Provides a compact set of (run, event) keys for duplicate removal.
+
+Holding tens of millions of (run, event) tuples in a Python set takes several
+gigabytes.  KeySet instead packs each key into a single 64-bit integer and
+stores keys in a small number of sorted NumPy arrays of geometrically
+increasing size (as in a log-structured merge tree), so that insertion is
+amortized O(log N) per key and membership tests are vectorized binary
+searches, at 8 bytes per key.
+"""
+
+
+# NumPy imports
+import numpy
+
+
+# Set up default exports
+__all__ = [
+    'KeySet',
+]
+
+
+class KeySet(object):
+    """A set of (run, event) keys supporting vectorized insertion and
+    membership tests.
+
+    Keys are packed as (run << event_bits) | event, so runs must be less than
+    2 ** (64 - event_bits) and events less than 2 ** event_bits.
+    """
+
+    def __init__(self, event_bits = 40):
+        """Initializes a new instance of the KeySet class.
+
+        Args:
+            event_bits: The number of bits reserved for event numbers
+        """
+        # Store parameters
+        if not 0 < event_bits < 64:
+            raise ValueError('event bits must be between 1 and 63')
+        self._event_bits = event_bits
+
+        # Create the sorted levels, from largest to smallest
+        self._levels = []
+
+    def __len__(self):
+        """Returns the number of keys in the set.
+        """
+        return sum((len(l) for l in self._levels))
+
+    def _packed(self, runs, events):
+        """Packs runs and events into 64-bit keys.
+        """
+        runs = numpy.asarray(runs).astype(numpy.uint64)
+        events = numpy.asarray(events).astype(numpy.uint64)
+        if len(runs) != len(events):
+            raise ValueError('runs and events must have the same length')
+        bits = numpy.uint64(self._event_bits)
+        if len(runs) > 0 and (runs.max() >> (numpy.uint64(64) - bits) or
+                              events.max() >> bits):
+            raise ValueError('run or event numbers out of range')
+        return (runs << bits) | events
+
+    def _contains(self, keys):
+        """Tests the membership of packed keys.
+        """
+        result = numpy.zeros(len(keys), dtype = bool)
+        for level in self._levels:
+            positions = numpy.searchsorted(level, keys)
+            positions[positions == len(level)] = 0
+            result |= (level[positions] == keys)
+        return result
+
+    def contains(self, runs, events):
+        """Tests the membership of keys.
+
+        Args:
+            runs: An array-like of run numbers
+            events: An array-like of event numbers
+
+        Returns:
+            A NumPy boolean array, True for keys in the set.
+        """
+        return self._contains(self._packed(runs, events))
+
+    def add_unseen(self, runs, events):
+        """Adds keys to the set, reporting which of them are new.
+
+        Args:
+            runs: An array-like of run numbers
+            events: An array-like of event numbers
+
+        Returns:
+            A NumPy boolean array, True for keys which were not in the set
+            before, and only for the first occurrence of keys which are
+            repeated in the input.
+        """
+        # Find keys which are new to the set and to the input
+        keys = self._packed(runs, events)
+        unique, first = numpy.unique(keys, return_index = True)
+        result = numpy.zeros(len(keys), dtype = bool)
+        new = ~self._contains(unique)
+        result[first[new]] = True
+
+        # Insert the new keys as a level, merging levels which have become
+        # comparable in size
+        unique = unique[new]
+        if len(unique) > 0:
+            self._levels.append(unique)
+            while len(self._levels) > 1 and \
+                    len(self._levels[-2]) <= 2 * len(self._levels[-1]):
+                smaller = self._levels.pop()
+                larger = self._levels.pop()
+                merged = numpy.concatenate((larger, smaller))
+                merged.sort(kind = 'mergesort')
+                self._levels.append(merged)
+
+        return result
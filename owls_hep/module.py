@@ -10,12 +10,25 @@ There are two methods:
   stored on a stack, and the definitions corresponding to the current `load`
   call are returned by this function.  If called outside of a load call, this
   method returns None.
+
+Compiled bytecode is cached by source file path and content, in memory and
+optionally on disk (see `set_bytecode_directory`).  On request, loaded
+modules are reused for identical paths, file contents and definitions, with
+least-recently-used eviction (see `set_module_cache_size`).
 """
 
 
 # System imports
-from sys import version_info
+from sys import version_info, modules
 from uuid import uuid4
+from hashlib import sha1
+from binascii import hexlify
+from pickle import dumps
+from types import ModuleType
+from collections import OrderedDict
+from os import makedirs, rename
+from os.path import abspath, isdir, isfile, join
+import marshal
 import threading
 from contextlib import contextmanager
 
@@ -44,46 +57,214 @@ def definitions():
     return _thread_local.definitions[-1]
 
 
-# Define a method which can load modules by path.  The exact method depends on
-# the Python version.
+# Define the bytecode magic for this version of Python, which is used to keep
+# on-disk bytecode from different Python versions apart.  The exact method
+# depends on the Python version.
 _major_version = version_info[0]
 if _major_version == 2:
     import imp
-
-    def _load_module(path):
-        return imp.load_source(uuid4().hex, path)
+    _magic = imp.get_magic()
 elif _major_version == 3:
-    import importlib.machinery
-
-    def _load_module(path):
-        loader = importlib.machinery.SourceFileLoader(uuid4().hex, path)
-        return loader.load_module()
+    import importlib.util
+    _magic = importlib.util.MAGIC_NUMBER
 else:
     raise RuntimeError('unable to manually load modules for this version of '
                        'Python')
 
 
-def load(path, definitions = {}):
+# Create a lock protecting the bytecode and module caches
+_lock = threading.Lock()
+
+
+# Create the in-memory bytecode cache, mapping hashes of source paths and
+# contents to code objects, and the optional on-disk bytecode cache directory.
+# Code objects record the path of their source, so identical files at
+# different paths are compiled separately.
+_code_cache = {}
+_bytecode_directory = None
+
+
+# Create the module cache, mapping (path, path and content hash, definitions
+# fingerprint) to modules, in least-recently-used order
+_module_cache = OrderedDict()
+_module_cache_size = 32
+
+
+def set_bytecode_directory(directory):
+    """Sets the directory in which compiled bytecode is cached on disk, keyed
+    by the hash of the path and content of the source file.
+
+    Args:
+        directory: The cache directory, or None to only cache bytecode in
+            memory (the default)
+    """
+    global _bytecode_directory
+    _bytecode_directory = directory
+
+
+def set_module_cache_size(size):
+    """Sets the maximum number of loaded modules kept in memory for reuse.
+
+    Args:
+        size: The maximum number of modules, 0 to disable module reuse
+    """
+    global _module_cache_size
+    with _lock:
+        _module_cache_size = size
+        _evict()
+
+
+def clear_cache():
+    """Clears the in-memory bytecode and module caches.
+    """
+    with _lock:
+        _code_cache.clear()
+        while _module_cache:
+            _, module = _module_cache.popitem(False)
+            _unregister(module)
+
+
+# Utility function to remove a module from sys.modules
+def _unregister(module):
+    if modules.get(module.__name__) is module:
+        del modules[module.__name__]
+
+
+# Utility function to evict least-recently-used modules beyond the cache size.
+# Must be called with the lock held.
+def _evict():
+    while len(_module_cache) > max(_module_cache_size, 0):
+        _, module = _module_cache.popitem(False)
+        _unregister(module)
+
+
+# Utility function to compute a fingerprint of a definitions dictionary, or
+# None if the definitions can't be fingerprinted (in which case modules loaded
+# with them are not reused)
+def _definitions_fingerprint(definitions):
+    try:
+        return sha1(dumps(sorted(definitions.items()), 2)).hexdigest()
+    except Exception:
+        return None
+
+
+# Utility function to compile source code, using the bytecode caches
+def _compile(path, source, source_hash):
+    # Check the in-memory cache
+    with _lock:
+        code = _code_cache.get(source_hash)
+    if code is not None:
+        return code
+
+    # Check the on-disk cache
+    directory = _bytecode_directory
+    cache_path = None
+    if directory is not None:
+        cache_path = join(directory, '{0}-{1}.bin'.format(
+            source_hash,
+            hexlify(_magic).decode('ascii')
+        ))
+        if isfile(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    code = marshal.load(f)
+            except (IOError, OSError, EOFError, ValueError, TypeError):
+                code = None
+
+    # Compile the source if necessary, and write it to the on-disk cache.
+    # The bytecode is written atomically, since several processes may share
+    # a cache directory.
+    if code is None:
+        code = compile(source, path, 'exec', dont_inherit = True)
+        if cache_path is not None:
+            try:
+                if not isdir(directory):
+                    makedirs(directory)
+                temporary = '{0}.{1}'.format(cache_path, uuid4().hex)
+                with open(temporary, 'wb') as f:
+                    marshal.dump(code, f)
+                rename(temporary, cache_path)
+            except (IOError, OSError):
+                pass
+
+    # Store the code in memory
+    with _lock:
+        _code_cache[source_hash] = code
+
+    return code
+
+
+# Utility function to execute a module from source, registering it in
+# sys.modules while it is executed
+def _execute_module(path, source, source_hash):
+    code = _compile(path, source, source_hash)
+    module = ModuleType(uuid4().hex)
+    module.__file__ = path
+    modules[module.__name__] = module
+    try:
+        exec(code, module.__dict__)
+    except BaseException:
+        _unregister(module)
+        raise
+    return module
+
+
+def load(path, definitions = {}, reuse = False):
     """Loads a Python module by path.
 
+    The module source is compiled once per distinct file path and content.
+    If requested, modules loaded from the same path and file content with
+    equal definitions are reused (up to a maximum number, see
+    set_module_cache_size), so the returned module may be shared with
+    previous callers.
+
     Args:
         path: The path to the .py file
         definitions: A Python dictionary object which will be accessible during
             the module load via the owls_config.module.definitions method.
+        reuse: Whether or not to reuse a previously loaded module.  Only the
+            module file and the definitions are checked for changes, so
+            modules which load or read other files should not be reused if
+            those files may change.
 
     Returns:
         The module object.
     """
+    # Read the source and compute the cache key
+    path = abspath(path)
+    with open(path, 'rb') as f:
+        source = f.read()
+    source_hash = sha1(path.encode('utf-8') + b'\0' + source).hexdigest()
+    fingerprint = _definitions_fingerprint(definitions) if reuse else None
+    key = (path, source_hash, fingerprint)
+
+    # Check if we have a module to reuse
+    if fingerprint is not None:
+        with _lock:
+            result = _module_cache.pop(key, None)
+            if result is not None:
+                _module_cache[key] = result
+                return result
+
     # Set definitions
     _push_definitions(definitions)
 
     # Load the module
     try:
-        result = _load_module(path)
+        result = _execute_module(path, source, source_hash)
     except:
         raise
     finally:
         _pop_definitions()
 
+    # Store the module for reuse if possible, otherwise don't keep it in
+    # sys.modules
+    if fingerprint is not None and _module_cache_size > 0:
+        with _lock:
+            _module_cache[key] = result
+            _evict()
+    else:
+        _unregister(result)
+
     # All done
     return result
@@ -0,0 +1,93 @@
+"""Provides a calculation for computing weighted moments and correlations.
+
+Reading means, widths and correlations off TH1 and TH2 histograms requires a
+histogram per variable pair.  The Moments calculation instead accumulates the
+weighted means and full covariance matrix of a set of expressions in a single
+pass (see owls_hep.statistics.WeightedMoments).
+"""
+
+
+# Six imports
+from six import string_types
+
+# owls-cache imports
+from owls_cache.persistent import cached as persistently_cached
+
+# owls-parallel imports
+from owls_parallel import parallelized
+
+# owls-hep imports
+from owls_hep.calculation import Calculation
+from owls_hep.statistics import WeightedMoments
+from owls_hep.utility import make_selection, draw_values
+
+
+# Set up default exports
+__all__ = [
+    'Moments',
+]
+
+
+# Dummy function to return fake values when parallelizing
+def _moments_mocker(process, region, expressions):
+    return WeightedMoments(expressions)
+
+
+@parallelized(_moments_mocker, lambda p, r, e: (p, r))
+@persistently_cached('owls_hep.moments._moments')
+def _moments(process, region, expressions):
+    """Computes the weighted moments of expressions for a process in a region.
+
+    Args:
+        process: The process whose events should be evaluated
+        region: The region whose weighting/selection should be applied
+        expressions: A tuple of expression strings
+
+    Returns:
+        An owls_hep.statistics.WeightedMoments object.
+    """
+    result = WeightedMoments(expressions)
+    chain = process.load()
+    for values, weights in draw_values(chain,
+                                       expressions,
+                                       make_selection(process, region)):
+        result.update(values, weights)
+    return result
+
+
+class Moments(Calculation):
+    """A calculation which generates the weighted means, variances and
+    covariance/correlation matrix of a set of expressions.
+
+    The result is an owls_hep.statistics.WeightedMoments object, which is
+    supported by owls_hep.algebra, so the calculation can be used with
+    owls_hep.estimation.Estimation.
+    """
+
+    def __init__(self, expressions):
+        """Initializes a new instance of the Moments calculation.
+
+        Args:
+            expressions: The expression (as a string) or expressions (as a
+                tuple of strings), in terms of dataset variables
+        """
+        if isinstance(expressions, string_types):
+            self._expressions = (expressions,)
+        else:
+            self._expressions = tuple(expressions)
+        if len(self._expressions) == 0:
+            raise ValueError('must provide at least one expression')
+
+    def __call__(self, process, region):
+        """Computes the moments of weighted events passing a region's
+        selection.
+
+        Args:
+            process: The process whose weighted events should be evaluated
+            region: The region providing selection/weighting
+
+        Returns:
+            A WeightedMoments object.
+        """
+        # Copy the result, since it may be modified by algebra
+        return _moments(process, region, self._expressions).copy()
@@ -0,0 +1,160 @@
+"""Provides a calculation for generating N-1 distributions in a single pass.
+
+An N-1 distribution of a cut is the distribution of the cut variable with all
+other cuts applied.  Generating them with one region per cut requires N passes
+over the data.  The NMinusOne calculation instead evaluates each cut and each
+cut variable once per event and fills all N histograms from the same pass.
+"""
+
+
+# System imports
+from uuid import uuid4
+
+# owls-cache imports
+from owls_cache.persistent import cached as persistently_cached
+
+# owls-parallel imports
+from owls_parallel import parallelized
+
+# owls-hep imports
+from owls_hep.calculation import Calculation
+from owls_hep.utility import make_selection, create_histogram, \
+    draw_values, fill_histogram
+
+
+# Set up default exports
+__all__ = [
+    'NMinusOne',
+]
+
+
+# Dummy function to return fake values when parallelizing
+def _n_minus_one_mocker(process, region, cuts, expressions, binnings):
+    return tuple((create_histogram(1, uuid4().hex, (b,)) for b in binnings))
+
+
+@parallelized(_n_minus_one_mocker, lambda p, r, c, e, b: (p, r))
+@persistently_cached('owls_hep.nminusone._n_minus_one')
+def _n_minus_one(process, region, cuts, expressions, binnings):
+    """Generates the N-1 distributions of a set of cuts for a process in a
+    region.
+
+    Args:
+        process: The process whose events should be histogrammed
+        region: The region whose weighting/selection should be applied
+        cuts: A tuple of N cut expressions
+        expressions: A tuple of N expressions to histogram, one per cut
+        binnings: A tuple of N binnings, one per cut
+
+    Returns:
+        A tuple of N ROOT TH1F histograms, the i-th histogram containing the
+        distribution of the i-th expression for events passing all cuts
+        except the i-th one.
+    """
+    # Create the histograms
+    histograms = tuple((create_histogram(1, uuid4().hex, (b,))
+                        for b
+                        in binnings))
+
+    # Evaluate all cuts and expressions in one pass
+    n = len(cuts)
+    chain = process.load()
+    for values, weights in draw_values(chain,
+                                       cuts + expressions,
+                                       make_selection(process, region)):
+        # Compute the number of failed cuts per event.  Events passing all
+        # other cuts are those failing no cuts or only the cut itself.
+        passed = (values[:, :n] != 0)
+        failed = n - passed.sum(axis = 1)
+        for i, h in enumerate(histograms):
+            mask = (failed == 0) | ((failed == 1) & ~passed[:, i])
+            fill_histogram(h, values[mask, n + i], weights[mask])
+
+    return histograms
+
+
+class NMinusOne(Calculation):
+    """A calculation which generates the N-1 distributions of a set of cuts.
+
+    The result is a tuple of ROOT TH1 histograms, one per cut, each styled and
+    labelled like the result of owls_hep.histogramming.Histogram.  Tuples are
+    supported by owls_hep.algebra, so the calculation can be used with
+    owls_hep.estimation.Estimation.
+    """
+
+    def __init__(self, entries, title, y_label, x_labels = None):
+        """Initializes a new instance of the NMinusOne calculation.
+
+        Args:
+            entries: An iterable of (cut, expression, binning) tuples, where
+                cut is a cut expression, expression is the expression (in
+                terms of dataset variables) to histogram with all other cuts
+                applied, and binning is its binning
+            title: The ROOT TLatex label to use for the histogram titles
+            y_label: The ROOT TLatex label to use for the y-axes
+            x_labels: An iterable of ROOT TLatex labels to use for the x-axes,
+                one per entry, or None to use the expressions
+        """
+        # Store parameters
+        entries = tuple(entries)
+        if len(entries) == 0:
+            raise ValueError('must provide at least one entry')
+        self._cuts = tuple((e[0] for e in entries))
+        self._expressions = tuple((e[1] for e in entries))
+        self._binnings = tuple((tuple(e[2]) for e in entries))
+        self._title = title
+        self._y_label = y_label
+        if x_labels is None:
+            self._x_labels = self._expressions
+        else:
+            self._x_labels = tuple(x_labels)
+
+        # Validate that label and entry counts jive
+        if len(self._x_labels) != len(entries):
+            raise ValueError('must provide one x-axis label per entry')
+
+    def title(self):
+        """Returns the title for the histograms of this calculation.
+        """
+        return self._title
+
+    def x_labels(self):
+        """Returns the x-axis labels for the histograms of this calculation.
+        """
+        return self._x_labels
+
+    def y_label(self):
+        """Returns the y-axis label for the histograms of this calculation.
+        """
+        return self._y_label
+
+    def __call__(self, process, region):
+        """Histograms the N-1 distributions of weighted events passing a
+        region's selection.
+
+        Args:
+            process: The process whose weighted events should be histogrammed
+            region: The region providing selection/weighting for the
+                histograms
+
+        Returns:
+            A tuple of ROOT histograms, one per entry.
+        """
+        # Compute the histograms
+        result = tuple((h.Clone(uuid4().hex)
+                        for h
+                        in _n_minus_one(process,
+                                        region,
+                                        self._cuts,
+                                        self._expressions,
+                                        self._binnings)))
+
+        # Set labels and style the histograms
+        for h, x_label in zip(result, self._x_labels):
+            h.SetTitle(self._title)
+            h.GetXaxis().SetTitle(x_label)
+            h.GetYaxis().SetTitle(self._y_label)
+            process.style(h)
+
+        # All done
+        return result
@@ -0,0 +1,83 @@
+"""Provides a statistics-driven optimizer for histogram binnings.
+
+Choosing a variable binning by trial and error requires reprocessing the data
+for every trial.  The optimized_binning function instead fills one fine
+histogram per process (which is cached like any other Histogram result) and
+merges its bins in memory to meet statistical targets (see
+owls_hep.binning.optimized_edges).
+"""
+
+
+# owls-hep imports
+from owls_hep.binning import bin_edges, optimized_edges
+from owls_hep.estimation import Plain
+from owls_hep.histogramming import Histogram
+from owls_hep.utility import histogram_content, histogram_sumw2
+
+
+# Set up default exports
+__all__ = [
+    'optimized_binning',
+]
+
+
+def _fine_bins(processes, region, calculation):
+    """Computes the summed sum of weights and sum of squared weights of the
+    fine bins (excluding underflow and overflow) of several processes.
+    """
+    sumw = sumw2 = 0.0
+    for process in processes:
+        h = calculation(process, region)
+        sumw = sumw + histogram_content(h)[1:-1].astype(float)
+        sumw2 = sumw2 + histogram_sumw2(h)[1:-1]
+    return sumw, sumw2
+
+
+def optimized_binning(backgrounds, region, expression, master_binning,
+                      signals = (), estimation = Plain, min_background = 0.0,
+                      max_relative_error = None,
+                      maximize_significance = False):
+    """Finds a binning of an expression meeting statistical targets.
+
+    Args:
+        backgrounds: An iterable of background processes
+        region: The region in which to evaluate the processes
+        expression: The expression to bin
+        master_binning: The fine binning whose edges are candidate edges
+        signals: An iterable of signal processes, required for significance
+            maximization
+        estimation: The Estimation subclass with which to evaluate processes
+        min_background: The minimum background per bin
+        max_relative_error: The maximum relative statistical error of the
+            background per bin, or None for no limit
+        maximize_significance: Whether or not to maximize the Asimov
+            significance of the signals over the backgrounds
+
+    Returns:
+        A binning tuple of the form ('custom', edge_0, ..., edge_N), which can
+        be used directly with Histogram (including as binnings with
+        master_binning as master_binnings).
+
+    Raises:
+        ValueError: If no binning meets the targets.
+    """
+    # Create the fine histogram calculation
+    calculation = estimation(Histogram(expression, master_binning, '', '', ''))
+
+    # Compute the fine bins
+    background, background_sumw2 = _fine_bins(backgrounds, region, calculation)
+    signals = tuple(signals)
+    if signals:
+        signal, _ = _fine_bins(signals, region, calculation)
+    else:
+        signal = None
+
+    # Optimize the edges
+    edges = optimized_edges(bin_edges(master_binning),
+                            background,
+                            background_sumw2,
+                            signal,
+                            min_background,
+                            max_relative_error,
+                            maximize_significance)
+    return ('custom',) + tuple(edges.tolist())
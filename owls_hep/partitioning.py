@@ -0,0 +1,269 @@
+"""Provides run-partitioned caching of calculation results.
+
+Studies of data over different run ranges or periods would otherwise create
+a new (Filtered) region, and thus a new cache entry and a full pass over the
+data, for every choice of runs.  RunPartitioned instead computes the results
+of a Count or Histogram calculation for every run in a single pass, caches
+these partitions, and answers any run selection by summing partitions.
+"""
+
+
+# System imports
+from uuid import uuid4
+
+# NumPy imports
+import numpy
+
+# owls-cache imports
+from owls_cache.persistent import cached as persistently_cached
+
+# owls-parallel imports
+from owls_parallel import parallelized
+
+# owls-hep imports
+from owls_hep.calculation import HigherOrderCalculation
+from owls_hep.counting import Count
+from owls_hep.histogramming import Histogram
+from owls_hep.arrays import ArrayHistogram
+from owls_hep.binning import bin_edges, draw_cell_indices
+from owls_hep.utility import make_selection, create_histogram, draw_values
+
+
+# Set up default exports
+__all__ = [
+    'RunPartitions',
+    'RunPartitioned',
+]
+
+
+class RunPartitions(object):
+    """Per-run sums of weights and sums of squared weights of the cells of a
+    histogram (including underflow and overflow cells), or of a single cell
+    for counts.
+    """
+
+    def __init__(self, edges, runs, sumw, sumw2):
+        """Initializes a new instance of the RunPartitions class.
+
+        Args:
+            edges: A tuple of NumPy arrays of bin edges, one per dimension
+                (empty for counts)
+            runs: A sorted NumPy array of run numbers
+            sumw: A NumPy array of shape (runs, cells) of the sum of weights
+            sumw2: A NumPy array of shape (runs, cells) of the sum of squared
+                weights
+        """
+        self._edges = tuple(edges)
+        self._runs = runs
+        self._sumw = sumw
+        self._sumw2 = sumw2
+
+    def edges(self):
+        """Returns the bin edges, one array per dimension.
+        """
+        return self._edges
+
+    def shape(self):
+        """Returns the shape of the cells, including underflow and overflow.
+        """
+        return tuple((len(e) + 1 for e in self._edges))
+
+    def runs(self):
+        """Returns the array of runs with selected events.
+        """
+        return self._runs
+
+    def summed(self, ranges = None):
+        """Sums the partitions of a selection of runs.
+
+        Args:
+            ranges: An iterable of (first, last) tuples of inclusive run
+                ranges to select, or None to select all runs
+
+        Returns:
+            A tuple of NumPy arrays (sumw, sumw2) with the cell shape.
+        """
+        if ranges is None:
+            mask = slice(None)
+        else:
+            mask = numpy.zeros(len(self._runs), dtype = bool)
+            for first, last in ranges:
+                mask |= (self._runs >= first) & (self._runs <= last)
+        shape = self.shape()
+        return (self._sumw[mask].sum(axis = 0).reshape(shape),
+                self._sumw2[mask].sum(axis = 0).reshape(shape))
+
+
+# Dummy function to return fake values when parallelizing
+def _partitions_mocker(process, region, run_expression, expressions,
+                       binnings):
+    edges = tuple((bin_edges(b) for b in binnings))
+    cells = int(numpy.prod([len(e) + 1 for e in edges]))
+    return RunPartitions(edges,
+                         numpy.empty(0, dtype = numpy.int64),
+                         numpy.empty((0, cells)),
+                         numpy.empty((0, cells)))
+
+
+@parallelized(_partitions_mocker, lambda p, r, x, e, b: (p, r))
+@persistently_cached('owls_hep.partitioning._partitions')
+def _partitions(process, region, run_expression, expressions, binnings):
+    """Computes the per-run partitions of a histogram (or count) of a process
+    in a region.
+
+    Args:
+        process: The process whose events should be histogrammed
+        region: The region whose weighting/selection should be applied
+        run_expression: The expression evaluating to the run number
+        expressions: A tuple of expression strings (empty for counts)
+        binnings: A tuple of binnings, one per expression
+
+    Returns:
+        A RunPartitions object.
+    """
+    # Compute the cell layout, in [x, y, z] order as in ArrayHistogram
+    edges = tuple((bin_edges(b) for b in binnings))
+    shape = tuple((len(e) + 1 for e in edges))
+    cells = int(numpy.prod(shape))
+
+    # Accumulate partitions, mapping runs to [sumw, sumw2] arrays
+    partitions = {}
+    chain = process.load()
+    for values, weights in draw_values(chain,
+                                       (run_expression,) + expressions,
+                                       make_selection(process, region)):
+        # Compute cell indices, with the last expression on the x axis as in
+        # the Histogram calculation
+        index = draw_cell_indices(edges, values[:, 1:])
+
+        # Sum per run and cell
+        runs, inverse = numpy.unique(values[:, 0].astype(numpy.int64),
+                                     return_inverse = True)
+        keys = inverse.ravel() * cells + index
+        size = len(runs) * cells
+        sumw = numpy.bincount(keys, weights = weights, minlength = size)
+        sumw2 = numpy.bincount(keys,
+                               weights = weights * weights,
+                               minlength = size)
+        sumw = sumw.reshape((len(runs), cells))
+        sumw2 = sumw2.reshape((len(runs), cells))
+        for i, run in enumerate(runs.tolist()):
+            entry = partitions.get(run)
+            if entry is None:
+                partitions[run] = [sumw[i], sumw2[i]]
+            else:
+                entry[0] += sumw[i]
+                entry[1] += sumw2[i]
+
+    # Stack the partitions in run order
+    runs = sorted(partitions)
+    if runs:
+        sumw = numpy.array([partitions[r][0] for r in runs])
+        sumw2 = numpy.array([partitions[r][1] for r in runs])
+    else:
+        sumw = sumw2 = numpy.empty((0, cells))
+    return RunPartitions(edges,
+                         numpy.array(runs, dtype = numpy.int64),
+                         sumw,
+                         sumw2)
+
+
+class RunPartitioned(HigherOrderCalculation):
+    """A higher order calculation which computes the result of a Count or
+    (non-sparse) Histogram calculation for a selection of runs from cached
+    per-run partitions.
+
+    The result has the same type as the underlying calculation.  The region
+    should not itself select runs, since partitions are cached per region.
+    """
+
+    def __init__(self, calculation, run_expression = 'RunNumber',
+                 runs = None):
+        """Initializes a new instance of the RunPartitioned class.
+
+        Args:
+            calculation: The underlying Count or Histogram calculation
+            run_expression: The expression evaluating to the run number
+            runs: An iterable of (first, last) tuples of inclusive run ranges
+                to select, or None to select all runs
+        """
+        # Call the superclass initializer
+        super(RunPartitioned, self).__init__(calculation)
+
+        # Validate the calculation
+        if isinstance(calculation, Histogram):
+            if calculation.sparse():
+                raise ValueError('sparse histograms can not be partitioned')
+        elif not isinstance(calculation, Count):
+            raise ValueError('only Count and Histogram calculations can be '
+                             'partitioned')
+
+        # Store parameters
+        self._run_expression = run_expression
+        self._runs = None if runs is None else tuple(runs)
+
+    def with_runs(self, runs):
+        """Creates a copy of the calculation with a different run selection,
+        sharing the cached partitions.
+
+        Args:
+            runs: An iterable of (first, last) tuples of inclusive run ranges
+                to select, or None to select all runs
+
+        Returns:
+            A new RunPartitioned calculation.
+        """
+        return RunPartitioned(self.calculation, self._run_expression, runs)
+
+    def partitions(self, process, region):
+        """Returns the cached per-run partitions of a process in a region.
+
+        Args:
+            process: The process to consider
+            region: The region to consider
+
+        Returns:
+            A RunPartitions object.
+        """
+        if isinstance(self.calculation, Histogram):
+            expressions = tuple(self.calculation.expressions())
+            binnings = tuple(self.calculation.binnings())
+        else:
+            expressions = binnings = ()
+        return _partitions(process,
+                           region,
+                           self._run_expression,
+                           expressions,
+                           binnings)
+
+    def __call__(self, process, region):
+        """Computes the result of the underlying calculation for the selected
+        runs.
+
+        Args:
+            process: The process to consider
+            region: The region to consider
+
+        Returns:
+            The result of the underlying calculation, restricted to the
+            selected runs.
+        """
+        # Sum the partitions of the selected runs
+        partitions = self.partitions(process, region)
+        sumw, sumw2 = partitions.summed(self._runs)
+
+        # Counts are scalars
+        if not isinstance(self.calculation, Histogram):
+            return float(sumw.sum())
+
+        # Convert histograms to ROOT and style them
+        binnings = self.calculation.binnings()
+        result = ArrayHistogram(partitions.edges(), sumw, sumw2).to_root(
+            create_histogram(len(binnings), uuid4().hex, binnings)
+        )
+        return self.calculation.styled(process, result)
+
+    def finalize_result(self, result):
+        """Polishes the result as the underlying calculation would.
+        """
+        self.calculation.finalize_result(result)
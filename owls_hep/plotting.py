@@ -35,13 +35,15 @@ from six.moves import range
 from six import string_types
 
 # owls-hep imports
-from owls_hep.utility import add_histograms, clone
+from owls_hep.utility import add_histograms, clone, graph_errors, \
+    histogram_sumw2
 
 # ROOT imports
 # HACK: We import and use SetOwnership because ROOT's memory management is so
 # inconsistent and terrible that we have to stop Python from even touching ROOT
 # graphical objects or ROOT will crash, often due to a double free or some
 # other nonsense.
+import owls_hep.pyroot
 from ROOT import TCanvas, TPad, TH1, TH2, THStack, TGraph, TMath, TF1, \
         TLegend, TLine, TLatex, TPaveText, TPaveLabel, TColor, SetOwnership, \
         gStyle
@@ -272,10 +274,9 @@ def maximum_value(drawables):
         # If there is no error band, we just add enough room for statistical
         # error.
         if error_band is not None:
-            maximum_error = 0.0
-            for i in xrange(error_band.GetN()):
-                maximum_error = max(maximum_error, error_band.GetErrorYhigh(i))
-            maximum += maximum_error
+            errors = graph_errors(error_band)
+            if errors is not None and len(errors[3]) > 0:
+                maximum += max(float(errors[3].max()), 0.0)
         elif maximum < 5:
             maximum *= 1.2
         else:
@@ -316,8 +317,7 @@ def ratio_histogram(numerator, denominator, y_title = 'Data / Background'):
 
     # Disable errors on the denominator (they should be handled in an
     # uncertainty band around unity)
-    for bin in xrange(0, combined_denominator.GetNbinsX() + 2):
-        combined_denominator.SetBinError(bin, 0.0)
+    histogram_sumw2(combined_denominator)[...] = 0.0
 
     # Divide by the denominator
     result.Divide(combined_denominator)
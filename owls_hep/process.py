@@ -8,11 +8,13 @@ from inspect import getsource
 from copy import copy
 from os.path import isfile
 from os import stat
+from collections import OrderedDict
 
 # Six imports
 from six import string_types
 
 # ROOT imports
+import owls_hep.pyroot
 from ROOT import TChain, TColor, SetOwnership
 
 # owls-hep imports
@@ -24,8 +26,97 @@ from owls_hep.output import print_warning
 __all__ = [
     'Patch',
     'Process',
+    'MultiProcess',
+    'expanded',
+    'retain_chains',
+    'clear_retained_chains',
 ]
 
+
+# Loaded chains, keyed by files, tree, friends and the current sizes/times of
+# their files, with the least recently used chains first, if chain retention
+# is enabled (see retain_chains)
+_retained_chains = None
+
+# The maximum number of retained chains
+_retained_size = 16
+
+
+def retain_chains(enabled = True, size = 16):
+    """Enables or disables retention of loaded chains.
+
+    When enabled, Process.load returns the same chain (including friends and
+    their indices) for repeated loads of the same files, as long as they are
+    unmodified.  This is useful for long-lived processes (see
+    owls_hep.daemon), but note that modifications to the chain (e.g. entry
+    lists) then persist between loads.
+
+    Args:
+        enabled: Whether or not to retain chains.  Disabling retention
+            releases all retained chains.
+        size: The maximum number of chains to retain, beyond which the least
+            recently used chains are released
+    """
+    global _retained_chains, _retained_size
+    if enabled:
+        if _retained_chains is None:
+            _retained_chains = OrderedDict()
+        _retained_size = size
+        _release_chains()
+    else:
+        _retained_chains = None
+
+
+def clear_retained_chains():
+    """Releases all retained chains, keeping retention enabled if it is.
+    """
+    if _retained_chains is not None:
+        _retained_chains.clear()
+
+
+def _release_chains():
+    """Releases the least recently used retained chains beyond the maximum
+    number of retained chains.
+    """
+    while len(_retained_chains) > _retained_size:
+        _retained_chains.popitem(last = False)
+
+
+def _style(histogram, label, line_color, fill_color, marker_style):
+    """Applies a process style to a histogram.
+
+    Args:
+        histogram: The histogram to style
+        label: The label of the process
+        line_color: The ROOT TColor number of the line color
+        fill_color: The ROOT TColor number of the fill color
+        marker_style: The ROOT TMarker number of the marker style, or None
+    """
+    # Set title
+    histogram.SetTitle(label)
+
+    # Set line color
+    histogram.SetLineColor(line_color)
+
+    # Set fill style and color
+    histogram.SetFillStyle(1001)
+    histogram.SetFillColor(fill_color)
+
+    # Set marker style
+    if marker_style is not None:
+        histogram.SetMarkerStyle(marker_style)
+        # TODO: This should be configurable
+        histogram.SetMarkerSize(2)
+        histogram.SetMarkerColor(histogram.GetLineColor())
+    else:
+        # HACK: Set marker style to an invalid value if not specified,
+        # because we need some way to differentiate rendering in the legend
+        histogram.SetMarkerStyle(0)
+
+    # Make lines visible
+    histogram.SetLineWidth(2)
+
+
 class Patch(object):
     """A reusable process patch weighs/filters events according to an
     expression.
@@ -113,6 +204,9 @@ class Process(object):
         # Create initial patches container
         self._patches = ()
 
+        # Create initial entry restriction (see restricted)
+        self._restriction = None
+
     def __hash__(self):
         """Returns a hash for the process.
         """
@@ -136,28 +230,59 @@ class Process(object):
         # Use only files, tree, patches, friends, and sample_type in the
         # state since those are all that really matter for data processing
         self._get_files_size_time()
-        return (self._files,
-                self._files_size_time,
-                self._tree,
-                self._sample_type,
-                self._friends,
-                self.patches())
+        state = (self._files,
+                 self._files_size_time,
+                 self._tree,
+                 self._sample_type,
+                 self._friends,
+                 self.patches())
+        if self._restriction is not None:
+            state += (self._restriction_state(),)
+        return state
+
+    def _restriction_state(self):
+        """Returns the state of the entry restriction of the process.
+        """
+        if self._restriction is None:
+            return None
+        index, ranges, points = self._restriction
+        return (index.keys(), ranges, points)
 
     def label(self):
         """Returns the label of the process.
         """
         return self._label
 
+    def style_state(self):
+        """Returns the attributes of the process which affect the styling of
+        results, which are not part of the state.
+        """
+        return (self._label,
+                self._line_color,
+                self._fill_color,
+                self._marker_style)
+
     def files(self):
         """Returns the files for the process.
         """
         return self._files
 
+    def tree(self):
+        """Returns the tree path for the process.
+        """
+        return self._tree
+
     def sample_type(self):
         """Returns the sample type for the process.
         """
         return self._sample_type
 
+    def friends(self):
+        """Returns the friends for the process, as (file, tree, index)
+        tuples.
+        """
+        return self._friends
+
     def metadata(self):
         """Returns the metadata for the process, if any.
         """
@@ -171,15 +296,45 @@ class Process(object):
     # NOTE: We could instead return a list of TTrees/TFiles, because using
     # individual TFile/TTree objects might be slightly faster than creating
     # one huge TChain.
-    def load(self):
+    def load(self, files = None):
         """Loads the process data.
 
+        Args:
+            files: An iterable of a subset of the process files to load, or
+                None to load all files
+
         Returns:
             A TChain for the process.
+
+        Raises:
+            ValueError: If a subset of files is requested and the process has
+                friends without an index, which are aligned with the full
+                chain by entry number.
         """
+        files = self._files if files is None else tuple(files)
+        if files != self._files and \
+                any((index is None for _, _, index in self._friends)):
+            raise ValueError('a subset of files can not be loaded with '
+                             'friends aligned by entry number')
+
+        # Check for a retained chain.  Files (including those of friends) are
+        # stat'ed on every load, since they may be rewritten during the
+        # lifetime of the process.
+        if _retained_chains is not None:
+            key = (files,
+                   self._tree,
+                   self._friends,
+                   tuple(((stat(f).st_size, stat(f).st_mtime)
+                          for f
+                          in files + tuple((f for f, _, _ in self._friends)))),
+                   self._restriction_state())
+            chain = _retained_chains.pop(key, None)
+            if chain is not None:
+                _retained_chains[key] = chain
+                return chain
 
         chain = TChain(self._tree)
-        for f in self._files:
+        for f in files:
             if not isfile(f):
                 raise RuntimeError('file does not exist {0}'.format(f))
             chain.Add(f)
@@ -187,6 +342,14 @@ class Process(object):
         for friend in self._friends:
             chain.AddFriend(self._load_friend(*friend))
 
+        if self._restriction is not None:
+            index, ranges, points = self._restriction
+            index.restrict(self, chain, dict(ranges), points, files)
+
+        if _retained_chains is not None:
+            _retained_chains[key] = chain
+            _release_chains()
+
         return chain
 
     def _load_friend(self, file, tree, index):
@@ -247,40 +410,58 @@ class Process(object):
         # All done
         return result
 
-    def style(self, histogram):
-        """Applies the process' style to a histogram.
+    def restricted(self, index, ranges = {}, points = None):
+        """Creates a new copy of the process whose chain only contains the
+        entries matching a selection on the keys of an event index.
 
         Args:
-            histogram: The histogram to style
+            index: The owls_hep.indexing.EventIndex to use
+            ranges: A dictionary mapping key expressions to a value or an
+                inclusive (low, high) tuple of values
+            points: An iterable of tuples of values of all keys, or None for
+                no point selection
+
+        Returns:
+            A copy of the process with the entry restriction applied.
         """
-        # Set title
-        histogram.SetTitle(self._label)
+        # Create the copy
+        result = copy(self)
 
-        # Set line color
-        histogram.SetLineColor(self._line_color)
+        # Set the restriction
+        result._restriction = (
+            index,
+            tuple(sorted(ranges.items())),
+            None if points is None else tuple((tuple(p) for p in points))
+        )
 
-        # Set fill style and color
-        histogram.SetFillStyle(1001)
-        histogram.SetFillColor(self._fill_color)
+        # All done
+        return result
 
-        # Set marker style
-        if self._marker_style is not None:
-            histogram.SetMarkerStyle(self._marker_style)
-            # TODO: This should be configurable
-            histogram.SetMarkerSize(2)
-            histogram.SetMarkerColor(histogram.GetLineColor())
-        else:
-            # HACK: Set marker style to an invalid value if not specified,
-            # because we need some way to differentiate rendering in the legend
-            histogram.SetMarkerStyle(0)
+    def style(self, histogram):
+        """Applies the process' style to a histogram.
+
+        Args:
+            histogram: The histogram to style
+        """
+        _style(histogram,
+               self._label,
+               self._line_color,
+               self._fill_color,
+               self._marker_style)
 
-        # Make lines visible
-        histogram.SetLineWidth(2)
 
 class MultiProcess(object):
     """Represents a combined process whose events may be encoded in one or
     more data processes and which should be rendered according to a certain
     style.
+
+    The state of a combined process is the union of the states of its
+    subprocesses.  Estimations (see owls_hep.estimation.Estimation) evaluate
+    their calculations on each subprocess separately, so that results are
+    computed (in parallel, if inside an owls-parallel environment) and cached
+    per subprocess, and only modified subprocesses are recomputed.  The
+    results are then summed and styled with the style of the combined
+    process.
     """
 
     def __init__(self,
@@ -290,11 +471,13 @@ class MultiProcess(object):
                  line_color = 1,
                  fill_color = 0,
                  marker_style = None,
-                 metadata = None):
-        """Initializes a new instance of the Process class.
+                 metadata = {}):
+        """Initializes a new instance of the MultiProcess class.
 
         Args:
-            subporocesses: An iterable of processes
+            subprocesses: An iterable of processes
+            tree: The ROOT TTree path to use for all subprocesses, or None to
+                use the trees of the subprocesses
             label: The ROOT TLatex label string to use when rendering the
                 process
             line_color: The ROOT TColor number or hex string (#rrggbb) to use
@@ -306,13 +489,23 @@ class MultiProcess(object):
             metadata: A (pickleable) object containing optional metadata
         """
         # Store parameters
-        self._subprocesses = subprocesses
+        self._subprocesses = tuple(subprocesses)
         self._label = label
         self._line_color = line_color
         self._fill_color = fill_color
         self._marker_style = marker_style
         self._metadata = metadata
 
+        # Validate subprocesses
+        if len(self._subprocesses) == 0:
+            raise ValueError('must provide at least one subprocess')
+
+        # Retree subprocesses if necessary
+        if tree is not None:
+            self._subprocesses = tuple((p.retreed(tree)
+                                        for p
+                                        in self._subprocesses))
+
         # Translate hex colors if necessary
         if isinstance(self._line_color, string_types):
             self._line_color = TColor.GetColor(self._line_color)
@@ -320,13 +513,195 @@ class MultiProcess(object):
             self._fill_color = TColor.GetColor(self._fill_color)
 
     def __hash__(self):
-        raise NotImplementedError('method not supported')
+        """Returns a hash for the process.
+        """
+        # Hash the state
+        return hash(self.state())
+
+    def __repr__(self):
+        return '{} [{}]'.format(self._label,
+                                ', '.join((repr(p)
+                                           for p
+                                           in self._subprocesses)))
+
+    def state(self):
+        """Returns the state for the process, i.e. the states of its
+        subprocesses.
+        """
+        return tuple((p.state() for p in self._subprocesses))
+
+    def subprocesses(self):
+        """Returns the subprocesses of the process.
+        """
+        return self._subprocesses
+
+    def label(self):
+        """Returns the label of the process.
+        """
+        return self._label
+
+    def style_state(self):
+        """Returns the attributes of the process which affect the styling of
+        results, which are not part of the state.
+        """
+        return (self._label,
+                self._line_color,
+                self._fill_color,
+                self._marker_style)
+
+    def files(self):
+        """Returns the files of all subprocesses.
+        """
+        return sum((tuple(p.files()) for p in self._subprocesses), ())
 
-    def load(self, properties):
-        raise NotImplementedError('method not supported')
+    def _common(self, name):
+        """Returns a property common to all subprocesses.
+
+        Raises:
+            RuntimeError: If the subprocesses differ in the property.
+        """
+        values = [getattr(p, name)() for p in self._subprocesses]
+        if any((v != values[0] for v in values[1:])):
+            raise RuntimeError('subprocesses of {0} have different '
+                               '{1}'.format(self._label, name))
+        return values[0]
+
+    def tree(self):
+        """Returns the tree path common to all subprocesses.
+        """
+        return self._common('tree')
+
+    def sample_type(self):
+        """Returns the sample type common to all subprocesses.
+        """
+        return self._common('sample_type')
+
+    def friends(self):
+        """Returns the friends common to all subprocesses.
+        """
+        return self._common('friends')
+
+    def patches(self):
+        """Returns the expression of patches common to all subprocesses.
+        """
+        return self._common('patches')
+
+    def metadata(self):
+        """Returns the metadata for the process, if any.
+        """
+        return self._metadata
+
+    def load(self, files = None):
+        """Loads the combined data of the subprocesses as a single chain.
+
+        This is only possible if all subprocesses share the same tree,
+        friends and patches, none of them is restricted and none of their
+        friends is aligned by entry number (i.e. has no index), since merged
+        files would misalign such friends.  Patches are not applied to the
+        chain, but through make_selection (see patches).  Estimations do not
+        use this method, but evaluate calculations per subprocess.
+
+        Args:
+            files: An iterable of a subset of the process files to load, or
+                None to load all files
+
+        Returns:
+            A TChain for the process.
+        """
+        # Validate the subprocesses, including that their patches agree
+        for p in self._subprocesses:
+            if getattr(p, '_restriction', None) is not None:
+                raise RuntimeError('restricted subprocesses can not be loaded '
+                                   'as a single chain')
+        friends = self.friends()
+        if any((index is None for _, _, index in friends)):
+            raise RuntimeError('subprocesses with friends aligned by entry '
+                               'number can not be loaded as a single chain')
+        self.patches()
+
+        # Load the merged files
+        return Process(self.files(),
+                       self.tree(),
+                       self._label,
+                       self.sample_type(),
+                       friends).load(files)
 
     def retreed(self, tree):
-        raise NotImplementedError('method not supported')
+        """Creates a new copy of the process with a different tree for all
+        subprocesses.
+
+        Args:
+            tree: The tree to set for the new process
+
+        Returns:
+            A copy of the process with the tree modified.
+        """
+        # Create the copy
+        result = copy(self)
+
+        # Retree
+        result._subprocesses = tuple((p.retreed(tree)
+                                      for p
+                                      in self._subprocesses))
+
+        # All done
+        return result
+
+    def patched(self,
+                patch,
+                label = None,
+                line_color = None,
+                fill_color = None,
+                marker_style = None,
+                metadata = None):
+        """Creates a new copy of the process with a patch applied to all
+        subprocesses.
 
-    def patched(self, patch):
-        raise NotImplementedError('method not supported')
+        Args:
+            patch: The patch to apply in the new process
+
+        Returns:
+            A copy of the process with the additional patch applied.
+        """
+        # Create the copy
+        result = copy(self)
+        if label is not None: result._label = label
+        if line_color is not None: result._line_color = line_color
+        if fill_color is not None: result._fill_color = fill_color
+        if marker_style is not None: result._marker_style = marker_style
+        if metadata is not None: result._metadata = metadata
+
+        # Patch the subprocesses
+        result._subprocesses = tuple((p.patched(patch)
+                                      for p
+                                      in self._subprocesses))
+
+        # All done
+        return result
+
+    def style(self, histogram):
+        """Applies the process' style to a histogram.
+
+        Args:
+            histogram: The histogram to style
+        """
+        _style(histogram,
+               self._label,
+               self._line_color,
+               self._fill_color,
+               self._marker_style)
+
+
+def expanded(process):
+    """Expands a (possibly nested) combined process into its subprocesses.
+
+    Args:
+        process: The process to expand
+
+    Returns:
+        A tuple of the (non-combined) processes making up the process, which
+        is just (process,) for processes other than MultiProcess.
+    """
+    if isinstance(process, MultiProcess):
+        return sum((expanded(p) for p in process.subprocesses()), ())
+    return (process,)
@@ -0,0 +1,35 @@
+"""Loads and configures ROOT for use by owls-hep.
+
+All owls-hep modules which depend on ROOT import this module before importing
+anything from ROOT, so that ROOT is only loaded (and configured) on first use
+of such a module.  Importing this module has the following effects:
+
+- ROOT is set to batch mode
+- ROOT is stopped from parsing the command line
+- ROOT info messages and warnings are ignored
+"""
+
+
+# ROOT imports
+import ROOT
+
+
+# Set up default exports
+__all__ = [
+    'ROOT',
+]
+
+
+# HACK: Stop ROOT from trying to hijack argparse.  Seems like this is only an
+# issue if you do 'import ROOT' directly.  I weep for future generations.
+# http://root.cern.ch/phpBB3/viewtopic.php?f=14&t=15601
+# NOTE: This has to be set before gROOT is first accessed.
+ROOT.PyConfig.IgnoreCommandLineOptions = True
+
+
+# Set ROOT to batch mode
+ROOT.gROOT.SetBatch(True)
+
+
+# Ignore ROOT info messages and warnings (there are just too many)
+ROOT.gErrorIgnoreLevel = ROOT.kSysError
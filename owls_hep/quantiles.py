@@ -0,0 +1,105 @@
+"""Provides a calculation for computing quantile sketches of distributions.
+
+Reading quantiles off histograms requires guessing a range and a fine enough
+binning up front.  The Quantiles calculation instead streams the values of
+expressions into owls_hep.digest.TDigest sketches in a single pass, from which
+arbitrary quantiles can then be computed.
+"""
+
+
+# Six imports
+from six import string_types
+
+# owls-cache imports
+from owls_cache.persistent import cached as persistently_cached
+
+# owls-parallel imports
+from owls_parallel import parallelized
+
+# owls-hep imports
+from owls_hep.calculation import Calculation
+from owls_hep.digest import TDigest
+from owls_hep.utility import make_selection, draw_values
+
+
+# Set up default exports
+__all__ = [
+    'Quantiles',
+]
+
+
+# Dummy function to return fake values when parallelizing
+def _digests_mocker(process, region, expressions, compression):
+    return tuple((TDigest(compression) for _ in expressions))
+
+
+@parallelized(_digests_mocker, lambda p, r, e, c: (p, r))
+@persistently_cached('owls_hep.quantiles._digests')
+def _digests(process, region, expressions, compression):
+    """Computes quantile sketches of expressions for a process in a region.
+
+    Args:
+        process: The process whose events should be sketched
+        region: The region whose weighting/selection should be applied
+        expressions: A tuple of expression strings
+        compression: The compression of the digests
+
+    Returns:
+        A tuple of owls_hep.digest.TDigest objects, one per expression.
+    """
+    result = tuple((TDigest(compression) for _ in expressions))
+    chain = process.load()
+    for values, weights in draw_values(chain,
+                                       expressions,
+                                       make_selection(process, region)):
+        for i, digest in enumerate(result):
+            digest.update(values[:, i], weights)
+    return result
+
+
+class Quantiles(Calculation):
+    """A calculation which generates weighted quantile sketches of one or
+    more expressions.
+
+    The result is an owls_hep.digest.TDigest for a single expression, or a
+    tuple of them for multiple expressions.  Digests are supported by
+    owls_hep.algebra with non-negative coefficients, so the calculation can be
+    used with estimations which only add components.
+    """
+
+    def __init__(self, expressions, compression = 100):
+        """Initializes a new instance of the Quantiles calculation.
+
+        Args:
+            expressions: The expression (as a string) or expressions (as a
+                tuple of strings), in terms of dataset variables, to sketch
+            compression: The compression of the digests, which controls their
+                accuracy and size
+        """
+        # Store parameters
+        self._single = isinstance(expressions, string_types)
+        if self._single:
+            self._expressions = (expressions,)
+        else:
+            self._expressions = tuple(expressions)
+        self._compression = compression
+
+    def __call__(self, process, region):
+        """Sketches the distributions of weighted events passing a region's
+        selection.
+
+        Args:
+            process: The process whose weighted events should be sketched
+            region: The region providing selection/weighting for the sketches
+
+        Returns:
+            A TDigest, or a tuple of TDigest objects for multiple expressions.
+        """
+        # Copy the results, since they may be modified by algebra
+        result = tuple((d.copy()
+                        for d
+                        in _digests(process,
+                                    region,
+                                    self._expressions,
+                                    self._compression)))
+        return result[0] if self._single else result
@@ -0,0 +1,485 @@
+"""Provides batch rendering of plots in a pool of worker processes.
+
+Rendering is bound by single-core ROOT graphics, so producing large numbers of
+plots is much faster when the work is spread over several processes.  Plots
+are described by PlotSpecification objects, whose drawables must already be
+computed, and rendered with render_batch:
+
+    specifications = [
+        PlotSpecification('plots/met',
+                          ((stack, None, 'hist'), (data, None, 'ep')),
+                          plot_options = {'ratio': True},
+                          ratio = {'histogram': ratio},
+                          legend = {})
+        ...
+    ]
+    results = render_batch(specifications, processes = 8)
+
+Each worker process initializes ROOT once and then renders many plots.
+Failures are reported per plot and never abort the batch.
+
+Re-rendering unchanged plots can be avoided with a PlotCache, which
+fingerprints the content of a specification (drawable contents, styles, Plot
+options and the owls-hep version) and skips rendering when the output files
+recorded for an identical fingerprint still exist:
+
+    results = render_batch(specifications, cache = PlotCache('.plot-cache'))
+"""
+
+
+# System imports
+import os
+import json
+import traceback
+from time import time
+from hashlib import sha1
+from collections import namedtuple
+from multiprocessing import Pool
+from os.path import abspath, exists, getmtime, getsize, join
+
+# NumPy imports
+import numpy
+
+# Six imports
+from six import string_types
+from six.moves import range
+
+# owls-hep imports
+from owls_hep import __version__
+from owls_hep.output import print_warning
+
+
+# Set up default exports
+__all__ = [
+    'PlotSpecification',
+    'PlotCache',
+    'RenderResult',
+    'render',
+    'render_batch',
+]
+
+
+# The result of rendering a single plot.  error is None if the plot was
+# rendered successfully, otherwise it is the formatted exception traceback.
+# cached is True if rendering was skipped because the outputs were up to date.
+RenderResult = namedtuple('RenderResult',
+                          ['path', 'elapsed', 'error', 'cached'])
+
+
+def _update_attributes(hasher, drawable):
+    """Hashes the line, fill and marker attributes of a drawable, where
+    supported.
+    """
+    for getter in ('GetLineColor', 'GetLineStyle', 'GetLineWidth',
+                   'GetFillColor', 'GetFillStyle', 'GetMarkerColor',
+                   'GetMarkerStyle', 'GetMarkerSize'):
+        if hasattr(drawable, getter):
+            hasher.update(repr(getattr(drawable, getter)()).encode('utf-8'))
+
+
+def _update_axis(hasher, axis):
+    """Hashes the binning and title of a histogram axis.
+    """
+    # owls-hep imports
+    from owls_hep.utility import axis_edges
+
+    hasher.update(repr((axis.GetTitle(), axis.GetNbins())).encode('utf-8'))
+    hasher.update(axis_edges(axis).tobytes())
+
+
+def _update_drawable(hasher, drawable):
+    """Hashes the content of a ROOT drawable.
+
+    Args:
+        hasher: The hash object to update
+        drawable: The ROOT object to hash
+
+    Raises:
+        ValueError: If the drawable type is not supported.
+    """
+    # ROOT imports
+    import owls_hep.pyroot
+    from ROOT import TH1, THStack, TGraph, TLine, TF1
+
+    # owls-hep imports
+    from owls_hep.utility import histogram_content, histogram_sumw2, \
+        graph_points, graph_errors
+
+    # Hash the type and title
+    hasher.update(drawable.ClassName().encode('utf-8'))
+    if not isinstance(drawable, TLine):
+        hasher.update(drawable.GetTitle().encode('utf-8'))
+    _update_attributes(hasher, drawable)
+
+    # Hash the content based on type
+    if isinstance(drawable, TH1):
+        for axis in (drawable.GetXaxis(),
+                     drawable.GetYaxis(),
+                     drawable.GetZaxis()):
+            _update_axis(hasher, axis)
+        hasher.update(histogram_content(drawable).tobytes())
+        if drawable.GetSumw2N() > 0:
+            hasher.update(histogram_sumw2(drawable).tobytes())
+    elif isinstance(drawable, THStack):
+        for histogram in drawable.GetHists():
+            _update_drawable(hasher, histogram)
+    elif isinstance(drawable, TGraph):
+        for array in graph_points(drawable) + (graph_errors(drawable) or ()):
+            hasher.update(array.tobytes())
+    elif isinstance(drawable, TLine):
+        hasher.update(repr((drawable.GetX1(), drawable.GetY1(),
+                            drawable.GetX2(), drawable.GetY2()))
+                      .encode('utf-8'))
+    elif isinstance(drawable, TF1):
+        hasher.update(repr((
+            str(drawable.GetExpFormula()),
+            drawable.GetXmin(),
+            drawable.GetXmax(),
+            tuple((drawable.GetParameter(i)
+                   for i in range(drawable.GetNpar())))
+        )).encode('utf-8'))
+    else:
+        raise ValueError('unable to fingerprint drawables of type '
+                         '{0}'.format(drawable.ClassName()))
+
+
+def _update(hasher, value):
+    """Recursively hashes a value which may contain ROOT drawables.
+    """
+    # ROOT imports
+    import owls_hep.pyroot
+    from ROOT import TObject
+
+    if isinstance(value, TObject):
+        _update_drawable(hasher, value)
+    elif isinstance(value, (tuple, list)):
+        hasher.update(b'(')
+        for v in value:
+            _update(hasher, v)
+        hasher.update(b')')
+    elif isinstance(value, dict):
+        hasher.update(b'{')
+        for k in sorted(value):
+            _update(hasher, k)
+            _update(hasher, value[k])
+        hasher.update(b'}')
+    elif value is None or isinstance(value, (bool, int, float) +
+                                     string_types):
+        hasher.update(repr(value).encode('utf-8'))
+    elif isinstance(value, numpy.generic):
+        # NumPy scalars hash as the equivalent builtin values
+        _update(hasher, value.item())
+    elif isinstance(value, numpy.ndarray) and value.dtype != object:
+        hasher.update(repr((value.dtype.str, value.shape)).encode('utf-8'))
+        hasher.update(numpy.ascontiguousarray(value).tobytes())
+    else:
+        raise ValueError('unable to fingerprint values of type '
+                         '{0}'.format(type(value)))
+
+
+class PlotSpecification(object):
+    """Describes a plot to be rendered, in terms of the arguments passed to
+    the owls_hep.plotting.Plot methods.
+
+    All drawables must be picklable, which is the case for ROOT histograms,
+    stacks, graphs, lines and functions.
+    """
+
+    def __init__(self,
+                 path,
+                 drawables_styles_options,
+                 plot_options = {},
+                 ratio = None,
+                 ratios = None,
+                 atlas_label = None,
+                 legend = None,
+                 extensions = ('pdf',)):
+        """Initializes a new instance of the PlotSpecification class.
+
+        Args:
+            path: The output path of the plot, without extension
+            drawables_styles_options: An iterable of (object, style, options)
+                tuples, as accepted by Plot.draw
+            plot_options: A dictionary of keyword arguments for the Plot
+                constructor
+            ratio: A dictionary of keyword arguments for
+                Plot.draw_ratio_histogram, or None to skip it
+            ratios: A dictionary of keyword arguments for Plot.draw_ratios,
+                or None to skip it
+            atlas_label: A dictionary of keyword arguments for
+                Plot.draw_atlas_label, or None to skip it
+            legend: A dictionary of keyword arguments for Plot.draw_legend,
+                or None to skip the legend
+            extensions: The file extensions to save the plot with
+        """
+        # Store parameters
+        self._path = path
+        self._drawables_styles_options = tuple(drawables_styles_options)
+        self._plot_options = dict(plot_options)
+        self._ratio = ratio
+        self._ratios = ratios
+        self._atlas_label = atlas_label
+        self._legend = legend
+        self._extensions = tuple(extensions)
+
+        # Validate that ratio drawing is requested consistently
+        if ratio is not None and ratios is not None:
+            raise ValueError('only one of ratio and ratios may be specified')
+
+    def path(self):
+        """Returns the output path of the plot, without extension.
+        """
+        return self._path
+
+    def extensions(self):
+        """Returns the file extensions the plot is saved with.
+        """
+        return self._extensions
+
+    def outputs(self):
+        """Returns the paths of all files written for the plot.
+        """
+        return tuple((self._path + '.' + e for e in self._extensions))
+
+    def fingerprint(self):
+        """Computes a fingerprint of everything that determines the rendered
+        output: drawable contents, styles, options, the Plot layout constants
+        and the owls-hep version.
+
+        Returns:
+            A hex digest string, or None if some drawable or value can't be
+            fingerprinted, in which case a warning is printed and the plot is
+            never considered cached.
+        """
+        # Import plotting here, so that ROOT graphics are only set up in the
+        # process doing the fingerprinting
+        from owls_hep.plotting import Plot
+
+        # Include the Plot layout constants, since they can be modified
+        # dynamically
+        constants = dict(((k, getattr(Plot, k))
+                          for k in dir(Plot)
+                          if k.startswith('PLOT_')))
+
+        # Hash everything
+        hasher = sha1()
+        try:
+            _update(hasher, (__version__,
+                             constants,
+                             self._drawables_styles_options,
+                             self._plot_options,
+                             self._ratio,
+                             self._ratios,
+                             self._atlas_label,
+                             self._legend,
+                             self._extensions))
+        except ValueError as e:
+            print_warning('plot {0} will not be cached: {1}'.format(
+                self._path,
+                e
+            ))
+            return None
+        return hasher.hexdigest()
+
+    def render(self):
+        """Renders the plot and saves it to file in the calling process.
+        """
+        # Import plotting here, so that ROOT graphics are only set up in the
+        # process doing the rendering
+        from owls_hep.plotting import Plot
+
+        # Create and draw the plot
+        plot = Plot(**self._plot_options)
+        plot.draw(*self._drawables_styles_options)
+        if self._atlas_label is not None:
+            plot.draw_atlas_label(**self._atlas_label)
+        if self._ratio is not None:
+            plot.draw_ratio_histogram(**self._ratio)
+        if self._ratios is not None:
+            plot.draw_ratios(**self._ratios)
+        if self._legend is not None:
+            plot.draw_legend(**self._legend)
+
+        # Save it
+        plot.save(self._path, self._extensions)
+
+
+class PlotCache(object):
+    """A content-addressed cache of rendered plots.
+
+    For each output path, the cache records the fingerprint of the
+    specification which was last rendered there, along with the size and
+    modification time of the written files.  A plot is up to date if its
+    fingerprint matches the record and none of the files has been changed or
+    removed since.
+    """
+
+    def __init__(self, directory):
+        """Initializes a new instance of the PlotCache class.
+
+        Args:
+            directory: The directory in which to store cache records.  It is
+                created if it does not exist.
+        """
+        self._directory = directory
+        if not exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Another process may have created it concurrently
+                if not exists(directory):
+                    raise
+
+    def _record_path(self, specification):
+        """Returns the path of the record for a specification's output path.
+        """
+        key = sha1(abspath(specification.path()).encode('utf-8')).hexdigest()
+        return join(self._directory, key + '.json')
+
+    def up_to_date(self, specification, fingerprint = None):
+        """Checks whether the outputs of a specification are up to date.
+
+        Args:
+            specification: The PlotSpecification to check
+            fingerprint: The precomputed fingerprint of the specification, if
+                available
+
+        Returns:
+            True if the plot doesn't need to be rendered, False otherwise.
+        """
+        # Compute the fingerprint if necessary
+        if fingerprint is None:
+            fingerprint = specification.fingerprint()
+            if fingerprint is None:
+                return False
+
+        # Load the record
+        try:
+            with open(self._record_path(specification), 'r') as f:
+                record = json.load(f)
+        except (IOError, OSError, ValueError):
+            return False
+
+        # Compare the fingerprint and the state of all output files
+        if record.get('fingerprint') != fingerprint:
+            return False
+        for output in specification.outputs():
+            if not exists(output):
+                return False
+            if record['outputs'].get(output) != [getsize(output),
+                                                 getmtime(output)]:
+                return False
+        return True
+
+    def record(self, specification, fingerprint = None):
+        """Records that a specification has been rendered.
+
+        Args:
+            specification: The PlotSpecification which was rendered
+            fingerprint: The precomputed fingerprint of the specification, if
+                available
+        """
+        # Compute the fingerprint if necessary
+        if fingerprint is None:
+            fingerprint = specification.fingerprint()
+            if fingerprint is None:
+                return
+
+        # Create the record
+        record = {
+            'fingerprint': fingerprint,
+            'outputs': dict(((o, [getsize(o), getmtime(o)])
+                             for o in specification.outputs()))
+        }
+
+        # Write it atomically, since several workers may share a cache
+        path = self._record_path(specification)
+        temporary = '{0}.{1}'.format(path, os.getpid())
+        with open(temporary, 'w') as f:
+            json.dump(record, f)
+        os.rename(temporary, path)
+
+
+def render(specification, cache = None):
+    """Renders a single plot specification, capturing any failure.
+
+    Args:
+        specification: The PlotSpecification to render
+        cache: A PlotCache used to skip rendering up-to-date plots, or None
+
+    Returns:
+        A RenderResult for the plot.
+    """
+    start = time()
+    try:
+        # Check whether rendering can be skipped
+        fingerprint = None
+        if cache is not None:
+            fingerprint = specification.fingerprint()
+            if fingerprint is not None and \
+                    cache.up_to_date(specification, fingerprint):
+                return RenderResult(specification.path(),
+                                    time() - start,
+                                    None,
+                                    True)
+
+        # Render the plot and record it
+        specification.render()
+        if fingerprint is not None:
+            cache.record(specification, fingerprint)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    return RenderResult(specification.path(), time() - start, error, False)
+
+
+# Pool workers can only call module-level functions, so bind the cache to the
+# worker process when it is initialized
+_worker_cache = None
+
+
+def _render_with_worker_cache(specification):
+    return render(specification, _worker_cache)
+
+
+def _initialize_worker(cache = None):
+    """Initializes ROOT and its graphics style once per worker process.
+    """
+    global _worker_cache
+    _worker_cache = cache
+    import owls_hep.plotting
+
+
+def render_batch(specifications,
+                 processes = None,
+                 chunk_size = 1,
+                 cache = None):
+    """Renders a batch of plots in a pool of worker processes.
+
+    Args:
+        specifications: An iterable of PlotSpecification objects
+        processes: The number of worker processes, or None to use the number
+            of CPUs.  If 1, plots are rendered in the calling process.
+        chunk_size: The number of plots sent to a worker at a time
+        cache: A PlotCache used to skip rendering up-to-date plots, or None
+
+    Returns:
+        A list of RenderResult objects, in the order of the specifications.
+    """
+    # Convert specifications to a list
+    specifications = list(specifications)
+
+    # Render in the calling process if requested
+    if processes == 1:
+        _initialize_worker()
+        return [render(s, cache) for s in specifications]
+
+    # Render in a worker pool
+    pool = Pool(processes, _initialize_worker, (cache,))
+    try:
+        return list(pool.imap(_render_with_worker_cache,
+                              specifications,
+                              chunk_size))
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,270 @@
+"""Provides cached tree schemas and pre-flight validation of expressions.
+
+Typos in region selections or histogram expressions are otherwise only
+discovered when TTree::Draw fails (or silently fills nothing), often well
+into a batch job.  The schema (branch names and types, entries and cluster
+layout) of the tree of each input file is cached persistently under the
+fingerprint of the file, so that validate can check every expression of a
+planned run against the trees (and friend trees) of the processes before
+any event loop starts.
+"""
+
+
+# System imports
+from os.path import abspath, isfile, getsize, getmtime
+
+# NumPy imports
+import numpy
+
+# owls-cache imports
+from owls_cache.persistent import cached as persistently_cached
+
+# owls-hep imports
+from owls_hep.expression import properties
+from owls_hep.process import expanded
+from owls_hep.utility import load_file, make_selection
+
+
+# Set up default exports
+__all__ = [
+    'TreeSchema',
+    'tree_schema',
+    'problems',
+    'validate',
+]
+
+
+class TreeSchema(object):
+    """The schema of a tree in a file.
+    """
+
+    def __init__(self, entries, branches, clusters):
+        """Initializes a new instance of the TreeSchema class.
+
+        Args:
+            entries: The number of entries in the tree
+            branches: A dictionary mapping branch and leaf names (including
+                full leaf names, e.g. 'branch.leaf') to type names
+            clusters: A NumPy array of the first entry of each cluster
+        """
+        self._entries = entries
+        self._branches = branches
+        self._clusters = clusters
+
+    def entries(self):
+        """Returns the number of entries in the tree.
+        """
+        return self._entries
+
+    def branches(self):
+        """Returns a dictionary mapping branch and leaf names to type names.
+        """
+        return self._branches
+
+    def clusters(self):
+        """Returns a NumPy array of the first entry of each cluster.
+        """
+        return self._clusters
+
+    def cluster_sizes(self):
+        """Returns a NumPy array of the number of entries in each cluster.
+        """
+        return numpy.diff(numpy.append(self._clusters, self._entries))
+
+    def __contains__(self, name):
+        """Checks whether a property name refers to a branch or leaf of the
+        tree, or to a member of one (e.g. 'branch.member').
+        """
+        parts = name.split('.')
+        return any(('.'.join(parts[:i]) in self._branches
+                    for i in range(len(parts), 0, -1)))
+
+
+@persistently_cached('owls_hep.schema._tree_schema')
+def _tree_schema(path, size, mtime, tree):
+    """Reads the schema of a tree in a file.
+
+    The size and modification time of the file are only used as part of the
+    cache key.
+
+    Args:
+        path: The absolute path of the file
+        size: The size of the file
+        mtime: The modification time of the file
+        tree: The path of the tree within the file
+
+    Returns:
+        A TreeSchema object.
+    """
+    # Open the tree
+    handle = load_file(path)
+    try:
+        if not handle or handle.IsZombie():
+            raise RuntimeError('unable to open {0}'.format(path))
+        t = handle.Get(tree)
+        if not t:
+            raise RuntimeError('tree {0} does not exist in {1}'.format(
+                tree,
+                path
+            ))
+        entries = int(t.GetEntries())
+
+        # Record branch and leaf names with their types
+        branches = {}
+        for leaf in t.GetListOfLeaves():
+            type_name = leaf.GetTypeName()
+            branches[leaf.GetBranch().GetName()] = type_name
+            branches[leaf.GetName()] = type_name
+            branches[str(leaf.GetFullName())] = type_name
+
+        # Record the cluster layout
+        clusters = []
+        iterator = t.GetClusterIterator(0)
+        start = int(iterator.Next())
+        while start < entries:
+            clusters.append(start)
+            start = int(iterator.Next())
+    finally:
+        handle.Close()
+
+    return TreeSchema(entries,
+                      branches,
+                      numpy.array(clusters, dtype = numpy.int64))
+
+
+def tree_schema(path, tree):
+    """Returns the (cached) schema of a tree in a file.
+
+    Args:
+        path: The path of the file
+        tree: The path of the tree within the file
+
+    Returns:
+        A TreeSchema object.
+    """
+    path = abspath(path)
+    return _tree_schema(path, getsize(path), getmtime(path), tree)
+
+
+def _friend_prefixes(tree):
+    """Returns the names by which branches of a friend tree may be qualified,
+    i.e. the tree path and its base name.
+    """
+    return set((tree, tree.rsplit('/', 1)[-1]))
+
+
+def problems(process, expressions):
+    """Checks expressions against the trees of a process and its friends.
+
+    Args:
+        process: The process to check
+        expressions: An iterable of expression strings to evaluate on the
+            process chain
+
+    Returns:
+        A list of problem descriptions, empty if none were found.
+    """
+    result = []
+
+    # Load the schemas of the process files
+    schemas = []
+    for f in process.files():
+        if not isfile(f):
+            result.append('file does not exist: {0}'.format(f))
+            continue
+        try:
+            schemas.append((f, tree_schema(f, process.tree())))
+        except RuntimeError as e:
+            result.append(str(e))
+
+    # Load the schemas of the friends and check their alignment
+    friends = []
+    entries = sum((s.entries() for _, s in schemas))
+    for file, tree, index in process.friends():
+        if not isfile(file):
+            result.append('friend file does not exist: {0}'.format(file))
+            continue
+        try:
+            schema = tree_schema(file, tree)
+        except RuntimeError as e:
+            result.append(str(e))
+            continue
+        friends.append((tree, schema))
+        if index is None:
+            if len(schemas) == len(process.files()) and \
+                    schema.entries() != entries:
+                result.append('friend tree {0} in {1} has {2} entries, but '
+                              'the process has {3} entries and no index is '
+                              'used'.format(tree,
+                                            file,
+                                            schema.entries(),
+                                            entries))
+        else:
+            for name in sorted(properties(index)):
+                if name not in schema:
+                    result.append('friend tree {0} in {1} is missing index '
+                                  'branch {2}'.format(tree, file, name))
+                missing = [f for f, s in schemas if name not in s]
+                if missing:
+                    result.append('index branch {0} of friend tree {1} is '
+                                  'missing in {2}'.format(name,
+                                                          tree,
+                                                          ', '.join(missing)))
+
+    # Check that every property resolves in every file
+    names = set()
+    for expression in expressions:
+        names.update(properties(expression))
+    for name in sorted(names):
+        # Check friends, which may be used unqualified or qualified by their
+        # tree name
+        head, _, tail = name.partition('.')
+        if any(((name in s) or (tail and head in _friend_prefixes(t) and
+                                tail in s)
+                for t, s in friends)):
+            continue
+
+        # Check the process files
+        missing = [f for f, s in schemas if name not in s]
+        if missing:
+            result.append('branch {0} is missing in {1}'.format(
+                name,
+                ', '.join(missing)
+            ))
+
+    return result
+
+
+def validate(processes, regions, expressions = ()):
+    """Validates the selections of regions and a set of expressions against
+    the trees of processes before any calculation is run.
+
+    Schemas are read once per file and cached persistently, so that
+    validation of a planned run takes milliseconds.
+
+    Args:
+        processes: An iterable of processes, with combined processes being
+            validated per subprocess
+        regions: An iterable of regions, whose selections and weights (for
+            each process) are validated
+        expressions: An iterable of additional expression strings (e.g.
+            histogram expressions) to validate
+
+    Raises:
+        ValueError: If any problems are found, listing all of them.
+    """
+    regions = tuple(regions)
+    expressions = tuple(expressions)
+    messages = []
+    for process in processes:
+        for subprocess in expanded(process):
+            selections = tuple((make_selection(subprocess, r)
+                                for r
+                                in regions))
+            for problem in problems(subprocess, selections + expressions):
+                messages.append('{0}: {1}'.format(subprocess.label(),
+                                                  problem))
+    if messages:
+        raise ValueError('invalid expressions or inputs:\n{0}'.format(
+            '\n'.join(messages)
+        ))
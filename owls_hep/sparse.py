@@ -0,0 +1,284 @@
+"""Provides a sparse N-dimensional histogram type.
+
+ROOT histograms are limited to 3 dimensions and allocate memory for every
+bin, which is prohibitive for finely-binned multi-differential distributions
+where only a small fraction of bins is populated.  SparseHistogram only stores
+populated bins, has no limit on dimensionality, is picklable (and thus
+cacheable), and can be projected onto 1, 2 or 3 of its axes as a ROOT
+histogram.
+"""
+
+
+# System imports
+from uuid import uuid4
+
+# NumPy imports
+import numpy
+
+# Six imports
+from six import iteritems
+
+# owls-hep imports
+from owls_hep.binning import bin_edges
+
+
+# Set up default exports
+__all__ = [
+    'SparseHistogram',
+]
+
+
+class SparseHistogram(object):
+    """A sparse N-dimensional histogram storing the sum of weights and sum of
+    squared weights of populated bins.
+
+    Bins are indexed as in ROOT, i.e. index 0 is the underflow bin, indices 1
+    to N are the regular bins, and index N + 1 is the overflow bin of an axis.
+    Axes are ordered as those of ROOT histograms, i.e. axis 0 is projected
+    onto the x axis, so values of expressions in TTree::Draw order (with the
+    last expression on the x axis) have to be reversed when filling.
+    """
+
+    def __init__(self, binnings):
+        """Initializes a new instance of the SparseHistogram class.
+
+        Args:
+            binnings: A tuple of binnings (see owls_hep.binning), one per
+                dimension
+        """
+        # Store the bin edges of each axis
+        self._binnings = tuple(binnings)
+        self._edges = tuple((bin_edges(b) for b in self._binnings))
+
+        # Create the bin storage, mapping bin index tuples to [sumw, sumw2]
+        self._bins = {}
+
+        # Set up default labels
+        self._title = ''
+        self._labels = ('',) * len(self._edges)
+
+    def dimension(self):
+        """Returns the dimension of the histogram.
+        """
+        return len(self._edges)
+
+    def binnings(self):
+        """Returns the binnings of the histogram.
+        """
+        return self._binnings
+
+    def edges(self, axis):
+        """Returns the bin edges of an axis.
+
+        Args:
+            axis: The axis index
+        """
+        return self._edges[axis]
+
+    def populated_bins(self):
+        """Returns the number of populated bins.
+        """
+        return len(self._bins)
+
+    def title(self):
+        """Returns the title of the histogram.
+        """
+        return self._title
+
+    def labels(self):
+        """Returns the axis labels of the histogram.
+        """
+        return self._labels
+
+    def set_labels(self, title, labels):
+        """Sets the title and axis labels of the histogram, which are applied
+        to projections.
+
+        Args:
+            title: The histogram title
+            labels: An iterable of axis labels, one per dimension
+        """
+        self._title = title
+        self._labels = tuple(labels)
+        if len(self._labels) != self.dimension():
+            raise ValueError('must provide one label per dimension')
+
+    def fill(self, values, weights = None):
+        """Fills the histogram.
+
+        Args:
+            values: An array-like of shape (entries, dimension)
+            weights: An array-like of shape (entries,), or None for unit
+                weights
+        """
+        # Convert the inputs
+        values = numpy.asarray(values, dtype = numpy.float64)
+        if values.ndim != 2 or values.shape[1] != self.dimension():
+            raise ValueError('values must have shape (entries, {0})'.format(
+                self.dimension()
+            ))
+        if len(values) == 0:
+            return
+        if weights is None:
+            weights = numpy.ones(len(values))
+        else:
+            weights = numpy.asarray(weights, dtype = numpy.float64)
+
+        # Compute bin indices along each axis.  Values equal to the upper edge
+        # of a bin belong to the next bin, as in ROOT.
+        indices = numpy.column_stack([
+            numpy.searchsorted(e, values[:, i], side = 'right')
+            for i, e
+            in enumerate(self._edges)
+        ])
+
+        # Accumulate weights per distinct bin
+        unique, inverse = numpy.unique(indices,
+                                       axis = 0,
+                                       return_inverse = True)
+        inverse = inverse.ravel()
+        sumw = numpy.bincount(inverse,
+                              weights = weights,
+                              minlength = len(unique))
+        sumw2 = numpy.bincount(inverse,
+                               weights = weights * weights,
+                               minlength = len(unique))
+
+        # Merge them into the store
+        self._accumulate(zip(map(tuple, unique.tolist()),
+                             sumw.tolist(),
+                             sumw2.tolist()))
+
+    def _accumulate(self, bins, coefficient = 1.0):
+        """Adds (index, sumw, sumw2) triplets to the store, scaling the sum
+        of weights by coefficient and the sum of squared weights by its
+        square.
+        """
+        coefficient2 = coefficient * coefficient
+        store = self._bins
+        for index, sumw, sumw2 in bins:
+            entry = store.get(index)
+            if entry is None:
+                store[index] = [coefficient * sumw, coefficient2 * sumw2]
+            else:
+                entry[0] += coefficient * sumw
+                entry[1] += coefficient2 * sumw2
+
+    def _validate_compatible(self, other):
+        """Validates that another sparse histogram has the same binning.
+        """
+        if self.dimension() != other.dimension() or \
+                not all((numpy.array_equal(a, b)
+                         for a, b
+                         in zip(self._edges, other._edges))):
+            raise ValueError('sparse histograms must have the same binning')
+
+    def add(self, other, coefficient = 1.0):
+        """Adds another sparse histogram to this one in place.
+
+        Args:
+            other: The other SparseHistogram, which must have the same binning
+            coefficient: The scale factor to apply to the other histogram
+        """
+        self._validate_compatible(other)
+        self._accumulate(((k, v[0], v[1]) for k, v in iteritems(other._bins)),
+                         coefficient)
+
+    def scale(self, coefficient):
+        """Scales this histogram in place.
+
+        Args:
+            coefficient: The scale factor
+        """
+        coefficient2 = coefficient * coefficient
+        for entry in self._bins.values():
+            entry[0] *= coefficient
+            entry[1] *= coefficient2
+
+    def copy(self):
+        """Returns a copy of this histogram.
+        """
+        result = SparseHistogram(self._binnings)
+        result._title = self._title
+        result._labels = self._labels
+        result._bins = dict(((k, list(v)) for k, v in iteritems(self._bins)))
+        return result
+
+    def integral(self, include_overflow = True):
+        """Computes the sum of weights of the histogram.
+
+        Args:
+            include_overflow: Whether or not to include underflow and overflow
+                bins
+
+        Returns:
+            The sum of weights.
+        """
+        if include_overflow:
+            return sum((v[0] for v in self._bins.values()))
+        limits = tuple((len(e) for e in self._edges))
+        return sum((v[0]
+                    for k, v
+                    in iteritems(self._bins)
+                    if all((0 < i < n for i, n in zip(k, limits)))))
+
+    def project(self, axes = None, name = None):
+        """Projects the histogram onto 1 to 3 of its axes as a ROOT histogram.
+
+        Bins are summed over all other axes, including their underflow and
+        overflow bins.
+
+        Args:
+            axes: An iterable of the axis indices to project onto, or None to
+                use all axes (the histogram must then have at most 3
+                dimensions)
+            name: The name of the ROOT histogram, or None for a unique name
+
+        Returns:
+            A ROOT TH1F, TH2F or TH3F histogram.
+        """
+        # owls-hep imports
+        from owls_hep.utility import create_histogram, histogram_content, \
+            set_histogram_content
+
+        # Figure out axes
+        if axes is None:
+            axes = tuple(range(self.dimension()))
+        else:
+            axes = tuple(axes)
+        if not 1 <= len(axes) <= 3:
+            raise ValueError('can only project onto 1 - 3 axes')
+
+        # Create the histogram
+        if name is None:
+            name = uuid4().hex
+        result = create_histogram(
+            len(axes),
+            name,
+            tuple((('custom',) + tuple(self._edges[a]) for a in axes))
+        )
+        result.SetTitle(self._title)
+        for a, axis in zip(axes, (result.GetXaxis(),
+                                  result.GetYaxis(),
+                                  result.GetZaxis())):
+            axis.SetTitle(self._labels[a])
+
+        # Sum bins onto the projected axes
+        shape = histogram_content(result).shape
+        sumw = numpy.zeros(shape)
+        sumw2 = numpy.zeros(shape)
+        if self._bins:
+            indices = numpy.array(list(self._bins.keys()))[:, axes]
+            values = numpy.array(list(self._bins.values()))
+            flat = numpy.ravel_multi_index(indices.T, shape)
+            sumw.flat[:] = numpy.bincount(flat,
+                                          weights = values[:, 0],
+                                          minlength = sumw.size)
+            sumw2.flat[:] = numpy.bincount(flat,
+                                           weights = values[:, 1],
+                                           minlength = sumw2.size)
+
+        # Set the bin contents and errors
+        set_histogram_content(result, sumw, sumw2)
+
+        return result
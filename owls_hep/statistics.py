@@ -0,0 +1,179 @@
+"""Provides a mergeable accumulator of weighted moments.
+
+WeightedMoments accumulates the weighted means and the covariance matrix of
+several variables in a numerically stable way: each chunk of values is
+reduced about its own mean, and chunks (or accumulators) are combined with
+the pairwise update of Chan, Golub and LeVeque, so that no large sums of
+squares are ever subtracted.
+"""
+
+
+# NumPy imports
+import numpy
+
+# Six imports
+from six import string_types
+
+
+# Set up default exports
+__all__ = [
+    'WeightedMoments',
+]
+
+
+class WeightedMoments(object):
+    """An accumulator of the weighted means and covariance matrix of a set of
+    variables.
+    """
+
+    def __init__(self, labels):
+        """Initializes a new instance of the WeightedMoments class.
+
+        Args:
+            labels: The label (as a string) of a single variable, or an
+                iterable of variable labels, one per variable
+        """
+        # Store labels
+        if isinstance(labels, string_types):
+            self._labels = (labels,)
+        else:
+            self._labels = tuple(labels)
+        n = len(self._labels)
+
+        # Create the accumulators: the sum of weights, the sum of squared
+        # weights, the weighted means, and the weighted sums of products of
+        # deviations from the means (co-moments)
+        self._sumw = 0.0
+        self._sumw2 = 0.0
+        self._mean = numpy.zeros(n)
+        self._comoment = numpy.zeros((n, n))
+
+    def labels(self):
+        """Returns the variable labels.
+        """
+        return self._labels
+
+    def _merge(self, sumw, sumw2, mean, comoment):
+        """Merges the moments of another sample into the accumulator.
+        """
+        total = self._sumw + sumw
+        if total == 0:
+            self._sumw, self._sumw2 = total, self._sumw2 + sumw2
+            return
+        delta = mean - self._mean
+        self._comoment = (self._comoment + comoment +
+                          numpy.outer(delta, delta) *
+                          (self._sumw * sumw / total))
+        self._mean = self._mean + delta * (sumw / total)
+        self._sumw = total
+        self._sumw2 += sumw2
+
+    def update(self, values, weights = None):
+        """Adds values to the accumulator.
+
+        Args:
+            values: An array-like of shape (entries, variables)
+            weights: An array-like of shape (entries,), or None for unit
+                weights
+        """
+        # Convert the inputs
+        values = numpy.asarray(values, dtype = numpy.float64)
+        if values.ndim != 2 or values.shape[1] != len(self._labels):
+            raise ValueError('values must have shape (entries, {0})'.format(
+                len(self._labels)
+            ))
+        if len(values) == 0:
+            return
+        if weights is None:
+            weights = numpy.ones(len(values))
+        else:
+            weights = numpy.asarray(weights, dtype = numpy.float64)
+
+        # Compute the moments of the chunk about its own mean
+        sumw = weights.sum()
+        if sumw == 0:
+            return
+        mean = numpy.dot(weights, values) / sumw
+        deviations = values - mean
+        comoment = numpy.dot(deviations.T * weights, deviations)
+
+        # Merge them
+        self._merge(sumw, numpy.dot(weights, weights), mean, comoment)
+
+    def add(self, other, coefficient = 1.0):
+        """Merges a scaled accumulator into this one in place.
+
+        Args:
+            other: The other WeightedMoments, with the same variables
+            coefficient: The scale factor to apply to the weights of the
+                other accumulator
+        """
+        if other._labels != self._labels:
+            raise ValueError('moments must have the same variables')
+        self._merge(coefficient * other._sumw,
+                    coefficient * coefficient * other._sumw2,
+                    other._mean,
+                    coefficient * other._comoment)
+
+    def scale(self, coefficient):
+        """Scales the weights of the accumulator in place.
+
+        Args:
+            coefficient: The scale factor
+        """
+        self._sumw *= coefficient
+        self._sumw2 *= coefficient * coefficient
+        self._comoment = self._comoment * coefficient
+
+    def copy(self):
+        """Returns a copy of the accumulator.
+        """
+        result = WeightedMoments(self._labels)
+        result._sumw = self._sumw
+        result._sumw2 = self._sumw2
+        result._mean = self._mean.copy()
+        result._comoment = self._comoment.copy()
+        return result
+
+    def sum_of_weights(self):
+        """Returns the sum of weights.
+        """
+        return self._sumw
+
+    def effective_entries(self):
+        """Returns the effective number of entries, (sum w)^2 / sum w^2.
+        """
+        if self._sumw2 == 0:
+            return 0.0
+        return self._sumw * self._sumw / self._sumw2
+
+    def mean(self):
+        """Returns the NumPy array of weighted means.
+        """
+        return self._mean
+
+    def covariance(self):
+        """Returns the NumPy array of the weighted (population) covariance
+        matrix.
+        """
+        if self._sumw == 0:
+            return numpy.full_like(self._comoment, numpy.nan)
+        return self._comoment / self._sumw
+
+    def variance(self):
+        """Returns the NumPy array of weighted variances.
+        """
+        return numpy.diag(self.covariance()).copy()
+
+    def std(self):
+        """Returns the NumPy array of weighted standard deviations.
+        """
+        return numpy.sqrt(self.variance())
+
+    def correlation(self):
+        """Returns the NumPy array of the weighted correlation matrix.
+        """
+        covariance = self.covariance()
+        std = numpy.sqrt(numpy.diag(covariance))
+        with numpy.errstate(invalid = 'ignore', divide = 'ignore'):
+            return covariance / numpy.outer(std, std)
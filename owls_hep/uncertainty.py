@@ -6,15 +6,18 @@
 from uuid import uuid4
 from math import sqrt
 
-# Six imports
-from six.moves import range
-
 # ROOT imports
-from ROOT import TH1, TGraphAsymmErrors
+import owls_hep.pyroot
+from ROOT import TGraphAsymmErrors
+
+# NumPy imports
+import numpy
 
 # owls-hep imports
 from owls_hep.calculation import HigherOrderCalculation
 from owls_hep.algebra import multiply
+from owls_hep.arrays import ArrayHistogram
+from owls_hep.utility import graph_points, graph_errors
 
 
 # Set up default exports
@@ -57,6 +60,15 @@ class Uncertainty(HigherOrderCalculation):
         raise NotImplementedError('abstract method')
 
 
+def _band_arrays(band):
+    """Returns NumPy views of the Y-values, low Y-errors and high Y-errors of
+    a TGraphAsymmErrors.
+    """
+    _, y = graph_points(band)
+    _, _, error_low, error_high = graph_errors(band)
+    return (y, error_low, error_high)
+
+
 def sum_quadrature(values):
     """Adds values in quadrature.
 
@@ -268,39 +280,28 @@ def uncertainty_band(process, region, calculation, uncertainty, estimation):
     # below.
     band = TGraphAsymmErrors(nominal)
 
-    # Get the number of bins in the histogram
+    # Extract the bin contents and errors of the histogram (without overflow)
+    # and views of the band's point arrays
     bins = nominal.GetNbinsX()
-
-    # Go through each point in the graph and 0-out the Y-value and Y-error.
-    # Unfortunately we can't set the Y-value individually (which would have
-    # been great since the X-values would already be at bin centers).
-    # Anyway, no big deal, X-values are easy to set.  The X-error will have
-    # already bin set to bin width.
-    for bin in xrange(0, bins):
-        band.SetPoint(bin, band.GetX()[bin], 0)
-        band.SetPointEYhigh(bin, 0.0)
-        band.SetPointEYlow(bin, 0.0)
-
-    # Loop over all bins and compute uncertainties
-    for bin, point in zip(range(1, bins + 1), range(0, bins)):
-        # Get the bin content
-        content = nominal.GetBinContent(bin)
-
-        # If the content is 0, there are no uncertainties, because we only
-        # consider overall and statistical uncertainties
-        if content == 0.0:
-            band.SetPointEYhigh(point, 0.0)
-            band.SetPointEYlow(point, 0.0)
-            continue
-
-        # Create a list of fractional variations for this bin.  These lists
-        # will hold FRACTIONAL variations, i.e. variations normalized to bin
-        # content, and will be converted to absolute variations below when they
-        # are set as errors.
+    nominal_array = ArrayHistogram.from_root(nominal)
+    content = nominal_array.sumw()[1:bins + 1]
+    y, error_low, error_high = _band_arrays(band)
+
+    # Zero out the Y-values.  The X-values are already at bin centers and the
+    # X-errors are already set to the bin widths.
+    y[:] = 0.0
+
+    # Compute uncertainties.  Statistical errors are taken from the
+    # distribution directly.  Other uncertainties are overall (fractional)
+    # variations, added in quadrature and scaled by bin content.
+    # TODO: What's the point of using the unweighted distribution for the
+    # statistical error, as described above? It makes no sense to me.
+    if uncertainty is None:
+        error_high[:] = numpy.sqrt(nominal_array.sumw2()[1:bins + 1])
+        error_low[:] = error_high
+    else:
         up_variations = []
         down_variations = []
-
-        # Add any overall variations
         if overall_up is not None:
             up_variations.append(overall_up - 1.0)
         if overall_down is not None:
@@ -309,39 +310,14 @@ def uncertainty_band(process, region, calculation, uncertainty, estimation):
             up_variations.append(shape_overall_up - 1.0)
         if shape_overall_down is not None:
             down_variations.append(1.0 - shape_overall_down)
+        error_high[:] = sum_quadrature(up_variations) * content
+        error_low[:] = sum_quadrature(down_variations) * content
 
-        # TODO: What's the point of using the unweighted distribution? It
-        # makes no sense to me.
-        # Add the statistical variation if uncertainty is None.  Note that we
-        # compute this for the statistics of the unweighted Monte Carlo and not
-        # the weighted bin count.
-        #if uncertainty is None:
-            ## Get the unweighted content
-            #unweighted_content = unweighted.GetBinContent(bin)
-
-            ## Calculate error if possible
-            #if content > 0.0 and unweighted_content > 0.0:
-                ## The extra factor of 1/content is just because we normalize
-                ## everything to content for combining together.  It has nothing
-                ## to do with the derivation of the uncertainty, and it is
-                ## multipled out below.
-                #statistical_variation = (
-                    #content / sqrt(unweighted_content)
-                #) / content
-                #up_variations.append(statistical_variation)
-                #down_variations.append(statistical_variation)
-
-        # Statistical error; use the error from the distribution directly
-        if uncertainty is None:
-            error = nominal.GetBinError(bin)
-            band.SetPointEYhigh(point, error)
-            band.SetPointEYlow(point, error)
-        else:
-            # Set the point and error.  Note that, since we sum things in
-            # quadrature, it really doesn't matter how we compute the
-            # differences above.
-            band.SetPointEYhigh(point, sum_quadrature(up_variations) * content)
-            band.SetPointEYlow(point, sum_quadrature(down_variations) * content)
+    # If the content is 0, there are no uncertainties, because we only
+    # consider overall and statistical uncertainties
+    empty = (content == 0.0)
+    error_high[empty] = 0.0
+    error_low[empty] = 0.0
 
     # All done
     return band
@@ -369,23 +345,17 @@ def combined_uncertainty_band(bands, base = None, title = 'Uncertainty'):
     # Set the title
     result.SetTitle(title)
 
-    # Loop over all bins
-    for i in xrange(0, result.GetN()):
-        # Set the content, if any
-        if base is not None:
-            result.SetPoint(i,
-                            result.GetX()[i],
-                            base.GetBinContent(i + 1))
+    # Grab views of the result's point arrays
+    y, error_low, error_high = _band_arrays(result)
 
-        # Set the high error
-        result.SetPointEYhigh(i, sum_quadrature((b.GetErrorYhigh(i)
-                                                 for b
-                                                 in bands)))
+    # Set the content, if any
+    if base is not None:
+        y[:] = ArrayHistogram.from_root(base).sumw()[1:len(y) + 1]
 
-        # Set the low error
-        result.SetPointEYlow(i, sum_quadrature((b.GetErrorYlow(i)
-                                                for b
-                                                in bands)))
+    # Add the errors of all bands in quadrature
+    errors = numpy.array([_band_arrays(b) for b in bands])
+    error_high[:] = numpy.sqrt(numpy.sum(errors[:, 2] ** 2, axis = 0))
+    error_low[:] = numpy.sqrt(numpy.sum(errors[:, 1] ** 2, axis = 0))
 
     # All done
     return result
@@ -432,33 +402,26 @@ def ratio_uncertainty_band(denominator, band):
     # Create a clone of the band
     result = band.Clone(uuid4().hex)
 
-    # Calculate the number of bins
-    bins = denominator.GetNbinsX()
-
-    # Loop over all bins
+    # Extract the denominator bin contents and views of the band's point
+    # arrays
     # NOTE: We don't handle overflow because TGraphAsymmErrors doesn't have a
     # notion of overflow bins
-    for bin, point in zip(range(1, bins + 1), range(0, bins)):
-        # Set the band nominal point to center around Y = 1.0
-        result.SetPoint(point, result.GetX()[point], 1.0)
-
-        # Extract the bin content
-        denominator_value = denominator.GetBinContent(bin)
-
-        # If the bin content is 0, then the uncertainty is 0, otherwise it is
-        # the definition given above
-        if denominator_value == 0.0:
-            result.SetPointEYhigh(point, 0.0)
-            result.SetPointEYlow(point, 0.0)
-        else:
-            result.SetPointEYhigh(
-                point,
-                band.GetErrorYhigh(point) / denominator_value
-            )
-            result.SetPointEYlow(
-                point,
-                band.GetErrorYlow(point) / denominator_value
-            )
+    bins = denominator.GetNbinsX()
+    denominator_value = \
+        ArrayHistogram.from_root(denominator).sumw()[1:bins + 1]
+    y, error_low, error_high = _band_arrays(result)
+    _, band_error_low, band_error_high = _band_arrays(band)
+
+    # Set the band nominal points to center around Y = 1.0
+    y[:] = 1.0
+
+    # If the bin content is 0, then the uncertainty is 0, otherwise it is the
+    # definition given above
+    nonzero = (denominator_value != 0.0)
+    error_high[:] = 0.0
+    error_low[:] = 0.0
+    error_high[nonzero] = band_error_high[nonzero] / denominator_value[nonzero]
+    error_low[nonzero] = band_error_low[nonzero] / denominator_value[nonzero]
 
     # All done
     return result
@@ -6,11 +6,17 @@ calculations.
 # System imports
 from uuid import uuid4
 from array import array
-from math import sqrt
+
+# NumPy imports
+import numpy
+
+# Six imports
+from six.moves import range
 
 # ROOT imports
+import owls_hep.pyroot
 from ROOT import TFile, TH1, TH1F, TH2F, TH3F, TF1, TGraph, \
-        TGraphAsymmErrors, Double, SetOwnership
+        TGraphErrors, TGraphAsymmErrors, Double, SetOwnership
         
 
 # owls-cache imports
@@ -18,6 +24,8 @@ from owls_cache.persistent import cached as persistently_cached
 
 # owls-hep imports
 from owls_hep.expression import multiplied
+from owls_hep.sparse import SparseHistogram
+from owls_hep.binning import rebin_indices
 
 def load_file(file, mode = None):
     """Open a ROOT file
@@ -53,6 +61,199 @@ def clone(drawable):
     else:
         return drawable.Clone(uuid4().hex)
 
+# Map of ROOT array base classes of histograms to the corresponding NumPy
+# types
+_ROOT_ARRAY_TYPES = (
+    ('TArrayD', numpy.float64),
+    ('TArrayF', numpy.float32),
+    ('TArrayL64', numpy.int64),
+    ('TArrayI', numpy.int32),
+    ('TArrayS', numpy.int16),
+    ('TArrayC', numpy.int8),
+)
+
+def buffer_view(buffer, size, dtype = numpy.float64):
+    """Creates a NumPy array sharing memory with a ROOT buffer (e.g. the
+    result of TGraph::GetY).
+
+    Args:
+        buffer: The ROOT buffer
+        size: The number of elements in the buffer
+        dtype: The NumPy type of the buffer elements
+
+    Returns:
+        A NumPy array viewing the buffer.  Writing to the array modifies the
+        underlying ROOT object.
+    """
+    if size == 0:
+        return numpy.empty(0, dtype = dtype)
+    # Older PyROOT versions need the buffer size to be set explicitly, while
+    # newer ones expose a reshape method for the same purpose
+    if hasattr(buffer, 'SetSize'):
+        buffer.SetSize(size)
+    elif hasattr(buffer, 'reshape'):
+        buffer.reshape((size,))
+    return numpy.frombuffer(buffer, dtype = dtype, count = size)
+
+def _buffer_array(buffer, size, dtype = numpy.float64):
+    """Copies the first size elements of a ROOT buffer into a NumPy array.
+    """
+    return buffer_view(buffer, size, dtype).copy()
+
+def axis_edges(axis):
+    """Get the bin edges of a ROOT axis.
+
+    Args:
+        axis: The TAxis object
+
+    Returns:
+        A NumPy array of the N + 1 bin edges.
+    """
+    n = axis.GetNbins()
+    if axis.GetXbins().GetSize() > 0:
+        return _buffer_array(axis.GetXbins().GetArray(), n + 1)
+    return numpy.linspace(axis.GetXmin(), axis.GetXmax(), n + 1)
+
+def _cell_shape(histogram):
+    """Returns the shape of the bin arrays of a THN histogram, including
+    underflow and overflow bins, in ROOT's memory order (z, y, x).
+    """
+    return tuple(reversed((histogram.GetNbinsX() + 2,
+                           histogram.GetNbinsY() + 2,
+                           histogram.GetNbinsZ() + 2)
+                          [:histogram.GetDimension()]))
+
+def histogram_content(histogram):
+    """Get a view of the bin contents of a THN histogram.
+
+    Args:
+        histogram: The TH1, TH2 or TH3 object
+
+    Returns:
+        A NumPy array, indexed as [x, y, z] and including underflow (index 0)
+        and overflow (index N + 1) bins, sharing memory with the histogram.
+        The array type matches the histogram type (e.g. float32 for TH1F).
+    """
+    for class_name, dtype in _ROOT_ARRAY_TYPES:
+        if histogram.InheritsFrom(class_name):
+            break
+    else:
+        raise TypeError('unsupported histogram type: {0}'.format(
+            histogram.ClassName()
+        ))
+    shape = _cell_shape(histogram)
+    view = buffer_view(histogram.GetArray(), int(numpy.prod(shape)), dtype)
+    return view.reshape(shape).transpose()
+
+def histogram_sumw2(histogram):
+    """Get a view of the sum of squared weights of the bins of a THN
+    histogram.
+
+    If the histogram doesn't store the sum of squared weights, it is created
+    (via TH1::Sumw2) before the view is taken.
+
+    Args:
+        histogram: The TH1, TH2 or TH3 object
+
+    Returns:
+        A float64 NumPy array, indexed as [x, y, z] and including underflow
+        and overflow bins, sharing memory with the histogram.
+    """
+    if histogram.GetSumw2N() == 0:
+        histogram.Sumw2()
+    shape = _cell_shape(histogram)
+    view = buffer_view(histogram.GetSumw2().GetArray(),
+                       int(numpy.prod(shape)))
+    return view.reshape(shape).transpose()
+
+def set_histogram_content(histogram, content, sumw2 = None):
+    """Set the bin contents (and optionally the sum of squared weights) of a
+    THN histogram in bulk.
+
+    Args:
+        histogram: The TH1, TH2 or TH3 object
+        content: An array-like of bin contents, indexed as [x, y, z] and
+            including underflow and overflow bins
+        sumw2: An array-like of the sum of squared weights, with the same
+            shape as content, or None to leave errors untouched
+    """
+    histogram_content(histogram)[...] = content
+    if sumw2 is not None:
+        histogram_sumw2(histogram)[...] = sumw2
+    histogram.ResetStats()
+
+def graph_points(graph):
+    """Get views of the point coordinates of a TGraph.
+
+    Args:
+        graph: The TGraph object
+
+    Returns:
+        A tuple of NumPy arrays (x, y) sharing memory with the graph.
+    """
+    n = graph.GetN()
+    return (buffer_view(graph.GetX(), n), buffer_view(graph.GetY(), n))
+
+def graph_errors(graph):
+    """Get views of the point errors of a TGraphErrors or TGraphAsymmErrors.
+
+    Args:
+        graph: The TGraph object
+
+    Returns:
+        A tuple of NumPy arrays (x_low, x_high, y_low, y_high) sharing memory
+        with the graph, or None if the graph has no errors.  For a
+        TGraphErrors, the low and high errors are the same arrays.
+    """
+    n = graph.GetN()
+    if isinstance(graph, TGraphAsymmErrors):
+        return (buffer_view(graph.GetEXlow(), n),
+                buffer_view(graph.GetEXhigh(), n),
+                buffer_view(graph.GetEYlow(), n),
+                buffer_view(graph.GetEYhigh(), n))
+    elif isinstance(graph, TGraphErrors):
+        x, y = buffer_view(graph.GetEX(), n), buffer_view(graph.GetEY(), n)
+        return (x, x, y, y)
+    return None
+
+def set_graph_points(graph, x, y, errors = None):
+    """Set the points (and optionally the errors) of a TGraph in bulk,
+    resizing the graph if necessary.
+
+    Args:
+        graph: The TGraph object
+        x, y: Array-likes of point coordinates
+        errors: A tuple of array-likes (x_low, x_high, y_low, y_high), or
+            None to leave errors untouched.  The graph must support errors
+            if specified.
+    """
+    if graph.GetN() != len(x):
+        graph.Set(len(x))
+    graph_x, graph_y = graph_points(graph)
+    graph_x[:] = x
+    graph_y[:] = y
+    if errors is not None:
+        views = graph_errors(graph)
+        if views is None:
+            raise ValueError('graph does not support errors')
+        for view, values in zip(views, errors):
+            view[:] = values
+
+def _bin_centers(histogram, include_overflow):
+    """Computes the x-axis bin centers of a histogram, extrapolating the
+    underflow and overflow bin centers from the first and last bin widths as
+    ROOT does.
+    """
+    edges = axis_edges(histogram.GetXaxis())
+    centers = 0.5 * (edges[1:] + edges[:-1])
+    if include_overflow:
+        centers = numpy.concatenate((
+            [edges[0] - 0.5 * (edges[1] - edges[0])],
+            centers,
+            [edges[-1] + 0.5 * (edges[-1] - edges[-2])]
+        ))
+    return centers
+
 def get_bins(binned, include_overflow = False):
     """Get a list of bin content and bin centers of a TH1 or TGraph.
 
@@ -62,20 +263,16 @@ def get_bins(binned, include_overflow = False):
     Returns:
         A list of (x, y) values
     """
-    points = []
     if isinstance(binned, TGraph):
-        x = Double()
-        y = Double()
-        for i in range(binned.GetN()):
-            binned.GetPoint(i, x, y)
-            points.append((float(x), float(y)))
+        x, y = graph_points(binned)
     elif isinstance(binned, TH1):
-        offset = 1 if include_overflow else 0
-        points = [(binned.GetBinCenter(i+1), binned.GetBinContent(i+1))
-                   for i in range(0-offset, binned.GetNbinsX()+offset)]
+        x = _bin_centers(binned, include_overflow)
+        y = histogram_content(binned)
+        if not include_overflow:
+            y = y[1:-1]
     else:
         raise RuntimeError('Unsupported object: {0}'.format(type(binned)))
-    return points
+    return list(zip(x.tolist(), y.tolist()))
 
 def get_bins_errors(binned, include_overflow = False):
     """Get a list of bin content and bin centers of a TH1 or TGraph.
@@ -86,22 +283,26 @@ def get_bins_errors(binned, include_overflow = False):
     Returns:
         A list of (x, y, y_err) values
     """
-    points = []
     if isinstance(binned, TGraph):
-        x = Double()
-        y = Double()
-        for i in range(binned.GetN()):
-            binned.GetPoint(i, x, y)
-            points.append((float(x), float(y), binned.GetErrorYhigh(i)))
+        x, y = graph_points(binned)
+        errors = graph_errors(binned)
+        if errors is None:
+            # TGraph::GetErrorYhigh returns -1 for graphs without errors
+            e = -numpy.ones(len(x))
+        else:
+            e = errors[3]
     elif isinstance(binned, TH1):
-        offset = 1 if include_overflow else 0
-        points = [(binned.GetBinCenter(i+1),
-                   binned.GetBinContent(i+1),
-                   binned.GetBinError(i+1))
-                   for i in range(0-offset, binned.GetNbinsX()+offset)]
+        x = _bin_centers(binned, include_overflow)
+        y = histogram_content(binned)
+        if binned.GetSumw2N() > 0:
+            e = numpy.sqrt(histogram_sumw2(binned))
+        else:
+            e = numpy.sqrt(numpy.abs(y))
+        if not include_overflow:
+            y, e = y[1:-1], e[1:-1]
     else:
         raise RuntimeError('Unsupported object: {0}'.format(type(binned)))
-    return points
+    return list(zip(x.tolist(), y.tolist(), e.tolist()))
 
 def print_bins(binned, include_overflow = True):
     """Print bin content and errors of a TH1 or TGraph.
@@ -136,10 +337,15 @@ def make_selection(process, region):
 
 def integral(obj, include_overflow = True, bin_range = None):
     """A helper function to compute the integral for THN histograms of
-    dimensionality D <= 3.
+    dimensionality D <= 3, or for sparse histograms of any dimensionality.
     """
     offset = 1 if include_overflow else 0
-    if obj.GetDimension() == 1:
+    if isinstance(obj, SparseHistogram):
+        if bin_range is not None:
+            raise ValueError('can\'t compute the integral of a bin range for '
+                             'sparse histograms')
+        return obj.integral(include_overflow)
+    elif obj.GetDimension() == 1:
         if bin_range is not None:
             return obj.Integral(bin_range[0], bin_range[1])
         else:
@@ -171,15 +377,14 @@ def add_overflow_to_last_bin(histogram):
     """A helper function to add the contents of the overflow bin to the last
     visible bin in TH1 histograms.
     """
-    if isinstance(histogram, TH1):
+    if isinstance(histogram, TH1) and histogram.GetDimension() == 1:
         n = histogram.GetNbinsX()
-        new_content = histogram.GetBinContent(n) + histogram.GetBinContent(n+1)
-        new_error = sqrt(histogram.GetBinError(n)**2 +
-                         histogram.GetBinError(n+1)**2)
-        histogram.SetBinContent(n, new_content)
-        histogram.SetBinError(n, new_error)
-        histogram.SetBinContent(n+1, 0.0)
-        histogram.SetBinError(n+1, 0.0)
+        content = histogram_content(histogram)
+        sumw2 = histogram_sumw2(histogram)
+        content[n] += content[n+1]
+        sumw2[n] += sumw2[n+1]
+        content[n+1] = 0.0
+        sumw2[n+1] = 0.0
     else:
         raise ValueError('don\'t know how to add overflow bin to last bin for '
                          '{}'.format(type(histogram)))
@@ -218,6 +423,67 @@ def create_histogram(dimensionality, name, binnings):
     h.Sumw2()
     return h
 
+def draw_values(chain, expressions, selection = '', chunk_size = 1000000,
+                first_entry = 0, entries = None):
+    """Evaluates expressions for all selected entries of a chain in a single
+    pass, in chunks of bounded size.
+
+    The expressions are evaluated by TTree::Draw, so only the branches which
+    they reference are read.  All expressions must evaluate to a single value
+    per entry.
+
+    Args:
+        chain: The TChain (or TTree) to evaluate expressions on
+        expressions: A non-empty iterable of expression strings
+        selection: The selection (and weight) expression string
+        chunk_size: The maximum number of entries to process at a time
+        first_entry: The first entry of the chain to process
+        entries: The number of entries to process, or None to process all
+            entries from first_entry on
+
+    Returns:
+        A generator yielding (values, weights) tuples for each chunk, where
+        values is a NumPy array of shape (rows, len(expressions)) and weights
+        is a NumPy array of the corresponding values of the selection
+        expression.  Entries for which the selection is 0 are not included.
+    """
+    # Create the expression string.  More than 4 expressions require the
+    # 'para' option.
+    expressions = tuple(expressions)
+    if len(expressions) == 0:
+        raise ValueError('must provide at least one expression')
+    expression = ':'.join(expressions)
+    option = 'goff' if len(expressions) <= 4 else 'goff para'
+
+    # Make sure the result buffers can hold a full chunk
+    chain.SetEstimate(chunk_size + 1)
+
+    # Process chunks
+    end = chain.GetEntries()
+    if entries is not None:
+        end = min(end, first_entry + entries)
+    for first in range(first_entry, end, chunk_size):
+        rows = chain.Draw(expression,
+                          selection,
+                          option,
+                          min(chunk_size, end - first),
+                          first)
+        if rows < 0:
+            raise RuntimeError('unable to evaluate expressions {0} with '
+                               'selection {1}'.format(expressions, selection))
+        if rows > chunk_size:
+            raise RuntimeError('expressions must evaluate to a single value '
+                               'per entry: {0}'.format(expressions))
+        if rows == 0:
+            continue
+
+        # Copy out the values, since the buffers are reused by the next call
+        values = numpy.empty((rows, len(expressions)))
+        for i in range(len(expressions)):
+            values[:, i] = _buffer_array(chain.GetVal(i), rows)
+        yield values, _buffer_array(chain.GetW(), rows)
+
+
 @persistently_cached('owls_hep.histogramming._histogram')
 def histogram(process, region, expressions, binnings):
     """Generates a ROOT histogram of a distribution a process in a region.
@@ -251,6 +517,72 @@ def histogram(process, region, expressions, binnings):
     return h
 
 
+def rebinned(histogram, master_binnings, binnings, name = None):
+    """Creates a coarser-binned copy of a histogram by merging bins in memory.
+
+    Args:
+        histogram: The TH1, TH2 or TH3 object, with master_binnings
+        master_binnings: The binnings of the histogram, one per dimension
+        binnings: The coarser binnings, one per dimension, whose edges must
+            align with the master edges.  They may cover a smaller range than
+            the master binnings, with the remainder going to the underflow
+            and overflow bins.
+        name: The name for the result, or None for a unique name
+
+    Returns:
+        A new histogram with the coarser binnings.
+
+    Raises:
+        ValueError: If the binnings don't align with the master binnings.
+    """
+    # Create the result
+    if name is None:
+        name = uuid4().hex
+    result = create_histogram(len(binnings), name, binnings)
+    result.SetTitle(histogram.GetTitle())
+
+    # Merge bins along each axis by multiplying with a matrix mapping master
+    # bins onto coarser bins
+    content = histogram_content(histogram).astype(numpy.float64)
+    sumw2 = histogram_sumw2(histogram).copy()
+    shape = histogram_content(result).shape
+    for axis, (master, binning) in enumerate(zip(master_binnings, binnings)):
+        mapping = numpy.zeros((content.shape[axis], shape[axis]))
+        mapping[numpy.arange(content.shape[axis]),
+                rebin_indices(master, binning)] = 1.0
+        content = numpy.moveaxis(
+            numpy.tensordot(content, mapping, axes = ([axis], [0])), -1, axis
+        )
+        sumw2 = numpy.moveaxis(
+            numpy.tensordot(sumw2, mapping, axes = ([axis], [0])), -1, axis
+        )
+
+    # Set the bin contents and errors
+    set_histogram_content(result, content, sumw2)
+    return result
+
+
+def fill_histogram(histogram, values, weights = None):
+    """Fills a 1D histogram with arrays of values in a single call.
+
+    Args:
+        histogram: The TH1 object
+        values: An array-like of values
+        weights: An array-like of weights, with the same length as values, or
+            None for unit weights
+    """
+    values = numpy.ascontiguousarray(values, dtype = numpy.float64)
+    if len(values) == 0:
+        return
+    if weights is None:
+        weights = numpy.ones(len(values))
+    else:
+        weights = numpy.ascontiguousarray(weights, dtype = numpy.float64)
+        if len(weights) != len(values):
+            raise ValueError('values and weights must have the same length')
+    histogram.FillN(len(values), values, weights)
+
+
 def add_histograms(histograms, title = None):
     """Adds histograms and returns the result with bin errors calculated.
 
@@ -280,21 +612,31 @@ def _make_consistent(passed, total):
     """Helper function to make the passed and total histograms consistent for
     histogram division/efficiency calculations.
     """
-    # Include overflow bins
-    for i in range(passed.GetNbinsX()+2):
-        if total.GetBinContent(i) <= 0:
-            # total.SetBinContent(i, 1.0)
-            # NOTE: Let's try this
-            total.SetBinContent(i, 0.0)
-            passed.SetBinContent(i, 0.0)
-        elif passed.GetBinContent(i) < 0:
-            passed.SetBinContent(i, 0)
-        elif total.GetBinContent(i) < passed.GetBinContent(i):
-            passed.SetBinContent(i, total.GetBinContent(i))
-            passed.SetBinError(i, total.GetBinError(i))
-        if passed.GetBinContent(i) == 0:
-            total.SetBinError(i, 0)
-            passed.SetBinError(i, 0)
+    # Grab views of the contents and squared errors, including overflow bins
+    passed_content = histogram_content(passed)
+    passed_sumw2 = histogram_sumw2(passed)
+    total_content = histogram_content(total)
+    total_sumw2 = histogram_sumw2(total)
+
+    # Empty total bins
+    # NOTE: Previously total was set to 1.0 here
+    empty = (total_content <= 0)
+    total_content[empty] = 0.0
+    passed_content[empty] = 0.0
+
+    # Negative passed bins
+    negative = ~empty & (passed_content < 0)
+    passed_content[negative] = 0.0
+
+    # Passed bins exceeding total bins
+    exceeding = ~empty & ~negative & (total_content < passed_content)
+    passed_content[exceeding] = total_content[exceeding]
+    passed_sumw2[exceeding] = total_sumw2[exceeding]
+
+    # Bins with nothing passing have no errors
+    zero = (passed_content == 0)
+    total_sumw2[zero] = 0.0
+    passed_sumw2[zero] = 0.0
 
 def efficiency(total, passed):
     name = uuid4().hex
@@ -0,0 +1,319 @@
+"""Provides efficient computation of yield tables for many processes and
+regions.
+
+Building a yield table by calling Count()(process, region) for every
+combination of process and region schedules (and executes) one pass over the
+data per combination.  The yields function instead evaluates the weighted
+selections of all regions as columns of a single pass over the data of each
+process, and writes the resulting counts back to the cache of
+owls_hep.counting.Count so that later counting calls are free.
+"""
+
+
+# System imports
+import csv
+from math import sqrt
+
+# NumPy imports
+import numpy
+
+# Six imports
+from six import PY2, string_types
+
+# owls-cache imports
+from owls_cache.persistent import cached as persistently_cached
+
+# owls-parallel imports
+from owls_parallel import parallelized
+
+# owls-hep imports
+from owls_hep.expression import ored
+from owls_hep.estimation import Estimation, Plain
+from owls_hep.counting import Count, store_count
+from owls_hep.utility import make_selection, draw_values
+
+
+# Set up default exports
+__all__ = [
+    'YieldTable',
+    'yields',
+]
+
+
+# Dummy function to return fake values when parallelizing.  None signals to
+# yields that the counts must not be written back to the Count cache.
+def _yields_mocker(process, regions):
+    return None
+
+
+@parallelized(_yields_mocker, lambda p, rs: (p,))
+@persistently_cached('owls_hep.yields._yields', lambda p, rs: (p, rs))
+def _yields(process, regions):
+    """Computes the weighted event counts of a process in several regions in
+    a single pass over the process data.
+
+    Args:
+        process: The process whose events should be counted
+        regions: A tuple of regions whose weighting/selection should be
+            applied
+
+    Returns:
+        A NumPy array of shape (2, len(regions)) containing the sum of weights
+        and the sum of squared weights in each region.
+    """
+    # Create one weighted selection column per region.  Regions without
+    # selection and weight count every entry.
+    columns = tuple((make_selection(process, r) or '1' for r in regions))
+
+    # Only read entries passing at least one region selection.  Regions
+    # without selection require all entries.
+    selections = tuple((r.selection() for r in regions))
+    if all(selections):
+        selection = ored(*selections)
+    else:
+        selection = ''
+
+    # Accumulate the counts
+    result = numpy.zeros((2, len(regions)))
+    chain = process.load()
+    for values, _ in draw_values(chain, columns, selection):
+        # The selection only filters entries, so its values are ignored
+        result[0] += values.sum(axis = 0)
+        result[1] += (values * values).sum(axis = 0)
+    return result
+
+
+# The characters with special meaning in LaTeX text and their escaped forms
+_latex_escapes = {
+    '\\': '\\textbackslash{}',
+    '&': '\\&',
+    '%': '\\%',
+    '$': '\\$',
+    '#': '\\#',
+    '_': '\\_',
+    '{': '\\{',
+    '}': '\\}',
+    '~': '\\textasciitilde{}',
+    '^': '\\textasciicircum{}',
+}
+
+
+def _latex_escaped(text):
+    """Escapes the characters of a string which have special meaning in
+    LaTeX text.
+    """
+    return ''.join((_latex_escapes.get(c, c) for c in text))
+
+
+class YieldTable(object):
+    """A labelled table of yields with shape processes x regions x
+    variations.
+    """
+
+    def __init__(self, processes, regions, variations, sumw, sumw2):
+        """Initializes a new instance of the YieldTable class.
+
+        Args:
+            processes: A tuple of process labels
+            regions: A tuple of region labels
+            variations: A tuple of variation labels
+            sumw: A NumPy array of the sum of weights, with shape
+                (len(processes), len(regions), len(variations))
+            sumw2: A NumPy array of the sum of squared weights, with the same
+                shape as sumw
+        """
+        # Store parameters
+        self._processes = tuple(processes)
+        self._regions = tuple(regions)
+        self._variations = tuple(variations)
+        self._sumw = numpy.asarray(sumw, dtype = numpy.float64)
+        self._sumw2 = numpy.asarray(sumw2, dtype = numpy.float64)
+
+        # Validate shapes
+        shape = (len(self._processes),
+                 len(self._regions),
+                 len(self._variations))
+        if self._sumw.shape != shape or self._sumw2.shape != shape:
+            raise ValueError('yield arrays must have shape {0}'.format(shape))
+
+    def processes(self):
+        """Returns the process labels.
+        """
+        return self._processes
+
+    def regions(self):
+        """Returns the region labels.
+        """
+        return self._regions
+
+    def variations(self):
+        """Returns the variation labels.
+        """
+        return self._variations
+
+    def values(self):
+        """Returns the NumPy array of yields.
+        """
+        return self._sumw
+
+    def errors(self):
+        """Returns the NumPy array of statistical errors of the yields.
+        """
+        return numpy.sqrt(self._sumw2)
+
+    def __getitem__(self, index):
+        """Returns the yield and its error for a (process, region, variation)
+        index tuple.
+        """
+        return (float(self._sumw[index]), sqrt(self._sumw2[index]))
+
+    def _rows(self):
+        """Generates (process, region, variation, yield, error) rows.
+        """
+        for i, p in enumerate(self._processes):
+            for j, r in enumerate(self._regions):
+                for k, v in enumerate(self._variations):
+                    value, error = self[i, j, k]
+                    yield (p, r, v, value, error)
+
+    def to_csv(self, path):
+        """Writes the table to a CSV file, with one row per process, region
+        and variation.
+
+        Args:
+            path: The path of the CSV file
+        """
+        if PY2:
+            f = open(path, 'wb')
+        else:
+            f = open(path, 'w', newline = '')
+        with f:
+            writer = csv.writer(f)
+            writer.writerow(('process', 'region', 'variation',
+                             'yield', 'error'))
+            for row in self._rows():
+                writer.writerow(row)
+
+    def to_latex(self, variation = 0, precision = 2):
+        """Formats the table for a single variation as a LaTeX tabular, with
+        one row per process and one column per region.  Special characters
+        in labels are escaped.
+
+        Args:
+            variation: The index of the variation to format
+            precision: The number of decimal places to print
+
+        Returns:
+            The LaTeX string.
+        """
+        cell = '${{0:.{0}f}} \\pm {{1:.{0}f}}$'.format(precision)
+        lines = [
+            '\\begin{{tabular}}{{l{0}}}'.format('r' * len(self._regions)),
+            '\\hline',
+            ' & '.join(['Process'] + [_latex_escaped(r)
+                                      for r
+                                      in self._regions]) + ' \\\\',
+            '\\hline',
+        ]
+        for i, p in enumerate(self._processes):
+            lines.append(' & '.join([_latex_escaped(p)] + [
+                cell.format(*self[i, j, variation])
+                for j
+                in range(len(self._regions))
+            ]) + ' \\\\')
+        lines.extend(('\\hline', '\\end{tabular}'))
+        return '\n'.join(lines) + '\n'
+
+
+def _label(label):
+    """Converts a process or region label to a string.
+    """
+    if isinstance(label, string_types):
+        return label
+    return ' '.join(label)
+
+
+def yields(processes, regions, estimation = Plain, variations = None):
+    """Computes a table of yields for all combinations of processes, regions
+    and variations.
+
+    The components of the estimation of every combination are grouped by
+    process, and the counts of each process in all of its regions are
+    computed in a single pass over its data.
+
+    Args:
+        processes: An iterable of processes
+        regions: An iterable of regions
+        estimation: The Estimation subclass (which will be instantiated with a
+            Count calculation) or Estimation instance to use
+        variations: An iterable of variations (or tuples of variations) to
+            apply to each region, or None to only compute nominal yields
+
+    Returns:
+        A YieldTable of the yields and their statistical errors.
+    """
+    # Set up the estimation
+    if not isinstance(estimation, Estimation):
+        estimation = estimation(Count())
+
+    # Set up inputs
+    processes = tuple(processes)
+    regions = tuple(regions)
+    if variations is None:
+        variations = (None,)
+    else:
+        variations = tuple(variations)
+
+    # Compute the components of all cells, recording the regions required for
+    # each distinct process
+    cells = {}
+    required = {}
+    for i, p in enumerate(processes):
+        for j, r in enumerate(regions):
+            for k, v in enumerate(variations):
+                varied = r if v is None else r.varied(v)
+                components = estimation.expanded_components(p, varied)
+                if len(components) == 0:
+                    raise ValueError('must have at least one component for '
+                                     'estimation')
+                cells[i, j, k] = components
+                for _, _, component_process, component_region in components:
+                    entry = required.setdefault(hash(component_process),
+                                                (component_process, {}))
+                    entry[1].setdefault(hash(component_region),
+                                        component_region)
+
+    # Compute the counts of each process in one pass and write them back to
+    # the Count cache
+    counts = {}
+    for process_hash, (process, process_regions) in required.items():
+        process_regions = tuple(process_regions.values())
+        result = _yields(process, process_regions)
+        if result is None:
+            result = numpy.zeros((2, len(process_regions)))
+        else:
+            for r, value in zip(process_regions, result[0]):
+                store_count(process, r, value)
+        for r, value, value2 in zip(process_regions, result[0], result[1]):
+            counts[process_hash, hash(r)] = (value, value2)
+
+    # Combine components
+    shape = (len(processes), len(regions), len(variations))
+    sumw = numpy.zeros(shape)
+    sumw2 = numpy.zeros(shape)
+    for index, components in cells.items():
+        for coefficient, _, process, region in components:
+            if isinstance(coefficient, tuple):
+                coefficient = coefficient[0]
+            value, value2 = counts[hash(process), hash(region)]
+            sumw[index] += coefficient * value
+            sumw2[index] += coefficient * coefficient * value2
+
+    # Create the table
+    return YieldTable(
+        tuple((_label(p.label()) for p in processes)),
+        tuple((_label(r.label()) for r in regions)),
+        tuple(('nominal' if v is None else str(v) for v in variations)),
+        sumw,
+        sumw2
+    )
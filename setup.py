@@ -23,6 +23,7 @@ setup(
     # Dependencies
     install_requires = [
         'six >= 1.7.3',
+        'numpy >= 1.13',
         'owls-cache >= 0.0.2',
         'owls-parallel >= 0.0.2',
     ],
@@ -19,3 +19,7 @@ test_data = {
 
 # Do something fancy with templated variables
 test_name = 'John {0}'.format(definitions()['surname'])
+
+
+# Record the file name of the compiled code
+code_filename = (lambda: None).__code__.co_filename
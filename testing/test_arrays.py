@@ -0,0 +1,53 @@
+# System imports
+import unittest
+
+# NumPy imports
+import numpy
+
+# owls-hep imports
+from owls_hep.arrays import ArrayHistogram
+
+
+class TestArrayHistogram(unittest.TestCase):
+    def setUp(self):
+        # Create a 1D histogram with 2 bins, plus underflow and overflow
+        self.histogram = ArrayHistogram((numpy.array([0.0, 1.0, 2.0]),),
+                                        numpy.array([1.0, 2.0, 3.0, 4.0]),
+                                        numpy.array([1.0, 2.0, 3.0, 4.0]))
+
+    def test_integral(self):
+        self.assertEqual(self.histogram.integral(), 10.0)
+        self.assertEqual(self.histogram.integral(include_overflow = False),
+                         5.0)
+
+    def test_scaled_addition(self):
+        # Check that addition is done in place and leaves the other histogram
+        # unmodified
+        result = self.histogram.copy()
+        result.add(self.histogram, 2.0)
+        self.assertEqual(list(result.sumw()), [3.0, 6.0, 9.0, 12.0])
+        self.assertEqual(list(result.sumw2()), [5.0, 10.0, 15.0, 20.0])
+        self.assertEqual(self.histogram.integral(), 10.0)
+
+    def test_scale(self):
+        self.histogram.scale(-2.0)
+        self.assertEqual(list(self.histogram.sumw()), [-2.0, -4.0, -6.0, -8.0])
+        self.assertEqual(list(self.histogram.sumw2()), [4.0, 8.0, 12.0, 16.0])
+
+    def test_incompatible(self):
+        other = ArrayHistogram((numpy.array([0.0, 1.0, 3.0]),),
+                               numpy.zeros(4),
+                               numpy.zeros(4))
+        with self.assertRaises(ValueError):
+            self.histogram.add(other)
+
+    def test_shape(self):
+        with self.assertRaises(ValueError):
+            ArrayHistogram((numpy.array([0.0, 1.0]),),
+                           numpy.zeros(4),
+                           numpy.zeros(4))
+
+
+# Run the tests if this is the main module
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# System imports
+import unittest
+
+# NumPy imports
+import numpy
+
+# owls-hep imports
+from owls_hep.arrays import ArrayHistogram
+from owls_hep.binning import bin_edges, cell_indices, draw_cell_indices, \
+    rebin_indices, optimized_edges
+
+
+class TestBinning(unittest.TestCase):
+    def test_edges(self):
+        # Check the different binning forms
+        self.assertEqual(list(bin_edges((2, 0.0, 1.0))), [0.0, 0.5, 1.0])
+        self.assertEqual(list(bin_edges(('linear', 2, 0.0, 1.0))),
+                         [0.0, 0.5, 1.0])
+        self.assertEqual(list(bin_edges(('custom', 0.0, 0.2, 1.0))),
+                         [0.0, 0.2, 1.0])
+        with self.assertRaises(ValueError):
+            bin_edges(('custom', 1.0, 0.0))
+
+    def test_rebin(self):
+        # Check merging of pairs of bins
+        self.assertEqual(list(rebin_indices((10, 0.0, 10.0), (5, 0.0, 10.0))),
+                         [0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6])
+
+    def test_rebin_range(self):
+        # Check that bins outside a restricted range go to underflow and
+        # overflow
+        self.assertEqual(list(rebin_indices((10, 0.0, 1.0), (2, 0.2, 0.6))),
+                         [0, 0, 0, 1, 1, 2, 2, 3, 3, 3, 3, 3])
+
+    def test_misaligned(self):
+        # Check that misaligned binnings are rejected
+        with self.assertRaises(ValueError):
+            rebin_indices((10, 0.0, 10.0), (3, 0.0, 10.0))
+
+
+class TestCellIndices(unittest.TestCase):
+    def setUp(self):
+        # Create a 2 x 3 binning with differently sized axes, so that
+        # transposed layouts don't fit
+        self.edges = (bin_edges((2, 0.0, 2.0)), bin_edges((3, 0.0, 3.0)))
+        self.shape = (4, 5)
+
+    def test_boundaries(self):
+        # Check underflow, overflow and upper edges going to the next bin
+        index = cell_indices((self.edges[0],),
+                             numpy.array([[-1.0], [0.0], [1.0], [2.0]]))
+        self.assertEqual(list(index), [0, 1, 2, 3])
+
+    def test_draw_order(self):
+        # Values of expressions 'y:x' must fill the ArrayHistogram layout
+        # [x, y] as TTree::Draw fills a TH2
+        values = numpy.array([[2.5, 0.5], [0.5, 1.5], [0.5, 1.5]])
+        index = draw_cell_indices(self.edges, values)
+        sumw = numpy.bincount(index,
+                              minlength = int(numpy.prod(self.shape)))
+        histogram = ArrayHistogram(self.edges,
+                                   sumw.reshape(self.shape),
+                                   sumw.reshape(self.shape))
+        expected = numpy.zeros(self.shape)
+        expected[1, 3] = 1.0
+        expected[2, 1] = 2.0
+        self.assertTrue(numpy.array_equal(histogram.sumw(), expected))
+
+
+class TestOptimizedEdges(unittest.TestCase):
+    def setUp(self):
+        # Create a falling background and a rising signal
+        self.edges = [float(e) for e in range(11)]
+        self.background = [10.0, 8.0, 6.0, 5.0, 4.0, 3.0, 2.0, 1.0, 0.5, 0.5]
+        self.signal = [0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 2.0, 3.0, 3.0]
+
+    def test_min_background(self):
+        # Check that low-statistics bins are merged from the upper end
+        edges = optimized_edges(self.edges,
+                                self.background,
+                                self.background,
+                                min_background = 2.0)
+        self.assertEqual(list(edges), [0, 1, 2, 3, 4, 5, 6, 7, 10])
+
+    def test_relative_error(self):
+        # Check the relative error target (requiring 4 unit-weight events)
+        edges = optimized_edges(self.edges,
+                                self.background,
+                                self.background,
+                                max_relative_error = 0.5)
+        self.assertEqual(list(edges), [0, 1, 2, 3, 4, 6, 10])
+
+    def test_significance(self):
+        # Check that significance maximization respects targets and keeps
+        # the signal bins apart
+        edges = optimized_edges(self.edges,
+                                self.background,
+                                self.background,
+                                self.signal,
+                                min_background = 1.0,
+                                maximize_significance = True)
+        self.assertEqual(list(edges), [0, 5, 6, 7, 8, 10])
+
+    def test_impossible(self):
+        # Check that unreachable targets are reported
+        with self.assertRaises(ValueError):
+            optimized_edges(self.edges,
+                            self.background,
+                            self.background,
+                            min_background = 100.0)
@@ -0,0 +1,49 @@
+# System imports
+import unittest
+from pickle import dumps, loads
+
+# NumPy imports
+import numpy
+
+# owls-hep imports
+from owls_hep.digest import TDigest
+
+
+class TestTDigest(unittest.TestCase):
+    def setUp(self):
+        # Create a weighted uniform distribution on [0, 1), split into two
+        # digests
+        generator = numpy.random.RandomState(1234)
+        self.values = generator.uniform(size = 100000)
+        self.weights = generator.uniform(0.0, 2.0, size = 100000)
+        self.first = TDigest()
+        self.first.update(self.values[:50000], self.weights[:50000])
+        self.second = TDigest()
+        self.second.update(self.values[50000:], self.weights[50000:])
+
+    def test_quantile(self):
+        # Check quantiles against the exact values
+        self.first.merge(self.second)
+        quantiles = self.first.quantile([0.01, 0.5, 0.99])
+        for estimate, exact in zip(quantiles, [0.01, 0.5, 0.99]):
+            self.assertAlmostEqual(estimate, exact, delta = 0.005)
+        self.assertAlmostEqual(self.first.cdf(0.25), 0.25, delta = 0.005)
+        self.assertAlmostEqual(self.first.total_weight(),
+                               self.weights.sum())
+
+    def test_size(self):
+        # Check that the digest is bounded by its compression
+        self.assertLessEqual(len(self.first.centroids()[0]), 100)
+
+    def test_scale(self):
+        # Check that scaling changes weights but not quantiles
+        median = self.first.quantile(0.5)
+        self.first.scale(2.0)
+        self.assertAlmostEqual(self.first.quantile(0.5), median)
+        with self.assertRaises(ValueError):
+            self.first.scale(-1.0)
+
+    def test_pickle(self):
+        # Check that digests survive pickling
+        copy = loads(dumps(self.first))
+        self.assertEqual(copy.quantile(0.5), self.first.quantile(0.5))
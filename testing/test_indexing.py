@@ -0,0 +1,86 @@
+# System imports
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+
+# NumPy imports
+import numpy
+
+# owls-hep imports
+from owls_hep.indexing import EventIndex
+
+
+class _Process(object):
+    def __init__(self, files):
+        self._files = files
+
+    def files(self):
+        return self._files
+
+    def tree(self):
+        return 'tree'
+
+
+class _MemoryIndex(EventIndex):
+    def __init__(self, directory, indices):
+        super(_MemoryIndex, self).__init__(directory)
+        self._indices = indices
+
+    def _file_index(self, process, file):
+        # Sort the keys as the on-disk index does
+        keys, count = self._indices[file]
+        keys = numpy.array(keys, dtype = numpy.int64)
+        order = numpy.lexsort(keys.T[::-1])
+        return (keys[order], order.astype(numpy.int64), count)
+
+
+class TestEventIndex(unittest.TestCase):
+    def setUp(self):
+        # Create two files, with event numbers beyond the precision of doubles
+        big = 2 ** 60
+        self.directory = mkdtemp()
+        self.index = _MemoryIndex(self.directory, {
+            'a.root': ([[1, big], [1, big + 1], [2, 5]], 3),
+            'b.root': ([[2, 5], [1, big + 1], [3, 7]], 4),
+        })
+        self.process = _Process(('a.root', 'b.root'))
+        self.big = big
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_points(self):
+        # Check that points match exactly, with entries offset by the entries
+        # of previous files
+        entries = self.index.entries(self.process,
+                                     points = [(1, self.big + 1), (2, 5)])
+        self.assertEqual(list(entries), [1, 2, 3, 4])
+
+    def test_ranges(self):
+        # Check value and inclusive range selections
+        entries = self.index.entries(self.process, {'RunNumber': (2, 3)})
+        self.assertEqual(list(entries), [2, 3, 5])
+        entries = self.index.entries(self.process,
+                                     {'RunNumber': 1,
+                                      'EventNumber': (self.big + 1,
+                                                      self.big + 1)})
+        self.assertEqual(list(entries), [1, 4])
+
+    def test_files(self):
+        # Check that offsets only count the loaded files
+        entries = self.index.entries(self.process,
+                                     points = [(3, 7)],
+                                     files = ('b.root',))
+        self.assertEqual(list(entries), [2])
+
+    def test_invalid(self):
+        # Check that unknown keys and incomplete points are rejected
+        with self.assertRaises(ValueError):
+            self.index.entries(self.process, {'LumiBlock': 1})
+        with self.assertRaises(ValueError):
+            self.index.entries(self.process, points = [(1,)])
+
+
+# Run the tests if this is the main module
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# System imports
+import unittest
+
+# NumPy imports
+import numpy
+
+# owls-hep imports
+from owls_hep.keyset import KeySet
+
+
+class TestKeySet(unittest.TestCase):
+    def test_add_unseen(self):
+        # Check that only new keys, and only their first occurrence in the
+        # input, are reported as unseen
+        keys = KeySet()
+        self.assertTrue(numpy.array_equal(
+            keys.add_unseen([1, 1, 2, 1], [10, 10, 10, 11]),
+            [True, False, True, True]
+        ))
+        self.assertTrue(numpy.array_equal(
+            keys.add_unseen([2, 3], [10, 10]),
+            [False, True]
+        ))
+        self.assertEqual(len(keys), 4)
+
+    def test_levels(self):
+        # Check membership across many insertions, which merge levels
+        generator = numpy.random.RandomState(1234)
+        keys = KeySet()
+        runs = generator.randint(0, 100, size = 20000)
+        events = generator.randint(0, 1000, size = 20000)
+        expected = set()
+        for i in range(0, 20000, 700):
+            chunk = list(zip(runs[i:i + 700], events[i:i + 700]))
+            unseen = keys.add_unseen(runs[i:i + 700], events[i:i + 700])
+            for j, key in enumerate(chunk):
+                self.assertEqual(unseen[j], key not in expected)
+                expected.add(key)
+        self.assertEqual(len(keys), len(expected))
+        self.assertTrue(numpy.all(keys.contains(runs, events)))
+        self.assertFalse(numpy.any(keys.contains([100, 0], [0, 1000])))
+
+    def test_out_of_range(self):
+        # Check that events which do not fit in the event bits are rejected
+        keys = KeySet(event_bits = 8)
+        with self.assertRaises(ValueError):
+            keys.add_unseen([1], [256])
+
+
+if __name__ == '__main__':
+    unittest.main()
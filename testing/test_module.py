@@ -1,10 +1,13 @@
 # System imports
 import unittest
 from os.path import dirname, join
-from sys import version_info
+from sys import version_info, modules
+from shutil import rmtree, copyfile
+from tempfile import mkdtemp
 
 # owls-hep imports
-from owls_hep.module import load
+from owls_hep.module import load, clear_cache, set_module_cache_size, \
+    set_bytecode_directory
 
 
 class TestModule(unittest.TestCase):
@@ -30,6 +33,67 @@ class TestModule(unittest.TestCase):
         self.assertEqual(module.test_name, 'John Kennedy')
 
 
+class TestModuleCache(unittest.TestCase):
+    def setUp(self):
+        self.path = join(dirname(__file__), 'example_module.py')
+        clear_cache()
+
+    def tearDown(self):
+        set_module_cache_size(32)
+        set_bytecode_directory(None)
+        clear_cache()
+
+    def test_reuse(self):
+        # Identical definitions reuse the module, others don't
+        module = load(self.path, {'surname': 'Adams'}, reuse = True)
+        self.assertIs(load(self.path, {'surname': 'Adams'}, reuse = True),
+                      module)
+        self.assertIsNot(load(self.path, {'surname': 'Kennedy'},
+                              reuse = True),
+                         module)
+        self.assertIsNot(load(self.path, {'surname': 'Adams'}), module)
+
+    def test_no_reuse(self):
+        # Modules are not reused by default
+        module = load(self.path, {'surname': 'Adams'})
+        self.assertIsNot(load(self.path, {'surname': 'Adams'}), module)
+        self.assertNotIn(module.__name__, modules)
+
+    def test_eviction(self):
+        # Evicted modules are removed from sys.modules
+        set_module_cache_size(1)
+        module = load(self.path, {'surname': 'Adams'}, reuse = True)
+        self.assertIn(module.__name__, modules)
+        load(self.path, {'surname': 'Kennedy'}, reuse = True)
+        self.assertNotIn(module.__name__, modules)
+        self.assertIsNot(load(self.path, {'surname': 'Adams'}, reuse = True),
+                         module)
+
+    def test_identical_files(self):
+        # Code of identical files at different paths records its own path
+        directory = mkdtemp()
+        try:
+            path = join(directory, 'example_module.py')
+            copyfile(self.path, path)
+            load(self.path, {'surname': 'Adams'})
+            module = load(path, {'surname': 'Adams'})
+            self.assertEqual(module.code_filename, path)
+        finally:
+            rmtree(directory)
+
+    def test_bytecode_directory(self):
+        # Bytecode written to disk is used by a fresh process-level cache
+        directory = mkdtemp()
+        try:
+            set_bytecode_directory(directory)
+            load(self.path, {'surname': 'Adams'})
+            clear_cache()
+            module = load(self.path, {'surname': 'Kennedy'})
+            self.assertEqual(module.test_name, 'John Kennedy')
+        finally:
+            rmtree(directory)
+
+
 # Run the tests if this is the main module
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,51 @@
+# System imports
+import unittest
+from pickle import dumps, loads
+
+# owls-hep imports
+from owls_hep.sparse import SparseHistogram
+
+
+class TestSparseHistogram(unittest.TestCase):
+    def setUp(self):
+        # Create a 4-dimensional histogram
+        self.histogram = SparseHistogram(((10, 0.0, 10.0),) * 4)
+        self.histogram.fill([[0.5, 0.5, 0.5, 0.5],
+                             [0.5, 0.5, 0.5, 0.5],
+                             [1.5, 2.5, 3.5, 4.5],
+                             [10.0, 0.5, 0.5, -1.0]],
+                            [1.0, 2.0, 3.0, 4.0])
+
+    def test_fill(self):
+        # Check populated bins and integrals
+        self.assertEqual(self.histogram.populated_bins(), 3)
+        self.assertEqual(self.histogram.integral(), 10.0)
+        self.assertEqual(self.histogram.integral(include_overflow = False),
+                         6.0)
+
+    def test_add(self):
+        # Check scaled addition, including the sum of squared weights
+        other = self.histogram.copy()
+        other.add(self.histogram, -0.5)
+        self.assertEqual(other.integral(), 5.0)
+        self.assertEqual(other._bins[(1, 1, 1, 1)], [1.5, 1.25 * 5.0])
+
+        # Check that the original histogram is unmodified
+        self.assertEqual(self.histogram.integral(), 10.0)
+
+    def test_incompatible(self):
+        # Check that binnings must match
+        other = SparseHistogram(((5, 0.0, 10.0),) * 4)
+        with self.assertRaises(ValueError):
+            self.histogram.add(other)
+
+    def test_pickle(self):
+        # Check that the histogram survives serialization
+        histogram = loads(dumps(self.histogram))
+        self.assertEqual(histogram.integral(), 10.0)
+        self.assertEqual(histogram.populated_bins(), 3)
+
+
+# Run the tests if this is the main module
+if __name__ == '__main__':
+    unittest.main()
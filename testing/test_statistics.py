@@ -0,0 +1,62 @@
+# System imports
+import unittest
+
+# NumPy imports
+import numpy
+
+# owls-hep imports
+from owls_hep.statistics import WeightedMoments
+
+
+class TestWeightedMoments(unittest.TestCase):
+    def setUp(self):
+        # Create correlated values with a large offset, which would suffer
+        # from cancellation in a naive sum-of-squares computation
+        generator = numpy.random.RandomState(1234)
+        x = generator.normal(size = 10000)
+        y = x + generator.normal(size = 10000)
+        self.values = numpy.column_stack((x, y)) + 1e8
+        self.weights = generator.uniform(0.0, 2.0, size = 10000)
+
+    def test_chunked(self):
+        # Check that chunked accumulation matches the direct computation
+        moments = WeightedMoments(('x', 'y'))
+        for i in range(0, 10000, 3000):
+            moments.update(self.values[i:i + 3000], self.weights[i:i + 3000])
+        expected = numpy.cov(self.values.T,
+                             aweights = self.weights,
+                             bias = True)
+        self.assertTrue(numpy.allclose(moments.covariance(), expected))
+        self.assertTrue(numpy.allclose(
+            moments.mean(),
+            numpy.average(self.values, axis = 0, weights = self.weights)
+        ))
+        self.assertAlmostEqual(moments.correlation()[0, 1],
+                               1.0 / numpy.sqrt(2.0),
+                               delta = 0.02)
+
+    def test_single_label(self):
+        # Check that a single label string is not split into characters
+        moments = WeightedMoments('x + y')
+        self.assertEqual(moments.labels(), ('x + y',))
+        moments.update(self.values[:, :1], self.weights)
+        self.assertEqual(moments.covariance().shape, (1, 1))
+
+    def test_add(self):
+        # Check that merging accumulators matches a single accumulation
+        first = WeightedMoments(('x', 'y'))
+        first.update(self.values[:5000], self.weights[:5000])
+        second = WeightedMoments(('x', 'y'))
+        second.update(self.values[5000:], self.weights[5000:])
+        total = WeightedMoments(('x', 'y'))
+        total.update(self.values, self.weights)
+        first.add(second)
+        self.assertTrue(numpy.allclose(first.covariance(),
+                                       total.covariance()))
+        self.assertAlmostEqual(first.sum_of_weights(),
+                               total.sum_of_weights())
+
+    def test_incompatible(self):
+        # Check that variables must match
+        with self.assertRaises(ValueError):
+            WeightedMoments(('x',)).add(WeightedMoments(('y',)))